@@ -0,0 +1,12 @@
+import os
+import sys
+
+# Lambda sources live flat in src/; boto3 is vendored in package/ for deployment
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.append(os.path.join(ROOT, 'package'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+
+# Deployment bundles and the live Cost Explorer smoke script are not unit tests
+collect_ignore_glob = ['package/*', 'api-package/*', 'src/test_local.py']
@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+from cost_cube import iter_ce_rows, COST_METRICS, COST_COLUMNS
+
+ACCOUNT_NAMES_TTL = int(os.environ.get('ACCOUNT_NAMES_TTL', '3600'))
+ACCOUNT_CONCURRENCY = int(os.environ.get('ACCOUNT_CONCURRENCY', '8'))
+
+# Organizations is queried at most once per TTL per warm Lambda
+_names = {'accounts': None, 'fetched': 0.0}
+_names_lock = threading.Lock()
+
+
+def account_names(org_client):
+    """
+    {account_id: name} from Organizations ListAccounts, all pages, cached
+    Returns {} (ids are shown bare) when the caller is not the management
+    account or lacks organizations:ListAccounts
+    """
+    with _names_lock:
+        if _names['accounts'] is not None and time.time() - _names['fetched'] < ACCOUNT_NAMES_TTL:
+            return _names['accounts']
+        try:
+            accounts = {}
+            for page in org_client.get_paginator('list_accounts').paginate():
+                for account in page['Accounts']:
+                    accounts[account['Id']] = account['Name']
+        except Exception as e:
+            print(f"Error listing accounts: {str(e)}")
+            accounts = _names['accounts'] or {}
+        _names['accounts'], _names['fetched'] = accounts, time.time()
+        return accounts
+
+
+def new_account_analysis(account_id, name):
+    return {
+        'account_id': account_id,
+        'account_name': name,
+        'total_cost': 0.0,
+        'service_costs': {},
+        'regional_costs': {},
+        'daily_costs': {},
+        'metric_totals': {column: 0.0 for column in COST_COLUMNS}
+    }
+
+
+def account_analyses(ce_client, start_date, end_date, names=None):
+    """
+    Business Logic: Per-account cost analyses from two account-level queries
+
+    Cost Explorer groups by at most two dimensions, so LINKED_ACCOUNT x
+    SERVICE and LINKED_ACCOUNT x REGION are each fetched once (all pages)
+    and split per account in memory. Each result has the same shape as
+    cost_analyzer.analyze_costs. Returns {account_id: analysis}.
+    """
+    names = names or {}
+    analyses = {}
+
+    def analysis_for(account_id):
+        if account_id not in analyses:
+            analyses[account_id] = new_account_analysis(account_id, names.get(account_id, account_id))
+        return analyses[account_id]
+
+    for row in iter_ce_rows(ce_client, start_date, end_date, ['LINKED_ACCOUNT', 'SERVICE'], metrics=COST_METRICS):
+        analysis = analysis_for(row['account'])
+        totals = analysis['metric_totals']
+        for column in COST_COLUMNS:
+            totals[column] += row.get(column, 0.0)
+        cost = row['cost']
+        analysis['total_cost'] += cost
+        analysis['service_costs'][row['service']] = analysis['service_costs'].get(row['service'], 0.0) + cost
+        analysis['daily_costs'][row['date']] = analysis['daily_costs'].get(row['date'], 0.0) + cost
+
+    for row in iter_ce_rows(ce_client, start_date, end_date, ['LINKED_ACCOUNT', 'REGION']):
+        regions = analysis_for(row['account'])['regional_costs']
+        regions[row['region']] = regions.get(row['region'], 0.0) + row['cost']
+
+    analysis_date = datetime.now().isoformat()
+    for analysis in analyses.values():
+        services, regions = analysis['service_costs'], analysis['regional_costs']
+        analysis['daily_costs'] = dict(sorted(analysis['daily_costs'].items()))
+        analysis['top_service'] = max(services.items(), key=lambda x: x[1]) if services else ('None', 0)
+        analysis['top_region'] = max(regions.items(), key=lambda x: x[1]) if regions else ('None', 0)
+        analysis['analysis_date'] = analysis_date
+
+    return analyses
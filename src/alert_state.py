@@ -0,0 +1,161 @@
+import hashlib
+import os
+import time
+
+from botocore.exceptions import ClientError
+
+from dynamo_helpers import to_dynamo, from_dynamo, batch_get_items
+
+ALERT_STATE_TABLE = os.environ.get('COST_ALERT_STATE_TABLE', 'cost-alert-state')
+
+# An alert resolves only once the value drops below RESOLVE_RATIO x threshold
+RESOLVE_RATIO = float(os.environ.get('ALERT_RESOLVE_RATIO', '0.9'))
+# A resolved alert that fires again within the cooldown is not re-sent
+# unless it is worse than what was last notified
+COOLDOWN_SECONDS = int(float(os.environ.get('ALERT_COOLDOWN_HOURS', '24')) * 3600)
+# Severity levels by value / threshold; while firing, only a higher level is re-sent
+ESCALATION_STEPS = (1.0, 1.5, 2.0, 3.0, 5.0)
+
+
+def fingerprint(kind, subject):
+    """Stable id for one alertable subject, e.g. ('budget', 'team-data-ec2')"""
+    return hashlib.sha1(f"{kind}|{subject}".encode('utf-8')).hexdigest()[:20]
+
+
+def observe(kind, subject, value, threshold, **details):
+    """One evaluated check, breached or not; non-breached checks resolve alerts"""
+    return dict(details, id=fingerprint(kind, subject), kind=kind, subject=subject,
+                value=value, threshold=threshold)
+
+
+def severity(value, threshold):
+    if threshold <= 0:
+        return len(ESCALATION_STEPS) if value > 0 else 0
+    ratio = value / threshold
+    return sum(1 for step in ESCALATION_STEPS if ratio > step)
+
+
+def transition(state, check, now):
+    """
+    Business Logic: Decide what one check does to its alert state
+
+    Returns (new_state, reason). new_state is None when nothing changed
+    (no write needed); reason is 'new' or 'escalated' when a notification
+    should go out and None otherwise. notified_level/notified_at are left
+    for record_notified, so an alert whose publish failed is sent again by
+    the next run.
+    """
+    level = severity(check['value'], check['threshold'])
+    firing = bool(state and state['firing'])
+    notified_level = state.get('notified_level', 0) if state else 0
+    notified_at = state.get('notified_at', 0) if state else 0
+
+    if firing:
+        if check['value'] < check['threshold'] * RESOLVE_RATIO:
+            return resolved(state, now), None
+        if level > notified_level:
+            return dict(state, value=check['value']), 'new' if notified_level == 0 else 'escalated'
+        return None, None
+
+    if level == 0:
+        return None, None
+
+    new_state = dict(state or {'id': check['id'], 'kind': check['kind'], 'subject': check['subject']},
+                     firing=True, fired_at=now, value=check['value'])
+    if state and now - notified_at < COOLDOWN_SECONDS and level <= notified_level:
+        # Flapping back over the threshold inside the cooldown: record, don't send
+        new_state.update(notified_level=notified_level, notified_at=notified_at)
+        return new_state, None
+    # A new incident: nothing has been notified for it yet
+    new_state.update(notified_level=0, notified_at=notified_at)
+    return new_state, 'new'
+
+
+def resolved(state, now):
+    return dict(state, firing=False, resolved_at=now)
+
+
+def _write(table, state, new_state):
+    """
+    Write new_state if the stored item is still the version state was read
+    at; returns the written state, or None when another run got there first
+    """
+    version = state['version'] if state else 0
+    new_state = dict(new_state, version=version + 1)
+    try:
+        if state:
+            table.put_item(Item=to_dynamo(new_state),
+                           ConditionExpression='#v = :v',
+                           ExpressionAttributeNames={'#v': 'version'},
+                           ExpressionAttributeValues={':v': version})
+        else:
+            table.put_item(Item=to_dynamo(new_state),
+                           ConditionExpression='attribute_not_exists(id)')
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return None
+        raise
+    return new_state
+
+
+def _firing_states(table, kinds):
+    """Stored alerts of the given kinds that are currently firing (all pages)"""
+    states = []
+    kwargs = {}
+    while True:
+        response = table.scan(**kwargs)
+        states.extend(from_dynamo(item) for item in response['Items']
+                      if item.get('firing') and item.get('kind') in kinds)
+        if 'LastEvaluatedKey' not in response:
+            return states
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def reconcile_alerts(dynamodb, checks, kinds=(), now=None):
+    """
+    Business Requirement: Notify each alert once, not on every scheduled run
+
+    Applies every check to its stored state. Changed states are written with
+    a version condition, so when two runs race only the winner notifies.
+    Firing alerts of the given kinds with no check this run (a deleted
+    budget, a service that stopped costing) are resolved.
+    Returns the checks that should be notified, each with a 'reason' and
+    the written 'alert' state; pass them to record_notified once published.
+    """
+    now = int(now or time.time())
+    table = dynamodb.Table(ALERT_STATE_TABLE)
+    items = batch_get_items(dynamodb, table, [check['id'] for check in checks])
+    states = {alert_id: from_dynamo(item) for alert_id, item in items.items()}
+
+    notify = []
+    for check in checks:
+        state = states.get(check['id'])
+        new_state, reason = transition(state, check, now)
+        if new_state is None:
+            continue
+        written = _write(table, state, new_state)
+        # None: another run updated this alert first; it owns the notification
+        if written and reason:
+            notify.append(dict(check, reason=reason, alert=written))
+
+    checked = {check['id'] for check in checks}
+    vanished = [state for state in _firing_states(table, set(kinds)) if state['id'] not in checked]
+    for state in vanished:
+        _write(table, state, resolved(state, now))
+
+    print(f"Alert checks: {len(checks)}, notifications: {len(notify)}, vanished alerts resolved: {len(vanished)}")
+    return notify
+
+
+def record_notified(dynamodb, notify, now=None):
+    """
+    Mark alerts from reconcile_alerts as notified, after the publish went
+    out; an alert changed by another run in between is left to that run
+    """
+    now = int(now or time.time())
+    table = dynamodb.Table(ALERT_STATE_TABLE)
+    for alert in notify:
+        state = alert['alert']
+        level = severity(alert['value'], alert['threshold'])
+        if not _write(table, state, dict(state, notified_level=level, notified_at=now)):
+            print(f"Alert {state['id']} changed before it was marked notified; left to the newer run")
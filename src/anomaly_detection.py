@@ -0,0 +1,238 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import boto3
+
+from cost_cube import iter_ce_rows, build_cube, cube_row
+
+try:
+    import numpy as np  # Optional: vectorized scoring when a numpy layer is attached
+except ImportError:
+    np = None
+
+HISTORY_DAYS = 35                                             # five weeks of same-weekday history
+Z_THRESHOLD = float(os.environ.get('ANOMALY_Z_THRESHOLD', '3.5'))
+MIN_DELTA = float(os.environ.get('ANOMALY_MIN_DELTA', '1.0'))   # ignore sub-dollar moves
+MIN_SCALE = 0.01
+RELATIVE_SCALE = 0.1       # scale floor as a share of baseline, so flat series don't explode
+SPARSE_SHARE = 0.1         # series with spend on <=10% of past days are one-off candidates
+MAD_TO_SIGMA = 1.4826
+MAX_ALERTED = 10
+
+# Billing region prefixes on usage types ('EUW1-BoxUsage:t3.micro')
+USAGE_TYPE_REGIONS = {
+    'USE1': 'us-east-1', 'USE2': 'us-east-2', 'USW1': 'us-west-1', 'USW2': 'us-west-2',
+    'UGE1': 'us-gov-east-1', 'UGW1': 'us-gov-west-1', 'CAN1': 'ca-central-1', 'CAN2': 'ca-west-1',
+    'SAE1': 'sa-east-1', 'EUC1': 'eu-central-1', 'EUC2': 'eu-central-2', 'EUW1': 'eu-west-1',
+    'EUW2': 'eu-west-2', 'EUW3': 'eu-west-3', 'EUN1': 'eu-north-1', 'EUS1': 'eu-south-1',
+    'EUS2': 'eu-south-2', 'APE1': 'ap-east-1', 'APN1': 'ap-northeast-1', 'APN2': 'ap-northeast-2',
+    'APN3': 'ap-northeast-3', 'APS1': 'ap-southeast-1', 'APS2': 'ap-southeast-2',
+    'APS3': 'ap-south-1', 'APS4': 'ap-southeast-3', 'APS5': 'ap-south-2', 'APS6': 'ap-southeast-4',
+    'MES1': 'me-south-1', 'MEC1': 'me-central-1', 'AFS1': 'af-south-1', 'ILC1': 'il-central-1'
+}
+GLOBAL_REGION = 'Global'
+
+
+def lambda_handler(event, context):
+    """
+    Business Purpose: Daily anomaly scan across every service x usage-type series
+    Separates one-time charges (e.g. domain registration) from recurring spikes
+    """
+    ce_client = boto3.client('ce')
+    sns_client = boto3.client('sns')
+
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=HISTORY_DAYS + 1)
+
+    try:
+        # Cost Explorer allows two group-bys; usage types carry the region prefix
+        # Usage quantity comes in the same call; within one usage type its unit is fixed
+        rows = iter_ce_rows(ce_client, start_date, end_date, ['SERVICE', 'USAGE_TYPE'],
+                            metrics=('BlendedCost', 'UsageQuantity'))
+        cube = build_cube(rows, ['service', 'usage_type'], columns=('cost', 'usage_quantity'))
+        anomalies = detect_anomalies(cube)
+
+        recurring = [a for a in anomalies if a['kind'] != 'one_time']
+        one_time = [a for a in anomalies if a['kind'] == 'one_time']
+        if anomalies and os.environ.get('SNS_TOPIC_ARN'):
+            send_anomaly_alert(sns_client, cube['dates'][-1], recurring, one_time)
+
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'message': 'Anomaly scan complete',
+                'series_scanned': len(cube['keys']),
+                'anomalies': anomalies[:MAX_ALERTED]
+            })
+        }
+
+    except Exception as e:
+        print(f"Error in anomaly detection: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
+
+
+def detect_anomalies(cube, target=None):
+    """
+    Business Logic: Score every series on one day against a robust weekday baseline
+
+    baseline = median of the same weekday over past weeks (all past days when
+               fewer than two same-weekday points exist)
+    scale    = 1.4826 * MAD of all past days, floored at 10% of baseline
+    Returns anomalies ranked by dollar impact, each tagged 'one_time',
+    'new_recurring' or 'recurring'.
+    """
+    width = len(cube['dates'])
+    t = width - 1 if target is None else cube['dates'].index(target)
+    if t < 1 or not cube['keys']:
+        return []
+
+    if np is not None:
+        scores = _score_numpy(cube, t)
+    else:
+        scores = _score_python(cube, t)
+
+    anomalies = []
+    for i, (value, baseline, score, nonzero_share, previous) in enumerate(scores):
+        delta = value - baseline
+        if score < Z_THRESHOLD or delta < MIN_DELTA:
+            continue
+
+        if nonzero_share <= SPARSE_SHARE:
+            kind = 'new_recurring' if previous > 0 else 'one_time'
+        else:
+            kind = 'recurring'
+
+        anomaly = dict(zip(cube['fields'], cube['keys'][i]))
+        if 'usage_type' in anomaly and 'region' not in anomaly:
+            anomaly['region'] = usage_type_region(anomaly['usage_type'])
+        anomaly.update({
+            'date': cube['dates'][t],
+            'cost': value,
+            'expected': baseline,
+            'delta': delta,
+            'score': score,
+            'kind': kind
+        })
+        if 'usage_quantity' in cube['columns']:
+            anomaly.update(unit_costs(cube, i, t))
+        anomalies.append(anomaly)
+
+    anomalies.sort(key=lambda a: (a['delta'], a['score']), reverse=True)
+    return anomalies
+
+
+def usage_type_region(usage_type):
+    """
+    Region a usage type is billed in, from its prefix: 'EUW1-BoxUsage' ->
+    'eu-west-1'. Unprefixed usage types are us-east-1; other uppercase
+    prefixes are edge locations ('EU-DataTransfer-Out-Bytes') and count as Global.
+    For inter-region transfer ('USE1-EUW1-AWS-Out-Bytes') the first (source) region wins.
+    """
+    prefix = usage_type.split('-', 1)[0] if '-' in usage_type else ''
+    if prefix in USAGE_TYPE_REGIONS:
+        return USAGE_TYPE_REGIONS[prefix]
+    if prefix.isalnum() and prefix.isupper() and len(prefix) <= 4:
+        return GLOBAL_REGION
+    return 'us-east-1'
+
+
+def unit_costs(cube, i, t):
+    """
+    Cost per unit of usage on day t and over the history before it
+    A spike at a steady unit cost is more usage; a higher unit cost is a price change
+    """
+    cost = cube_row(cube, i)
+    usage = cube_row(cube, i, 'usage_quantity')
+    past_usage = sum(usage[:t])
+    return {
+        'usage_quantity': usage[t],
+        'unit_cost': cost[t] / usage[t] if usage[t] > 0 else None,
+        'expected_unit_cost': sum(cost[:t]) / past_usage if past_usage > 0 else None
+    }
+
+
+def _weekday_columns(t):
+    return list(range(t - 7, -1, -7))
+
+
+def _score_numpy(cube, t):
+    """Vectorized over all series: one median/MAD pass on the history matrix"""
+    width = len(cube['dates'])
+    matrix = np.frombuffer(cube['values'], dtype=np.float64).reshape(len(cube['keys']), width)
+    history = matrix[:, :t]
+    value = matrix[:, t]
+
+    overall = np.median(history, axis=1)
+    weekday = _weekday_columns(t)
+    baseline = np.median(matrix[:, weekday], axis=1) if len(weekday) >= 2 else overall
+    mad = np.median(np.abs(history - overall[:, None]), axis=1)
+    scale = np.maximum(np.maximum(MAD_TO_SIGMA * mad, RELATIVE_SCALE * np.abs(baseline)), MIN_SCALE)
+
+    score = (value - baseline) / scale
+    nonzero_share = (history > 0).mean(axis=1)
+    previous = matrix[:, t - 1]
+    return zip(value.tolist(), baseline.tolist(), score.tolist(),
+               nonzero_share.tolist(), previous.tolist())
+
+
+def _score_python(cube, t):
+    """Pure-Python fallback with the same statistics, one series at a time"""
+    weekday = _weekday_columns(t)
+    results = []
+    for i in range(len(cube['keys'])):
+        row = cube_row(cube, i)
+        history = row[:t]
+        value = row[t]
+
+        overall = _median(history)
+        baseline = _median([row[c] for c in weekday]) if len(weekday) >= 2 else overall
+        mad = _median([abs(v - overall) for v in history])
+        scale = max(MAD_TO_SIGMA * mad, RELATIVE_SCALE * abs(baseline), MIN_SCALE)
+
+        nonzero_share = sum(1 for v in history if v > 0) / len(history)
+        results.append((value, baseline, (value - baseline) / scale, nonzero_share, row[t - 1]))
+    return results
+
+
+def _median(values):
+    ordered = sorted(values)
+    n = len(ordered)
+    mid = n // 2
+    return ordered[mid] if n % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+
+
+def send_anomaly_alert(sns_client, date, recurring, one_time):
+    """
+    Business Communication: Ranked anomaly report, one-off charges listed apart
+    """
+    message = f"🔎 AWS Cost Anomalies for {date}\n\n"
+
+    if recurring:
+        message += "⚠️ Unusual spend:\n"
+        for a in recurring[:MAX_ALERTED]:
+            label = 'new' if a['kind'] == 'new_recurring' else 'spike'
+            message += (f"• [{label}] {a['service']} / {a['usage_type']} ({a['region']}): ${a['cost']:.2f} "
+                        f"(expected ${a['expected']:.2f}, +${a['delta']:.2f})")
+            if a.get('unit_cost') is not None and a.get('expected_unit_cost') is not None:
+                message += f", unit cost ${a['unit_cost']:.4f} vs ${a['expected_unit_cost']:.4f}"
+            message += "\n"
+        message += "\n"
+
+    if one_time:
+        message += "🧾 One-time charges:\n"
+        for a in one_time[:MAX_ALERTED]:
+            message += f"• {a['service']} / {a['usage_type']} ({a['region']}): ${a['cost']:.2f}\n"
+
+    try:
+        sns_client.publish(
+            TopicArn=os.environ['SNS_TOPIC_ARN'],
+            Message=message,
+            Subject=f"AWS Cost Anomalies: {len(recurring)} spikes, {len(one_time)} one-time"
+        )
+        print("Anomaly alert sent successfully")
+    except Exception as e:
+        print(f"Error sending anomaly alert: {str(e)}")
@@ -0,0 +1,71 @@
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Benchmark the CPU-versus-bytes trade-off of API response compression.
+# Lambda allocates CPU in proportion to memory (1,769 MB = 1 vCPU), so local
+# timings are scaled to the function's memory size to estimate Lambda cost.
+LAMBDA_MEMORY_MB = int(os.environ.get('LAMBDA_MEMORY_MB', '128'))
+FULL_VCPU_MB = 1769
+RUNS = 20
+
+SERVICES = [f"Amazon Service {i}" for i in range(40)]
+REGIONS = ['us-east-1', 'us-east-2', 'us-west-1', 'us-west-2', 'eu-west-1', 'eu-west-2',
+           'eu-central-1', 'ap-south-1', 'ap-southeast-1', 'ap-southeast-2',
+           'ap-northeast-1', 'sa-east-1', 'ca-central-1', 'global']
+
+
+def build_payload(days):
+    """Multi-day, multi-dimension response shaped like the cost API output"""
+    start = datetime.now().date() - timedelta(days=days)
+    rows = []
+    for d in range(days):
+        date = (start + timedelta(days=d)).strftime('%Y-%m-%d')
+        for i, service in enumerate(SERVICES):
+            for j, region in enumerate(REGIONS):
+                rows.append({
+                    'date': date,
+                    'service': service,
+                    'region': region,
+                    'cost': round((i + 1) * (j + 1) * 0.0137 + d * 0.001, 6)
+                })
+    return json.dumps({'daily_breakdown': rows}).encode('utf-8')
+
+
+def time_it(func, data):
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        out = func(data)
+    return (time.perf_counter() - start) / RUNS * 1000, len(out)
+
+
+def run(days):
+    data = build_payload(days)
+    scale = max(FULL_VCPU_MB / LAMBDA_MEMORY_MB, 1.0)
+
+    candidates = [(f"gzip-{level}", lambda b, l=level: gzip.compress(b, compresslevel=l))
+                  for level in (1, 6, 9)]
+    if brotli is not None:
+        candidates += [(f"br-{q}", lambda b, q=q: brotli.compress(b, quality=q))
+                       for q in (1, 5, 9)]
+
+    print(f"\n{days} days: raw body {len(data) / 1024:.1f} KB")
+    print(f"{'encoding':<10} {'size KB':>9} {'ratio':>7} {'local ms':>9} {'est Lambda ms':>14}")
+    for name, func in candidates:
+        ms, size = time_it(func, data)
+        print(f"{name:<10} {size / 1024:>9.1f} {len(data) / size:>7.1f} {ms:>9.2f} {ms * scale:>14.1f}")
+
+
+if __name__ == '__main__':
+    print(f"Estimating for {LAMBDA_MEMORY_MB} MB Lambda (local timings x{max(FULL_VCPU_MB / LAMBDA_MEMORY_MB, 1.0):.1f})")
+    if brotli is None:
+        print("brotli not installed - benchmarking gzip only")
+    for days in (1, 7, 30):
+        run(days)
@@ -0,0 +1,160 @@
+import os
+from datetime import datetime
+
+from dynamo_helpers import to_dynamo, from_dynamo, batch_get_items
+
+BUDGETS_TABLE = os.environ.get('COST_BUDGETS_TABLE', 'cost-budgets')
+BUDGET_STATE_TABLE = os.environ.get('COST_BUDGET_STATE_TABLE', 'cost-budget-state')
+WINDOWS = ('daily', 'weekly', 'mtd')
+
+
+def load_budgets(dynamodb):
+    """
+    Budget definitions, one item per budget:
+    {'id', 'name', 'limit', 'window': daily|weekly|mtd,
+     'filters': {'service': [...], 'region': [...], 'account': [...], 'tag:Team': [...]}}
+    Dimensions without a filter match everything.
+    """
+    table = dynamodb.Table(BUDGETS_TABLE)
+    budgets = []
+    kwargs = {}
+    while True:
+        response = table.scan(**kwargs)
+        budgets.extend(from_dynamo(item) for item in response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return budgets
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def compile_budgets(budgets, fields):
+    """
+    Business Logic: Compile budget filters into an inverted index
+
+    postings[field][value] lists the budgets constraining field to value and
+    required[b] is how many dimensions budget b constrains. A cell matches b
+    when it hits b's postings in every constrained dimension, so evaluation
+    cost depends on matching postings, not on the number of budgets.
+    Budgets filtering on a dimension missing from the data (or with an
+    unknown window) are reported as unsupported.
+    """
+    postings = {field: {} for field in fields}
+    required = []
+    global_budgets = []
+    supported = []
+    unsupported = []
+
+    for budget in budgets:
+        filters = {k: v for k, v in (budget.get('filters') or {}).items() if v}
+        if budget.get('window', 'daily') not in WINDOWS or any(field not in postings for field in filters):
+            unsupported.append(budget)
+            continue
+
+        b = len(supported)
+        supported.append(budget)
+        required.append(len(filters))
+        if not filters:
+            global_budgets.append(b)
+        for field, values in filters.items():
+            for value in set(values):
+                postings[field].setdefault(value, []).append(b)
+
+    return {
+        'fields': list(fields),
+        'budgets': supported,
+        'postings': postings,
+        'required': required,
+        'global': global_budgets,
+        'unsupported': unsupported
+    }
+
+
+def evaluate_cells(index, cells):
+    """
+    Single pass over one day's grouped cost cells (dicts with the index
+    fields and 'cost'); returns the day's spend per budget position
+    """
+    spend = [0.0] * len(index['budgets'])
+    postings = [(field, index['postings'][field]) for field in index['fields']]
+    required = index['required']
+    total = 0.0
+
+    for cell in cells:
+        cost = cell['cost']
+        total += cost
+        hits = {}
+        for field, field_postings in postings:
+            for b in field_postings.get(cell[field], ()):
+                hits[b] = hits.get(b, 0) + 1
+        for b, count in hits.items():
+            if count == required[b]:
+                spend[b] += cost
+
+    for b in index['global']:
+        spend[b] = total
+    return spend
+
+
+def update_window_spend(state, date, day_spend):
+    """
+    Fold one day's spend into a budget's weekly and month-to-date windows
+    A date already folded in is ignored, so reruns do not double count
+    """
+    if state.get('last_date') and date <= state['last_date']:
+        return False
+
+    day = datetime.strptime(date, '%Y-%m-%d').date()
+    iso_year, iso_week, _ = day.isocalendar()
+    week = f"{iso_year}-W{iso_week:02d}"
+    month = date[:7]
+
+    if state.get('week') != week:
+        state['week'], state['weekly'] = week, 0.0
+    if state.get('month') != month:
+        state['month'], state['mtd'] = month, 0.0
+
+    state['daily'] = day_spend
+    state['weekly'] += day_spend
+    state['mtd'] += day_spend
+    state['last_date'] = date
+    return True
+
+
+def evaluate_budgets(dynamodb, date, cells, fields):
+    """
+    Business Purpose: Check every scoped budget against one day's costs
+
+    Returns a list of budget results sorted by how far over the limit they
+    are: {'id', 'name', 'window', 'limit', 'spend', 'utilization', 'breached'}.
+    """
+    index = compile_budgets(load_budgets(dynamodb), fields)
+    for budget in index['unsupported']:
+        print(f"Budget {budget['id']} has an unknown window or filters on dimensions not in the data; skipped")
+
+    day_spend = evaluate_cells(index, cells)
+
+    table = dynamodb.Table(BUDGET_STATE_TABLE)
+    ids = [budget['id'] for budget in index['budgets']]
+    states = {k: from_dynamo(v) for k, v in batch_get_items(dynamodb, table, ids).items()}
+
+    results = []
+    with table.batch_writer(overwrite_by_pkeys=['id']) as batch:
+        for b, budget in enumerate(index['budgets']):
+            state = states.get(budget['id']) or {'id': budget['id']}
+            if update_window_spend(state, date, day_spend[b]):
+                batch.put_item(Item=to_dynamo(state))
+
+            window = budget.get('window', 'daily')
+            spend = state.get(window, 0.0)
+            limit = float(budget['limit'])
+            results.append({
+                'id': budget['id'],
+                'name': budget.get('name', budget['id']),
+                'window': window,
+                'limit': limit,
+                'spend': spend,
+                'utilization': spend / limit if limit else None,
+                'breached': spend > limit
+            })
+
+    results.sort(key=lambda r: r['utilization'] or 0.0, reverse=True)
+    return results
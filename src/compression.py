@@ -0,0 +1,62 @@
+import gzip
+import os
+
+try:
+    import brotli  # Optional: only used when bundled with the Lambda
+except ImportError:
+    brotli = None
+
+# Small bodies are not worth the CPU or the base64 overhead
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+
+
+def supported_encodings():
+    """Encodings we can produce, in server preference order"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Pick the response Content-Encoding from an Accept-Encoding header
+    Honors q-values (q=0 refuses an encoding); returns None for identity
+    """
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for part in accept_encoding.split(','):
+        pieces = [p.strip() for p in part.split(';')]
+        coding = pieces[0].lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in pieces[1:]:
+            if param.startswith('q='):
+                try:
+                    weight = float(param[2:])
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+
+    best = None
+    best_weight = 0.0
+    for coding in supported_encodings():
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def compress(body_bytes, encoding):
+    """Compress raw body bytes with the negotiated encoding"""
+    if encoding == 'gzip':
+        return gzip.compress(body_bytes, compresslevel=GZIP_LEVEL)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(body_bytes, quality=BROTLI_QUALITY)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def should_compress(body_bytes):
+    return len(body_bytes) >= COMPRESSION_MIN_BYTES
@@ -1,25 +1,129 @@
 import json
 import boto3
 from datetime import datetime, timedelta
-from decimal import Decimal
 import os
+from cost_ledger import ledger_rows, store_daily_ledger
+from rolling_stats import update_rolling_stats, series_id
+from cost_explain import explain_change
+from cost_forecast import update_forecasts
+from quantile_sketch import update_sketches, series_quantiles
+from pipeline import stage, run_pipeline
+from accounts import account_names, account_analyses, ACCOUNT_CONCURRENCY
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from cost_cube import COST_METRICS, COST_COLUMNS, metric_values
+from dynamo_helpers import to_dynamo
+from idempotency import RUNS_TABLE, run_key, claim_run, complete_run, release_run
+from session_pool import get_pool
+from idle_resources import scan_idle_resources, idle_recommendation
+
+# Payer accounts: also analyze and report on every linked account
+ANALYZE_LINKED_ACCOUNTS = os.environ.get('ANALYZE_LINKED_ACCOUNTS', 'false').lower() == 'true'
+# Linked-account reports: also scan each member account for idle resources
+SCAN_IDLE_RESOURCES = os.environ.get('SCAN_IDLE_RESOURCES', 'false').lower() == 'true'
+# Stages that send notifications; a retried run does not repeat them
+SENT_STAGES = ('report', 'accounts')
+# Per-account reports already sent are recorded as 'account#<id>'
+SENT_ACCOUNT_PREFIX = 'account#'
 
 def lambda_handler(event, context):
     """
     Business Purpose: Weekly cost analysis with optimization recommendations
     Analyzes 7-day cost trends and provides actionable business insights
+    
+    Runs as a stage DAG: history writes and the report path proceed in
+    parallel, and a failed stage only skips the stages that need its output
     """
     
-    # Initialize AWS clients
+    # Initialize AWS clients (clients are thread-safe; DynamoDB resources are
+    # not, so each stage creates its own)
     ce_client = boto3.client('ce')
-    dynamodb = boto3.resource('dynamodb')
     sns_client = boto3.client('sns')
     
     # Get last 7 days of cost data
     end_date = datetime.now().date()
     start_date = end_date - timedelta(days=7)
     
+    # Retries and duplicate deliveries of the same (account, window) reuse
+    # the first run's outcome instead of recomputing, rewriting and re-sending
+    account_id = context.invoked_function_arn.split(':')[4] if context else 'local'
+    run_id = run_key('weekly-analysis', account_id, start_date, end_date)
+    
+    runs, claim = None, None
     try:
+        runs = boto3.resource('dynamodb').Table(RUNS_TABLE)
+        claim = claim_run(runs, run_id)
+        if claim['status'] == 'completed':
+            print(f"Run {run_id} already completed; returning stored result")
+            return claim['response']
+        if claim['status'] == 'in_progress':
+            return {
+                'statusCode': 202,
+                'body': json.dumps({'message': 'Analysis for this window is already running', 'run_id': run_id})
+            }
+        
+        outputs, report = run_pipeline(analysis_stages(ce_client, sns_client, start_date, end_date, run_id,
+                                                       sent=claim['sent']))
+        
+        failed, sent = run_outcome(report, outputs, claim['sent'])
+        analysis = outputs.get('analyze')
+        body = {
+            'message': 'Weekly analysis complete' if not failed else 'Weekly analysis completed with errors',
+            'run_id': run_id,
+            'failed_stages': failed,
+            'stages': report
+        }
+        if analysis:
+            body.update({
+                'total_weekly_cost': float(analysis['total_cost']),
+                'top_service': analysis['top_service'],
+                'recommendations_count': len(outputs.get('recommendations') or [])
+            })
+        if outputs.get('accounts'):
+            body['linked_accounts'] = outputs['accounts']
+        
+        response = {
+            'statusCode': 500 if failed else 200,
+            'body': json.dumps(body)
+        }
+        
+        if failed:
+            # A retry reruns the pipeline but skips the reports already sent
+            release_run(runs, run_id, claim['token'], sent)
+        else:
+            complete_run(runs, run_id, claim['token'], response)
+        return response
+        
+    except Exception as e:
+        print(f"Error in cost analysis: {str(e)}")
+        if claim and claim['status'] == 'claimed':
+            try:
+                release_run(runs, run_id, claim['token'], claim['sent'])
+            except Exception as release_error:
+                print(f"Error releasing run {run_id}: {str(release_error)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
+
+def analysis_stages(ce_client, sns_client, start_date, end_date, run_id=None, sent=()):
+    """
+    Business Logic: The weekly analysis as a dependency graph
+    
+    fetch -> analyze -> store_analysis
+          -> ledger, rolling_stats, forecasts, sketches -> quantiles
+    analyze + rolling_stats? + quantiles? -> recommendations -> report
+    (? = optional: the report still goes out without those statistics)
+    sent: SENT_STAGES an earlier attempt of this run completed; they are
+    not repeated
+    """
+    def once(name, fn):
+        if name not in sent:
+            return fn
+        def skip(inputs):
+            print(f"Stage {name} already done by an earlier attempt; skipping")
+        return skip
+    
+    def fetch(inputs):
         # Get detailed cost breakdown by service
         response = ce_client.get_cost_and_usage(
             TimePeriod={
@@ -27,41 +131,115 @@ def lambda_handler(event, context):
                 'End': end_date.strftime('%Y-%m-%d')
             },
             Granularity='DAILY',
-            Metrics=['BlendedCost', 'UsageQuantity'],
+            # Every metric in one call; they are stored side by side
+            Metrics=COST_METRICS,
             GroupBy=[
                 {'Type': 'DIMENSION', 'Key': 'SERVICE'},
                 {'Type': 'DIMENSION', 'Key': 'REGION'}
             ]
         )
-        
-        # Analyze the data
-        analysis = analyze_costs(response)
-        
+        return {'response': response, 'rows': ledger_rows(response)}
+    
+    def rows(inputs):
+        return inputs['fetch']['rows']
+    
+    def recommendations(inputs):
+        stats = inputs['rolling_stats'] or {}
+        return generate_recommendations(
+            inputs['analyze'], stats.get(series_id()), rows(inputs), inputs['quantiles']
+        )
+    
+    stages = [
+        stage('fetch', fetch),
+        stage('analyze', lambda inputs: analyze_costs(inputs['fetch']['response']), requires=['fetch']),
         # Store historical data
-        store_cost_data(dynamodb, analysis)
-        
-        # Generate recommendations
+        stage('store_analysis', lambda inputs: store_cost_data(dynamodb_resource(), inputs['analyze'], run_id),
+              requires=['analyze']),
+        stage('ledger', lambda inputs: store_daily_ledger(dynamodb_resource(), rows(inputs)), requires=['fetch']),
+        # Fold settled days into persistent rolling statistics
+        stage('rolling_stats', lambda inputs: update_rolling_stats(dynamodb_resource(), rows(inputs)),
+              requires=['fetch']),
+        stage('forecasts', lambda inputs: update_forecasts(dynamodb_resource(), rows(inputs)), requires=['fetch']),
+        stage('sketches', lambda inputs: update_sketches(dynamodb_resource(), rows(inputs)), requires=['fetch']),
+        stage('quantiles', lambda inputs: get_account_quantiles(dynamodb_resource(), end_date),
+              uses=['sketches']),
+        # Generate recommendations and send the detailed report
+        stage('recommendations', recommendations, requires=['analyze', 'fetch'],
+              uses=['rolling_stats', 'quantiles']),
+        stage('report', once('report', lambda inputs: send_weekly_report(
+            sns_client, inputs['analyze'], inputs['recommendations'])), requires=['analyze', 'recommendations'])
+    ]
+    
+    if ANALYZE_LINKED_ACCOUNTS:
+        reported = {s[len(SENT_ACCOUNT_PREFIX):] for s in sent if s.startswith(SENT_ACCOUNT_PREFIX)}
+        stages.append(stage('accounts', once('accounts', lambda inputs: analyze_linked_accounts(
+            ce_client, sns_client, start_date, end_date, skip=reported))))
+    return stages
+
+def run_outcome(report, outputs, sent=()):
+    """
+    (failed stages, sent side effects) of one pipeline attempt
+    A linked-account stage with failed reports counts as failed, and the
+    accounts it did report are recorded so a retry sends only the rest
+    """
+    failed = {name for name, r in report.items() if r['status'] != 'ok'}
+    accounts = outputs.get('accounts')
+    if accounts and accounts['failed']:
+        failed.add('accounts')
+    sent = set(sent) | {name for name in SENT_STAGES if name in report and name not in failed}
+    if accounts:
+        sent |= {SENT_ACCOUNT_PREFIX + account_id for account_id in accounts['reported']}
+    return sorted(failed), sorted(sent)
+
+def analyze_linked_accounts(ce_client, sns_client, start_date, end_date, skip=()):
+    """
+    Business Purpose: Per-account reports for every linked account of a payer
+    
+    Two account-level CE queries feed all accounts; recommendations and
+    reports then run in parallel, at most ACCOUNT_CONCURRENCY at a time.
+    One account failing does not stop the others. Accounts in skip were
+    reported by an earlier attempt of the run and are not sent again.
+    With SCAN_IDLE_RESOURCES, each report also covers the account's idle
+    volumes and Elastic IPs, found through assumed-role sessions.
+    """
+    names = account_names(boto3.client('organizations'))
+    analyses = account_analyses(ce_client, start_date, end_date, names)
+    active = [analysis for analysis in analyses.values()
+              if analysis['total_cost'] > 0 and analysis['account_id'] not in skip]
+    
+    idle, scan_errors = scan_idle_resources(get_pool(), active) if SCAN_IDLE_RESOURCES else ({}, {})
+    
+    def report_account(analysis):
         recommendations = generate_recommendations(analysis)
-        
-        # Send detailed report
+        idle_rec = idle_recommendation(idle.get(analysis['account_id']))
+        if idle_rec:
+            recommendations.insert(0, idle_rec)
         send_weekly_report(sns_client, analysis, recommendations)
-        
-        return {
-            'statusCode': 200,
-            'body': json.dumps({
-                'message': 'Weekly analysis complete',
-                'total_weekly_cost': float(analysis['total_cost']),
-                'top_service': analysis['top_service'],
-                'recommendations_count': len(recommendations)
-            })
-        }
-        
-    except Exception as e:
-        print(f"Error in cost analysis: {str(e)}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': str(e)})
-        }
+        return len(recommendations)
+    
+    reported, failed = {}, {}
+    with ThreadPoolExecutor(max_workers=ACCOUNT_CONCURRENCY) as executor:
+        futures = {executor.submit(report_account, analysis): analysis['account_id'] for analysis in active}
+        for future in as_completed(futures):
+            account_id = futures[future]
+            try:
+                reported[account_id] = future.result()
+            except Exception as e:
+                print(f"Error reporting account {account_id}: {str(e)}")
+                failed[account_id] = str(e)
+    
+    print(f"Linked accounts: {len(analyses)}, reported: {len(reported)}, failed: {len(failed)}")
+    return {
+        'accounts': len(analyses),
+        'reported': sorted(reported),
+        'already_reported': len(skip),
+        'failed': sorted(failed),
+        'idle_scan_errors': len(scan_errors)
+    }
+
+def dynamodb_resource():
+    """A DynamoDB resource for the calling thread (resources are not thread-safe)"""
+    return boto3.session.Session().resource('dynamodb')
 
 def analyze_costs(cost_data):
     """
@@ -71,6 +249,7 @@ def analyze_costs(cost_data):
     service_costs = {}
     daily_costs = {}
     regional_costs = {}
+    metric_totals = {column: 0.0 for column in COST_COLUMNS}
     
     for result in cost_data['ResultsByTime']:
         date = result['TimePeriod']['Start']
@@ -80,6 +259,9 @@ def analyze_costs(cost_data):
             service = group['Keys'][0] if group['Keys'][0] else 'Unknown'
             region = group['Keys'][1] if len(group['Keys']) > 1 else 'Global'
             cost = float(group['Metrics']['BlendedCost']['Amount'])
+            for column, value in metric_values(group['Metrics']).items():
+                if column in metric_totals:
+                    metric_totals[column] += value
             
             # Aggregate by service
             if service not in service_costs:
@@ -105,14 +287,18 @@ def analyze_costs(cost_data):
         'service_costs': service_costs,
         'regional_costs': regional_costs,
         'daily_costs': daily_costs,
+        'metric_totals': metric_totals,
         'top_service': top_service,
         'top_region': top_region,
         'analysis_date': datetime.now().isoformat()
     }
 
-def generate_recommendations(analysis):
+def generate_recommendations(analysis, account_stats=None, rows=None, account_quantiles=None):
     """
     Business Intelligence: Generate actionable cost optimization recommendations
+    account_stats: rolling statistics for the account total, when available
+    rows: daily ledger rows, used to explain which cells drove a cost spike
+    account_quantiles: daily cost percentiles for the account total, when available
     """
     recommendations = []
     
@@ -141,52 +327,98 @@ def generate_recommendations(analysis):
     # Recommendation 3: Daily cost trends
     daily_costs = list(analysis['daily_costs'].values())
     if len(daily_costs) > 1:
-        avg_cost = sum(daily_costs) / len(daily_costs)
+        # Prefer the persisted 30-day average over re-averaging this window
+        if account_stats and account_stats['days'] >= 7:
+            avg_cost = account_stats['avg_30']
+            baseline = '30-day average'
+        else:
+            avg_cost = sum(daily_costs) / len(daily_costs)
+            baseline = 'average'
+        threshold = avg_cost * 1.5
+        issue_suffix = f'50% above {baseline}'
+        
+        # With enough history, flag days beyond the usual distribution instead
+        if account_quantiles and account_quantiles['days'] >= 28:
+            threshold = max(account_quantiles['p95'], avg_cost)
+            issue_suffix = f"above the 95th percentile of daily spend (${account_quantiles['p95']:.2f})"
+        
         recent_cost = daily_costs[-1]
-        if recent_cost > avg_cost * 1.5:
+        if recent_cost > threshold:
+            action = 'Investigate recent changes in resource usage'
+            drivers = explain_latest_day(rows) if rows else []
+            if drivers:
+                action += ': ' + ', '.join(
+                    f"{' / '.join(d['filter'].values())} (+${d['delta']:.2f})" for d in drivers
+                )
             recommendations.append({
                 'type': 'monitoring',
                 'priority': 'high',
-                'issue': f'Recent daily cost (${recent_cost:.2f}) is 50% above average',
-                'recommendation': 'Investigate recent changes in resource usage',
-                'potential_savings': 'Prevent cost escalation'
+                'issue': f'Recent daily cost (${recent_cost:.2f}) is {issue_suffix}',
+                'recommendation': action,
+                'potential_savings': 'Prevent cost escalation',
+                'drivers': drivers
             })
     
     return recommendations
 
-def store_cost_data(dynamodb, analysis):
+def explain_latest_day(rows):
     """
-    Business Requirement: Store historical data for trend analysis
+    Business Intelligence: Name the service/region cells behind the latest day's jump
+    Compares the latest day against the average day before it
     """
+    dates = sorted({row['date'] for row in rows})
+    if len(dates) < 2:
+        return []
+    
+    latest = [row for row in rows if row['date'] == dates[-1]]
+    earlier_days = len(dates) - 1
+    baseline = [dict(row, cost=row['cost'] / earlier_days) for row in rows if row['date'] != dates[-1]]
+    
+    explanation = explain_change(baseline, latest, ['service', 'region'])
+    return [cell for cell in explanation['cells'] if cell['delta'] > 0]
+
+def get_account_quantiles(dynamodb, end_date, months=3):
+    """Account-total daily cost percentiles over the last few months of sketches"""
+    month_keys = []
+    year, month = end_date.year, end_date.month
+    for _ in range(months):
+        month_keys.append(f"{year}-{month:02d}")
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    
     try:
-        table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE', 'cost-analysis'))
-        
-        # Convert floats to Decimal for DynamoDB
-        def convert_floats(obj):
-            if isinstance(obj, float):
-                return Decimal(str(obj))
-            elif isinstance(obj, dict):
-                return {k: convert_floats(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [convert_floats(v) for v in obj]
-            else:
-                return obj
-        
-        analysis_item = convert_floats(analysis)
-        analysis_item['id'] = analysis['analysis_date']
-        
-        table.put_item(Item=analysis_item)
-        print("Cost data stored successfully")
-        
+        return series_quantiles(dynamodb, series_id(), month_keys, qs=(0.5, 0.95))
     except Exception as e:
-        print(f"Error storing data: {str(e)}")
+        print(f"Error reading quantiles: {str(e)}")
+        return None
+
+def store_cost_data(dynamodb, analysis, item_id=None):
+    """
+    Business Requirement: Store historical data for trend analysis
+    item_id: the run's (account, window) key, so re-runs overwrite one item
+    """
+    table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE', 'cost-analysis'))
+    
+    # Floats become Decimal and the (name, cost) tuples become lists
+    analysis_item = to_dynamo(analysis)
+    analysis_item['id'] = item_id or analysis['analysis_date']
+    
+    table.put_item(Item=analysis_item)
+    print("Cost data stored successfully")
 
 def send_weekly_report(sns_client, analysis, recommendations):
     """
     Business Communication: Send actionable weekly cost report
     """
+    account_id = analysis.get('account_id')
     message = "📊 Weekly AWS Cost Analysis Report\n\n"
+    if account_id:
+        message += f"🏢 Account: {analysis['account_name']} ({account_id})\n"
     message += f"💰 Total Weekly Cost: ${analysis['total_cost']:.2f}\n"
+    totals = analysis.get('metric_totals')
+    if totals:
+        # Amortized views spread RI/Savings Plans fees; net amortized also applies discounts
+        message += (f"🧾 Unblended ${totals['unblended_cost']:.2f} | Amortized ${totals['amortized_cost']:.2f} | "
+                    f"Net amortized ${totals['net_amortized_cost']:.2f}\n")
     message += f"📈 Top Service: {analysis['top_service'][0]} (${analysis['top_service'][1]:.2f})\n"
     message += f"🌍 Top Region: {analysis['top_region'][0]} (${analysis['top_region'][1]:.2f})\n\n"
     
@@ -205,12 +437,16 @@ def send_weekly_report(sns_client, analysis, recommendations):
             percentage = (cost / analysis['total_cost']) * 100 if analysis['total_cost'] > 0 else 0
             message += f"• {service}: ${cost:.2f} ({percentage:.1f}%)\n"
     
-    try:
-        sns_client.publish(
-            TopicArn=os.environ['SNS_TOPIC_ARN'],
-            Message=message,
-            Subject=f"Weekly Cost Analysis: ${analysis['total_cost']:.2f}"
-        )
-        print("Weekly report sent successfully")
-    except Exception as e:
-        print(f"Error sending report: {str(e)}")
\ No newline at end of file
+    publish_args = {
+        'TopicArn': os.environ['SNS_TOPIC_ARN'],
+        'Message': message,
+        'Subject': f"Weekly Cost Analysis: ${analysis['total_cost']:.2f}"
+    }
+    if account_id:
+        # Subscribers can filter per-account reports on this attribute
+        publish_args['Subject'] = f"Weekly Cost Analysis: ${analysis['total_cost']:.2f} ({analysis['account_name']})"[:100]
+        publish_args['MessageAttributes'] = {
+            'account_id': {'DataType': 'String', 'StringValue': account_id}
+        }
+    sns_client.publish(**publish_args)
+    print("Weekly report sent successfully")
\ No newline at end of file
@@ -1,7 +1,79 @@
-﻿import json
+﻿import base64
+import json
+import os
+import time
 import boto3
 from datetime import datetime, timedelta
 from decimal import Decimal
+from response_cache import make_cache_key, normalize_params, get_cached_response, get_encoded_body
+from compression import negotiate_encoding, should_compress
+from response_formats import (
+    validate_format_params, to_columnar, pack_msgpack, CONTENT_TYPES
+)
+from downsample import downsample_rows
+from top_k import top_k_stream, top, new_top_k, add, CAPACITY_FACTOR
+from cost_cube import COST_METRICS, COST_COLUMNS, METRIC_FIELDS, metric_values
+from cost_rollups import DynamoRollupStore
+from cost_compare import compare_periods, parse_period
+from accounts import account_names
+from cost_forecast import load_forecast_states, month_end_projection
+from resource_costs import top_resources, RESOURCE_DAYS
+from cost_store import COST_STORE_DIR, STORE_FIELDS, PARTITION_KEYS, query_store, store_exists
+
+# Cost Explorer refreshes a few times per day, so short browser caching plus a
+# longer shared (CDN) lifetime keeps dashboards current without re-invoking us
+CACHE_MAX_AGE = int(os.environ.get('CACHE_MAX_AGE', '300'))
+CACHE_S_MAXAGE = int(os.environ.get('CACHE_S_MAXAGE', '900'))
+CACHE_STALE_WHILE_REVALIDATE = int(os.environ.get('CACHE_STALE_WHILE_REVALIDATE', '3600'))
+
+# Time-series window limits (CE keeps HOURLY data for 14 days only)
+MAX_DAYS = {'DAILY': 365, 'HOURLY': 14}
+MIN_POINTS = 3
+
+# ?metric= values; every fetch requests all metrics at once and every
+# response carries all of them, so clients switch metric without a new call
+METRICS = {
+    'blended': 'BlendedCost',
+    'unblended': 'UnblendedCost',
+    'amortized': 'AmortizedCost',
+    'net_amortized': 'NetAmortizedCost'
+}
+DEFAULT_METRIC = 'blended'
+FETCH_CACHE_TTL = int(os.environ.get('FETCH_CACHE_TTL', '300'))
+_fetches = {}
+
+# Breakdown size limits
+DEFAULT_TOP = 10
+MAX_TOP = 100
+
+# Services drilled into by /api/resources when none are named
+RESOURCE_TOP_SERVICES = int(os.environ.get('RESOURCE_TOP_SERVICES', '5'))
+
+# Drill-downs over the local CUR store
+DRILLDOWN_DAYS = 30
+DRILLDOWN_FIELDS = list(PARTITION_KEYS) + [f for f in STORE_FIELDS if f not in PARTITION_KEYS]
+
+# Parameters each endpoint reads; anything else is dropped before caching,
+# so unrelated params cannot create new cache entries (and CE calls)
+COMMON_PARAMS = ('format', 'encoding')
+SERIES_PARAMS = ('days', 'granularity', 'max_points', 'metric')
+BREAKDOWN_PARAMS = ('top', 'metric')
+ENDPOINT_PARAMS = {
+    'current': SERIES_PARAMS,
+    'weekly': SERIES_PARAMS,
+    'services': BREAKDOWN_PARAMS,
+    'regions': BREAKDOWN_PARAMS,
+    'usage-types': BREAKDOWN_PARAMS,
+    'tags': BREAKDOWN_PARAMS + ('tag',),
+    'accounts': BREAKDOWN_PARAMS,
+    'resources': ('service', 'days', 'top'),
+    'forecast': (),
+    'compare': ('a', 'b'),
+    'drilldown': ('start', 'end', 'group_by', 'top') + tuple(f for f in DRILLDOWN_FIELDS if f != 'date')
+}
+
+# Fields that change on every rebuild without the cost data changing
+VOLATILE_FIELDS = {'last_updated'}
 
 def lambda_handler(event, context):
     """
@@ -13,8 +85,9 @@ def lambda_handler(event, context):
     headers = {
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': 'Content-Type',
-        'Access-Control-Allow-Methods': 'GET, POST, OPTIONS'
+        'Access-Control-Allow-Headers': 'Content-Type, If-None-Match',
+        'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+        'Access-Control-Expose-Headers': 'ETag'
     }
     
     try:
@@ -30,28 +103,81 @@ def lambda_handler(event, context):
         query_params = event.get('queryStringParameters') or {}
         endpoint = event.get('pathParameters', {}).get('endpoint', 'current')
         
-        ce_client = boto3.client('ce')
-        
-        # Route to different endpoints
-        if endpoint == 'current':
-            data = get_current_costs(ce_client)
-        elif endpoint == 'weekly':
-            data = get_weekly_costs(ce_client)
-        elif endpoint == 'services':
-            data = get_service_breakdown(ce_client)
-        elif endpoint == 'regions':
-            data = get_regional_breakdown(ce_client)
-        else:
+        if endpoint not in ENDPOINTS:
             return {
                 'statusCode': 404,
                 'headers': headers,
                 'body': json.dumps({'error': 'Endpoint not found'})
             }
+        query_params = endpoint_params(endpoint, query_params)
+        
+        format_error = (validate_format_params(query_params)
+                        or validate_series_params(query_params)
+                        or validate_breakdown_params(endpoint, query_params)
+                        or validate_compare_params(endpoint, query_params)
+                        or validate_metric_params(query_params)
+                        or validate_drilldown_params(endpoint, query_params))
+        if format_error:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': format_error})
+            }
+        
+        # The drill-down store lives on the file system cur-refresh writes to
+        store_error = check_drilldown_store(endpoint)
+        if store_error:
+            return {
+                'statusCode': 503,
+                'headers': headers,
+                'body': json.dumps({'error': store_error})
+            }
+        
+        # Serve pre-serialized body from cache (stale-while-revalidate)
+        cache_key = make_cache_key(endpoint, query_params)
+        entry = get_cached_response(
+            cache_key,
+            lambda: build_response_body(endpoint, query_params)
+        )
+        
+        # Negotiate compression; each encoding is its own representation
+        encoding = None
+        if should_compress(entry['body_bytes']):
+            encoding = negotiate_encoding(get_header(event, 'Accept-Encoding'))
+        etag = representation_etag(entry['etag'], encoding)
+        
+        # Conditional GET: unchanged data costs the client no body transfer
+        headers['Content-Type'] = entry['content_type']
+        headers.update(caching_headers(etag))
+        if etag_matches(get_header(event, 'If-None-Match'), etag):
+            return {
+                'statusCode': 304,
+                'headers': headers,
+                'body': ''
+            }
+        
+        # API Gateway decodes base64 bodies when binary media types are enabled
+        if encoding:
+            headers['Content-Encoding'] = encoding
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': base64.b64encode(get_encoded_body(entry, encoding)).decode('ascii'),
+                'isBase64Encoded': True
+            }
+        
+        if entry['body'] is None:
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': base64.b64encode(entry['body_bytes']).decode('ascii'),
+                'isBase64Encoded': True
+            }
         
         return {
             'statusCode': 200,
             'headers': headers,
-            'body': json.dumps(data, default=decimal_default)
+            'body': entry['body']
         }
         
     except Exception as e:
@@ -62,160 +188,506 @@ def lambda_handler(event, context):
             'body': json.dumps({'error': str(e)})
         }
 
-def get_current_costs(ce_client):
-    """Get today's and yesterday's costs for real-time dashboard"""
+def endpoint_params(endpoint, query_params):
+    """
+    Normalized parameters this endpoint reads; validation, the cache key and
+    the builder all use this dict
+    """
+    used = COMMON_PARAMS + ENDPOINT_PARAMS[endpoint]
+    return {key: value for key, value in normalize_params(query_params).items() if key in used}
+
+def build_response_body(endpoint, query_params):
+    """
+    Run the endpoint aggregation and serialize it once for the cache
+    Returns (body, data_version, content_type); the version ignores volatile
+    timestamps so the ETag only changes when the cost data does
+    """
+    fmt = query_params.get('format', 'json')
+    encoding = query_params.get('encoding', 'json')
+    
+    ce_client = boto3.client('ce')
+    data = ENDPOINTS[endpoint](ce_client, query_params)
+    if fmt == 'columnar':
+        data = to_columnar(data)
+    
+    if encoding == 'msgpack':
+        body = pack_msgpack(data, default=decimal_default)
+    else:
+        body = json.dumps(data, default=decimal_default)
+    
+    stable = {k: v for k, v in data.items() if k not in VOLATILE_FIELDS}
+    data_version = f"{endpoint}|{fmt}|{encoding}|" + json.dumps(stable, default=decimal_default, sort_keys=True)
+    return body, data_version, CONTENT_TYPES[encoding]
+
+def get_header(event, name):
+    """Case-insensitive request header lookup (API Gateway keeps client casing)"""
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored"""
+    if not if_none_match:
+        return False
+    if etag.startswith('W/'):
+        etag = etag[2:]
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+def representation_etag(etag, encoding):
+    """ETags differ per Content-Encoding ("abc" -> "abc-gzip", W/"abc" -> W/"abc-gzip")"""
+    if not encoding:
+        return etag
+    return etag[:-1] + f'-{encoding}"'
+
+def caching_headers(etag):
+    """HTTP caching headers for browsers and any CDN in front of API Gateway"""
+    return {
+        'ETag': etag,
+        'Cache-Control': (
+            f"public, max-age={CACHE_MAX_AGE}, s-maxage={CACHE_S_MAXAGE}, "
+            f"stale-while-revalidate={CACHE_STALE_WHILE_REVALIDATE}"
+        ),
+        'Vary': 'Accept-Encoding'
+    }
+
+def validate_series_params(query_params):
+    """Return an error message for bad days/granularity/max_points, else None"""
+    granularity = query_params.get('granularity', 'DAILY').upper()
+    if granularity not in MAX_DAYS:
+        return f"Unsupported granularity '{granularity}' (expected DAILY or HOURLY)"
+    
+    for name, minimum, maximum in (('days', 1, MAX_DAYS[granularity]),
+                                   ('max_points', MIN_POINTS, None)):
+        if name not in query_params:
+            continue
+        try:
+            value = int(query_params[name])
+        except (TypeError, ValueError):
+            return f"'{name}' must be an integer"
+        if value < minimum or (maximum is not None and value > maximum):
+            limit = f"between {minimum} and {maximum}" if maximum else f"at least {minimum}"
+            return f"'{name}' must be {limit} for {granularity} data"
+    return None
+
+def validate_breakdown_params(endpoint, query_params):
+    """Return an error message for bad top/tag parameters, else None"""
+    if endpoint == 'tags' and not query_params.get('tag'):
+        return "'tag' is required for the tags endpoint"
+    if endpoint == 'resources' and 'days' in query_params:
+        try:
+            days = int(query_params['days'])
+        except (TypeError, ValueError):
+            return "'days' must be an integer"
+        if days < 1 or days > RESOURCE_DAYS:
+            return f"'days' must be between 1 and {RESOURCE_DAYS} for resource-level data"
+    if 'top' in query_params:
+        try:
+            value = int(query_params['top'])
+        except (TypeError, ValueError):
+            return "'top' must be an integer"
+        if value < 1 or value > MAX_TOP:
+            return f"'top' must be between 1 and {MAX_TOP}"
+    return None
+
+def validate_compare_params(endpoint, query_params):
+    """Return an error message for missing or malformed compare periods, else None"""
+    if endpoint != 'compare':
+        return None
+    for name in ('a', 'b'):
+        if not query_params.get(name):
+            return f"'{name}' is required for the compare endpoint"
+        try:
+            parse_period(query_params[name])
+        except ValueError as e:
+            return str(e)
+    return None
+
+def validate_metric_params(query_params):
+    """Return an error message for an unknown metric, else None"""
+    metric = query_params.get('metric', DEFAULT_METRIC)
+    if metric not in METRICS:
+        return f"Unsupported metric '{metric}' (expected {', '.join(METRICS)})"
+    return None
+
+def metric_column(query_params):
+    """Row column holding the requested metric ('cost' for blended)"""
+    return METRIC_FIELDS[METRICS[(query_params or {}).get('metric', DEFAULT_METRIC)]]
+
+def cached_fetch(key, fetch):
+    """
+    Reuse a Cost Explorer fetch for FETCH_CACHE_TTL within a warm Lambda
+    Fetches carry every metric, so responses for different ?metric= values
+    (and the dashboard's metric toggle) share one call
+    """
+    now = time.time()
+    entry = _fetches.get(key)
+    if entry and now - entry[0] < FETCH_CACHE_TTL:
+        return entry[1]
+    value = fetch()
+    for stale in [k for k, (fetched, _) in _fetches.items() if now - fetched >= FETCH_CACHE_TTL]:
+        _fetches.pop(stale, None)
+    _fetches[key] = (now, value)
+    return value
+
+def validate_drilldown_params(endpoint, query_params):
+    """Return an error message for unknown drill-down fields or bad dates, else None"""
+    if endpoint != 'drilldown':
+        return None
+    group_by = [f for f in query_params.get('group_by', 'service').split(',') if f]
+    unknown = [f for f in group_by if f not in DRILLDOWN_FIELDS]
+    if unknown:
+        return f"Unknown group_by fields: {', '.join(unknown)} (expected {', '.join(DRILLDOWN_FIELDS)})"
+    for name in ('start', 'end'):
+        if name in query_params:
+            try:
+                datetime.strptime(query_params[name], '%Y-%m-%d')
+            except ValueError:
+                return f"'{name}' must be a YYYY-MM-DD date"
+    return None
+
+def check_drilldown_store(endpoint):
+    """Return an error message when the CUR store is not mounted in this Lambda, else None"""
+    if endpoint != 'drilldown' or store_exists(COST_STORE_DIR):
+        return None
+    return (f"CUR store not found at {COST_STORE_DIR}: mount the EFS file system that "
+            f"cur-refresh writes to and point COST_STORE_DIR at it")
+
+def series_params(query_params, default_days):
+    """Parse (days, granularity, max_points) for time-series endpoints"""
+    days = int(query_params.get('days', default_days))
+    granularity = query_params.get('granularity', 'DAILY').upper()
+    max_points = int(query_params['max_points']) if 'max_points' in query_params else None
+    return days, granularity, max_points
+
+def fetch_cost_series(ce_client, days, granularity):
+    """
+    Get [{'date', 'cost', <other metric columns>}] for the last N days,
+    following pagination; cached per (days, granularity) with every metric
+    """
     end_date = datetime.now().date()
-    start_date = end_date - timedelta(days=2)
+    return cached_fetch(('series', days, granularity, end_date.isoformat()),
+                        lambda: _fetch_cost_series(ce_client, end_date, days, granularity))
+
+def _fetch_cost_series(ce_client, end_date, days, granularity):
+    start_date = end_date - timedelta(days=days)
     
-    response = ce_client.get_cost_and_usage(
-        TimePeriod={
+    if granularity == 'HOURLY':
+        time_period = {
+            'Start': start_date.strftime('%Y-%m-%dT00:00:00Z'),
+            'End': end_date.strftime('%Y-%m-%dT00:00:00Z')
+        }
+    else:
+        time_period = {
             'Start': start_date.strftime('%Y-%m-%d'),
             'End': end_date.strftime('%Y-%m-%d')
-        },
-        Granularity='DAILY',
-        Metrics=['BlendedCost']
-    )
-    
-    daily_costs = []
-    total_cost = 0
-    
-    for result in response['ResultsByTime']:
-        date = result['TimePeriod']['Start']
-        cost = float(result['Total']['BlendedCost']['Amount'])
-        daily_costs.append({
-            'date': date,
-            'cost': cost
-        })
-        total_cost += cost
+        }
     
-    return {
+    series = []
+    kwargs = {
+        'TimePeriod': time_period,
+        'Granularity': granularity,
+        'Metrics': COST_METRICS
+    }
+    while True:
+        response = ce_client.get_cost_and_usage(**kwargs)
+        for result in response['ResultsByTime']:
+            row = {'date': result['TimePeriod']['Start']}
+            row.update(metric_values(result['Total']))
+            series.append(row)
+        if not response.get('NextPageToken'):
+            return series
+        kwargs['NextPageToken'] = response['NextPageToken']
+
+def select_metric(rows, column):
+    """
+    [{'date', 'cost', <metric name>...}] with 'cost' taken from the requested
+    metric column and every metric alongside it for client-side switching
+    """
+    return [dict({name: row.get(METRIC_FIELDS[ce_metric], 0.0) for name, ce_metric in METRICS.items()},
+                 date=row['date'], cost=row.get(column, 0.0))
+            for row in rows]
+
+def metric_totals(rows):
+    """{metric name: sum over rows} for rows from select_metric"""
+    return {name: sum(row[name] for row in rows) for name in METRICS}
+
+def get_current_costs(ce_client, query_params=None):
+    """Get today's and yesterday's costs for real-time dashboard"""
+    days, granularity, max_points = series_params(query_params or {}, 2)
+    daily_costs = select_metric(fetch_cost_series(ce_client, days, granularity), metric_column(query_params))
+    total_cost = sum(row['cost'] for row in daily_costs)
+    
+    result = {
+        'metric': (query_params or {}).get('metric', DEFAULT_METRIC),
         'total_cost': total_cost,
+        'metrics': {name: {'total_cost': total} for name, total in metric_totals(daily_costs).items()},
         'daily_costs': daily_costs,
         'last_updated': datetime.now().isoformat()
     }
+    
+    # Downsample for charting after totals are computed from the full series
+    if max_points and len(daily_costs) > max_points:
+        result['daily_costs'] = downsample_rows(daily_costs, max_points)
+        result['downsampled_from'] = len(daily_costs)
+    return result
 
-def get_weekly_costs(ce_client):
+def get_weekly_costs(ce_client, query_params=None):
     """Get last 7 days of costs for trend analysis"""
-    end_date = datetime.now().date()
-    start_date = end_date - timedelta(days=7)
-    
-    response = ce_client.get_cost_and_usage(
-        TimePeriod={
-            'Start': start_date.strftime('%Y-%m-%d'),
-            'End': end_date.strftime('%Y-%m-%d')
-        },
-        Granularity='DAILY',
-        Metrics=['BlendedCost']
-    )
-    
-    weekly_costs = []
-    total_weekly = 0
-    
-    for result in response['ResultsByTime']:
-        date = result['TimePeriod']['Start']
-        cost = float(result['Total']['BlendedCost']['Amount'])
-        weekly_costs.append({
-            'date': date,
-            'cost': cost
-        })
-        total_weekly += cost
+    days, granularity, max_points = series_params(query_params or {}, 7)
+    weekly_costs = select_metric(fetch_cost_series(ce_client, days, granularity), metric_column(query_params))
+    total_weekly = sum(row['cost'] for row in weekly_costs)
     
-    return {
+    result = {
+        'metric': (query_params or {}).get('metric', DEFAULT_METRIC),
         'weekly_total': total_weekly,
+        'metrics': {name: {'weekly_total': total,
+                           'average_daily': total / len(weekly_costs) if weekly_costs else 0}
+                    for name, total in metric_totals(weekly_costs).items()},
         'daily_breakdown': weekly_costs,
         'average_daily': total_weekly / len(weekly_costs) if weekly_costs else 0
     }
+    
+    # Downsample for charting after totals are computed from the full series
+    if max_points and len(weekly_costs) > max_points:
+        result['daily_breakdown'] = downsample_rows(weekly_costs, max_points)
+        result['downsampled_from'] = len(weekly_costs)
+    return result
 
-def get_service_breakdown(ce_client):
-    """Get cost breakdown by AWS service - FIXED VERSION"""
+def iter_group_costs(ce_client, group_by, days=7):
+    """Stream (key, {metric column: value}) for each group and day, following CE pagination"""
     end_date = datetime.now().date()
-    start_date = end_date - timedelta(days=7)
+    start_date = end_date - timedelta(days=days)
     
-    response = ce_client.get_cost_and_usage(
-        TimePeriod={
+    kwargs = {
+        'TimePeriod': {
             'Start': start_date.strftime('%Y-%m-%d'),
             'End': end_date.strftime('%Y-%m-%d')
         },
-        Granularity='DAILY',  # Fixed: Changed from WEEKLY to DAILY
-        Metrics=['BlendedCost'],
-        GroupBy=[{'Type': 'DIMENSION', 'Key': 'SERVICE'}]
-    )
-    
-    services = {}
-    total_cost = 0
-    
-    # Aggregate costs across all days
-    for result in response['ResultsByTime']:
-        for group in result['Groups']:
-            service = group['Keys'][0] if group['Keys'][0] else 'Unknown'
-            cost = float(group['Metrics']['BlendedCost']['Amount'])
-            if cost > 0:
-                if service not in services:
-                    services[service] = 0
-                services[service] += cost
-                total_cost += cost
-    
-    # Convert to list and sort
-    service_list = []
-    for service, cost in services.items():
-        service_list.append({
-            'service': service,
+        'Granularity': 'DAILY',
+        'Metrics': COST_METRICS,
+        'GroupBy': [group_by]
+    }
+    while True:
+        response = ce_client.get_cost_and_usage(**kwargs)
+        for result in response['ResultsByTime']:
+            for group in result['Groups']:
+                yield group['Keys'][0], metric_values(group['Metrics'])
+        if not response.get('NextPageToken'):
+            return
+        kwargs['NextPageToken'] = response['NextPageToken']
+
+def group_summaries(ce_client, group_by, default, capacity, transform=None):
+    """
+    One pass over the CE groups into one bounded Space-Saving summary per
+    cost column, cached for FETCH_CACHE_TTL. Usage quantity of the costed
+    groups is summed in the same per-key record, so it is exact for keys
+    without error
+    """
+    def build():
+        summaries = {column: new_top_k(capacity) for column in COST_COLUMNS}
+        for key, values in iter_group_costs(ce_client, group_by):
+            key = (transform(key) if transform else key) or default
+            for column, summary in summaries.items():
+                if values.get(column, 0.0) > 0:
+                    add(summary, key, values[column], values.get('usage_quantity', 0.0))
+        return summaries
+    
+    key = ('groups', json.dumps(group_by, sort_keys=True), capacity, datetime.now().date().isoformat())
+    return cached_fetch(key, build)
+
+def get_breakdown(ce_client, group_by, label, default, query_params=None, transform=None, unit_costs=False):
+    """
+    Top-N cost breakdown for one grouping plus an 'other' bucket
+    Streams groups through bounded Space-Saving summaries, so tag values and
+    usage types with tens of thousands of keys stay in bounded memory.
+    Every metric is returned under 'metrics'; the top-level fields repeat
+    the requested one. unit_costs adds cost per usage quantity (only
+    meaningful when every group has a single unit, e.g. usage types)
+    """
+    top_n = int((query_params or {}).get('top', DEFAULT_TOP))
+    summaries = group_summaries(ce_client, group_by, default, max(top_n * CAPACITY_FACTOR, top_n), transform)
+    breakdowns = {name: summary_breakdown(summaries[METRIC_FIELDS[ce_metric]], label, top_n, unit_costs)
+                  for name, ce_metric in METRICS.items()}
+    metric = (query_params or {}).get('metric', DEFAULT_METRIC)
+    return {
+        'metric': metric,
+        **breakdowns[metric],
+        'metrics': breakdowns
+    }
+
+def summary_breakdown(summary, label, top_n, unit_costs=False):
+    """Top-N entries of one metric's summary plus its 'other' bucket"""
+    items, other, other_error = top(summary, top_n)
+    total_cost = summary['total']
+    
+    item_list = []
+    for key, cost, error in items:
+        item = {
+            label: key,
             'cost': cost,
             'percentage': (cost / total_cost * 100) if total_cost > 0 else 0
-        })
-    
-    service_list.sort(key=lambda x: x['cost'], reverse=True)
+        }
+        if error:
+            item['max_error'] = error
+        # Usage is only exact for keys tracked since their first group
+        usage = summary['quantities'].get(key)
+        if unit_costs and not error and usage:
+            item['usage_quantity'] = usage
+            item['unit_cost'] = cost / usage
+        item_list.append(item)
     
     return {
         'total_cost': total_cost,
-        'services': service_list[:10]  # Top 10 services
+        f"{label}s": item_list,
+        'other': other_bucket(other, other_error, total_cost)
     }
 
-def get_regional_breakdown(ce_client):
-    """Get cost breakdown by AWS region - FIXED VERSION"""
-    end_date = datetime.now().date()
-    start_date = end_date - timedelta(days=7)
+def other_bucket(other, other_error, total_cost):
+    """'other' row; max_error is how much it may understate the rest of the spend"""
+    bucket = {
+        'cost': other,
+        'percentage': (other / total_cost * 100) if total_cost > 0 else 0
+    }
+    if other_error:
+        bucket['max_error'] = other_error
+    return bucket
+
+def get_service_breakdown(ce_client, query_params=None):
+    """Get cost breakdown by AWS service"""
+    return get_breakdown(ce_client, {'Type': 'DIMENSION', 'Key': 'SERVICE'},
+                         'service', 'Unknown', query_params)
+
+def get_regional_breakdown(ce_client, query_params=None):
+    """Get cost breakdown by AWS region"""
+    return get_breakdown(ce_client, {'Type': 'DIMENSION', 'Key': 'REGION'},
+                         'region', 'Global', query_params)
+
+def get_usage_type_breakdown(ce_client, query_params=None):
+    """Get cost breakdown by usage type (high cardinality)"""
+    return get_breakdown(ce_client, {'Type': 'DIMENSION', 'Key': 'USAGE_TYPE'},
+                         'usage_type', 'Unknown', query_params, unit_costs=True)
+
+def get_tag_breakdown(ce_client, query_params=None):
+    """Get cost breakdown by the values of one cost allocation tag"""
+    tag_key = query_params['tag']
+    prefix = f"{tag_key}$"
     
-    response = ce_client.get_cost_and_usage(
-        TimePeriod={
-            'Start': start_date.strftime('%Y-%m-%d'),
-            'End': end_date.strftime('%Y-%m-%d')
-        },
-        Granularity='DAILY',  # Fixed: Changed from WEEKLY to DAILY
-        Metrics=['BlendedCost'],
-        GroupBy=[{'Type': 'DIMENSION', 'Key': 'REGION'}]
-    )
-    
-    regions = {}
-    total_cost = 0
-    
-    # Aggregate costs across all days
-    for result in response['ResultsByTime']:
-        for group in result['Groups']:
-            region = group['Keys'][0] if group['Keys'][0] else 'Global'
-            cost = float(group['Metrics']['BlendedCost']['Amount'])
-            if cost > 0:
-                if region not in regions:
-                    regions[region] = 0
-                regions[region] += cost
-                total_cost += cost
-    
-    # Convert to list and sort
-    region_list = []
-    for region, cost in regions.items():
-        region_list.append({
-            'region': region,
-            'cost': cost,
-            'percentage': (cost / total_cost * 100) if total_cost > 0 else 0
-        })
+    def strip_prefix(key):
+        # CE returns tag groups as "<key>$<value>"; an empty value means untagged
+        return key[len(prefix):] if key.startswith(prefix) else key
+    
+    return get_breakdown(ce_client, {'Type': 'TAG', 'Key': tag_key},
+                         'tag_value', '(untagged)', query_params, strip_prefix)
+
+def get_account_breakdown(ce_client, query_params=None):
+    """Get cost breakdown by linked account (payer accounts), with account names"""
+    result = get_breakdown(ce_client, {'Type': 'DIMENSION', 'Key': 'LINKED_ACCOUNT'},
+                           'account', 'Unknown', query_params)
+    names = account_names(boto3.client('organizations'))
+    for breakdown in result['metrics'].values():
+        for item in breakdown['accounts']:
+            item['account_name'] = names.get(item['account'], item['account'])
+    return result
+
+def get_resource_breakdown(ce_client, query_params=None):
+    """
+    Top resources per service from CE's resource-level data (last 14 days)
+    ?service=A,B names services; otherwise the top RESOURCE_TOP_SERVICES by cost
+    """
+    query_params = query_params or {}
+    days = int(query_params.get('days', 7))
+    top_n = int(query_params.get('top', DEFAULT_TOP))
+    if query_params.get('service'):
+        services = [s for s in query_params['service'].split(',') if s]
+    else:
+        group_by = {'Type': 'DIMENSION', 'Key': 'SERVICE'}
+        summary = top_k_stream(
+            ((key, values['cost']) for key, values in iter_group_costs(ce_client, group_by, days)
+             if values.get('cost', 0) > 0),
+            RESOURCE_TOP_SERVICES
+        )
+        services = [key for key, _, _ in top(summary, RESOURCE_TOP_SERVICES)[0]]
+    
+    return {
+        'days': days,
+        'services': top_resources(boto3.resource('dynamodb'), ce_client, services, days, top_n),
+        'last_updated': datetime.now().isoformat()
+    }
+
+def get_forecast(ce_client, query_params=None):
+    """Get month-end projections from persisted forecast state (no CE calls)"""
+    dynamodb = boto3.resource('dynamodb')
+    
+    total = None
+    services = []
+    states = load_forecast_states(dynamodb)
+    # Every live state is advanced to the same settled day; older ones were
+    # left behind (e.g. by a renamed service) and are not projected
+    newest = max((state['last_date'] for state in states if state['last_date']), default=None)
+    for state in states:
+        if state['last_date'] and state['last_date'] < newest:
+            continue
+        service = state['id'].split('#')[0]
+        projection = month_end_projection(state)
+        if service == '*':
+            total = projection
+        else:
+            projection['service'] = service
+            services.append(projection)
     
-    region_list.sort(key=lambda x: x['cost'], reverse=True)
+    services.sort(key=lambda x: x['projected_total'], reverse=True)
     
     return {
-        'total_cost': total_cost,
-        'regions': region_list[:10]  # Top 10 regions
+        'total': total,
+        'services': services[:10],  # Top 10 services
+        'last_updated': datetime.now().isoformat()
     }
 
+def get_comparison(ce_client, query_params=None):
+    """Compare two periods from stored rollups (no CE calls)"""
+    store = DynamoRollupStore(boto3.resource('dynamodb'))
+    return compare_periods(store, query_params['a'], query_params['b'])
+
+def get_drilldown(ce_client, query_params=None):
+    """
+    Group-by/filter over the CUR store (no CE calls), e.g.
+    ?group_by=usage_type,resource_id&service=AmazonEC2&region=us-east-1
+    Any store field given as a parameter filters on its comma-separated values
+    """
+    query_params = query_params or {}
+    end = query_params.get('end', datetime.now().date().isoformat())
+    start = query_params.get('start', (datetime.strptime(end, '%Y-%m-%d').date()
+                                       - timedelta(days=DRILLDOWN_DAYS)).isoformat())
+    group_by = [f for f in query_params.get('group_by', 'service').split(',') if f]
+    filters = {field: query_params[field].split(',')
+               for field in DRILLDOWN_FIELDS if field != 'date' and field in query_params}
+    top_n = int(query_params.get('top', DEFAULT_TOP))
+    return query_store(COST_STORE_DIR, start, end, group_by, filters, limit=top_n)
+
+# Route table for API endpoints
+ENDPOINTS = {
+    'current': get_current_costs,
+    'weekly': get_weekly_costs,
+    'services': get_service_breakdown,
+    'regions': get_regional_breakdown,
+    'usage-types': get_usage_type_breakdown,
+    'tags': get_tag_breakdown,
+    'accounts': get_account_breakdown,
+    'resources': get_resource_breakdown,
+    'forecast': get_forecast,
+    'compare': get_comparison,
+    'drilldown': get_drilldown
+}
+
 def decimal_default(obj):
     """JSON serializer for Decimal objects"""
     if isinstance(obj, Decimal):
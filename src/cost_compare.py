@@ -0,0 +1,174 @@
+import re
+from datetime import date, datetime, timedelta
+
+from cost_rollups import rollup_id, ALL
+
+MAX_RANGE_DAYS = 366
+MAX_LINE_ITEMS = 50
+
+DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+PERIOD_PATTERNS = (
+    ('week', re.compile(r'^\d{4}-W\d{2}$')),
+    ('month', re.compile(r'^\d{4}-\d{2}$')),
+    ('quarter', re.compile(r'^\d{4}-Q[1-4]$'))
+)
+
+
+def parse_period(spec):
+    """
+    Turn a period spec into rollup references [(period, key), ...]
+
+    Accepts '2024-W20', '2024-05', '2024-Q2', a single day '2024-05-14' or an
+    inclusive range '2024-05-01:2024-05-20'. Ranges are covered with the
+    fewest rollups (whole months, then whole ISO weeks, then days).
+    Raises ValueError for anything else, including months, ISO weeks and
+    days that do not exist ('2024-13', '2024-W60', '2024-02-30').
+    """
+    spec = (spec or '').strip()
+    for period, pattern in PERIOD_PATTERNS:
+        if pattern.match(spec):
+            _check_exists(period, spec)
+            return [(period, spec)]
+
+    if DATE_RE.match(spec):
+        spec = f"{spec}:{spec}"
+    start_text, sep, end_text = spec.partition(':')
+    if not sep or not DATE_RE.match(start_text) or not DATE_RE.match(end_text):
+        raise ValueError(f"Unrecognised period '{spec}'")
+
+    _check_exists('day', start_text)
+    _check_exists('day', end_text)
+    start = datetime.strptime(start_text, '%Y-%m-%d').date()
+    end = datetime.strptime(end_text, '%Y-%m-%d').date()
+    if end < start or (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError(f"Period '{spec}' must be ordered and at most {MAX_RANGE_DAYS} days")
+
+    refs = []
+    day = start
+    while day <= end:
+        next_month = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+        if day.day == 1 and next_month - timedelta(days=1) <= end:
+            refs.append(('month', day.strftime('%Y-%m')))
+            day = next_month
+        elif day.weekday() == 0 and day + timedelta(days=6) <= end:
+            iso_year, iso_week, _ = day.isocalendar()
+            refs.append(('week', f"{iso_year}-W{iso_week:02d}"))
+            day += timedelta(days=7)
+        else:
+            refs.append(('day', day.strftime('%Y-%m-%d')))
+            day += timedelta(days=1)
+    return refs
+
+
+def _check_exists(period, key):
+    """Raise ValueError for a well-formed key naming a day, ISO week or month that does not exist"""
+    try:
+        if period == 'day':
+            datetime.strptime(key, '%Y-%m-%d')
+        elif period == 'week':
+            year, week = key.split('-W')
+            date.fromisocalendar(int(year), int(week), 1)
+        elif period == 'month':
+            datetime.strptime(key, '%Y-%m')
+    except ValueError:
+        raise ValueError(f"Period '{key}' does not exist") from None
+
+
+def period_totals(store, refs):
+    """
+    Sum rollups for a period: account total, per service, per region and
+    per service|region cell. The rollup 'cells' sets only ever grow, so
+    they are candidates; a cell whose rollups net to zero had no spend.
+    """
+    totals = store.get([rollup_id(period, key) for period, key in refs])
+    candidates = set()
+    total = 0.0
+    for item in totals.values():
+        total += float(item['cost'])
+        candidates |= set(item.get('cells') or [])
+
+    ids = {}
+    for period, key in refs:
+        for cell in candidates:
+            service, region = cell.split('|', 1)
+            ids[rollup_id(period, key, service, region)] = cell
+
+    cells = {}
+    for item_id, item in store.get(ids.keys()).items():
+        cell = ids[item_id]
+        cells[cell] = cells.get(cell, 0.0) + float(item['cost'])
+
+    breakdown = {'services': {}, 'regions': {}}
+    for cell, cost in cells.items():
+        service, region = cell.split('|', 1)
+        breakdown['services'][service] = breakdown['services'].get(service, 0.0) + cost
+        breakdown['regions'][region] = breakdown['regions'].get(region, 0.0) + cost
+
+    return {
+        'total': total,
+        'cells': _nonzero(cells),
+        'services': _nonzero(breakdown['services']),
+        'regions': _nonzero(breakdown['regions'])
+    }
+
+
+def _nonzero(costs):
+    """Drop entries whose changes cancelled out (deleted or zeroed ledger rows)"""
+    return {name: cost for name, cost in costs.items() if cost != 0}
+
+
+def compare_periods(store, spec_a, spec_b):
+    """
+    Business Purpose: Period-over-period comparison from stored rollups
+
+    Returns totals, per-service and per-region deltas with percentage change
+    and the service|region line items that appeared or disappeared (went
+    from or to zero spend). No Cost Explorer calls are made.
+    """
+    refs_a, refs_b = parse_period(spec_a), parse_period(spec_b)
+    a = period_totals(store, refs_a)
+    b = period_totals(store, refs_b)
+
+    new_cells = sorted(set(b['cells']) - set(a['cells']))[:MAX_LINE_ITEMS]
+    gone_cells = sorted(set(a['cells']) - set(b['cells']))[:MAX_LINE_ITEMS]
+
+    return {
+        'a': {'period': spec_a, 'total': a['total']},
+        'b': {'period': spec_b, 'total': b['total']},
+        'delta': b['total'] - a['total'],
+        'pct_change': _pct(a['total'], b['total']),
+        'services': _diff(a['services'], b['services'], 'service'),
+        'regions': _diff(a['regions'], b['regions'], 'region'),
+        'new_items': _line_items(b['cells'], new_cells),
+        'disappeared_items': _line_items(a['cells'], gone_cells)
+    }
+
+
+def _pct(a, b):
+    return (b - a) / a * 100 if a else None
+
+
+def _diff(costs_a, costs_b, label):
+    rows = []
+    for name in set(costs_a) | set(costs_b):
+        a, b = costs_a.get(name, 0.0), costs_b.get(name, 0.0)
+        if name not in costs_a:
+            status = 'new'
+        elif name not in costs_b:
+            status = 'disappeared'
+        else:
+            status = 'changed' if b != a else 'unchanged'
+        rows.append({label: name, 'a': a, 'b': b, 'delta': b - a,
+                     'pct_change': _pct(a, b), 'status': status})
+    rows.sort(key=lambda r: abs(r['delta']), reverse=True)
+    return rows
+
+
+def _line_items(costs, cells):
+    """Costs of specific service|region cells within one period"""
+    items = []
+    for cell in cells:
+        service, region = cell.split('|', 1)
+        items.append({'service': service, 'region': region, 'cost': costs[cell]})
+    items.sort(key=lambda r: r['cost'], reverse=True)
+    return items
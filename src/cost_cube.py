@@ -0,0 +1,154 @@
+from array import array
+from operator import itemgetter
+from datetime import datetime, timedelta
+
+# Cost Explorer dimension -> row field name
+DIMENSION_FIELDS = {
+    'SERVICE': 'service',
+    'REGION': 'region',
+    'USAGE_TYPE': 'usage_type',
+    'LINKED_ACCOUNT': 'account',
+    'RECORD_TYPE': 'record_type'
+}
+
+# Label used when Cost Explorer returns an empty key
+EMPTY_LABELS = {
+    'service': 'Unknown',
+    'region': 'Global'
+}
+
+# Metrics fetched together in one Cost Explorer call, each kept as a parallel
+# column; 'cost' stays BlendedCost so single-metric consumers are unchanged
+METRIC_FIELDS = {
+    'BlendedCost': 'cost',
+    'UnblendedCost': 'unblended_cost',
+    'AmortizedCost': 'amortized_cost',
+    'NetAmortizedCost': 'net_amortized_cost',
+    'UsageQuantity': 'usage_quantity'
+}
+COST_METRICS = list(METRIC_FIELDS)
+# Dollar columns (usage quantity mixes units and only adds up within a usage type)
+COST_COLUMNS = [field for field in METRIC_FIELDS.values() if field != 'usage_quantity']
+
+
+def metric_values(metrics):
+    """{column: value} for each known metric in a CE 'Metrics'/'Total' map"""
+    return {METRIC_FIELDS[name]: float(value['Amount'])
+            for name, value in metrics.items() if name in METRIC_FIELDS}
+
+
+# Tag dimensions are written 'TAG:<key>' and become 'tag:<key>' fields
+TAG_PREFIX = 'TAG:'
+UNTAGGED = '(untagged)'
+
+
+def group_field(dimension):
+    """(GroupBy entry, row field name) for a dimension or 'TAG:<key>'"""
+    if dimension.startswith(TAG_PREFIX):
+        key = dimension[len(TAG_PREFIX):]
+        return {'Type': 'TAG', 'Key': key}, f"tag:{key}"
+    return {'Type': 'DIMENSION', 'Key': dimension}, DIMENSION_FIELDS[dimension]
+
+
+def iter_ce_rows(ce_client, start_date, end_date, dimensions, granularity='DAILY', metrics=('BlendedCost',)):
+    """
+    Stream Cost Explorer groups as flat rows, following pagination
+    Yields {'date', <dimension fields>..., 'estimated'} plus one column per
+    requested metric (METRIC_FIELDS); at most two dimensions can be grouped
+    per request (Cost Explorer limit)
+    """
+    groups = [group_field(d) for d in dimensions]
+    fields = [field for _, field in groups]
+    # HOURLY periods take datetimes and yield hour-start timestamps as 'date'
+    time_format = '%Y-%m-%dT%H:%M:%SZ' if granularity == 'HOURLY' else '%Y-%m-%d'
+    kwargs = {
+        'TimePeriod': {
+            'Start': start_date.strftime(time_format),
+            'End': end_date.strftime(time_format)
+        },
+        'Granularity': granularity,
+        'Metrics': list(metrics),
+        'GroupBy': [group for group, _ in groups]
+    }
+
+    while True:
+        response = ce_client.get_cost_and_usage(**kwargs)
+        for result in response['ResultsByTime']:
+            date = result['TimePeriod']['Start']
+            estimated = bool(result.get('Estimated', False))
+            for group in result['Groups']:
+                row = {'date': date, 'estimated': estimated}
+                for field, key in zip(fields, group['Keys']):
+                    if field.startswith('tag:'):
+                        # CE returns tag groups as "<key>$<value>"
+                        row[field] = key.split('$', 1)[-1] or UNTAGGED
+                    else:
+                        row[field] = key or EMPTY_LABELS.get(field, 'Other')
+                row.update(metric_values(group['Metrics']))
+                yield row
+
+        if not response.get('NextPageToken'):
+            return
+        kwargs['NextPageToken'] = response['NextPageToken']
+
+
+def date_range(start, end):
+    """Dates from start to end inclusive as 'YYYY-MM-DD' strings"""
+    day = datetime.strptime(start, '%Y-%m-%d').date()
+    last = datetime.strptime(end, '%Y-%m-%d').date()
+    dates = []
+    while day <= last:
+        dates.append(day.strftime('%Y-%m-%d'))
+        day += timedelta(days=1)
+    return dates
+
+
+def build_cube(rows, fields, columns=('cost',)):
+    """
+    Business Logic: Pivot cost rows into a dense series x day cube
+
+    Returns {'fields', 'keys', 'dates', 'values', 'columns'}: keys are
+    dimension tuples (one per series), dates is the contiguous day axis and
+    values is a flat row-major array('d') of len(keys) * len(dates) for the
+    first column. 'columns' holds one such array per requested column
+    (e.g. cost and usage_quantity side by side). Missing cells are zero.
+    The flat layout can be wrapped by numpy without copying.
+    """
+    index = {}
+    keys = []
+    date_ids = {}
+    columns = list(columns)
+    cells = []  # (series index, date string, column values) from a single pass over rows
+    get_values = itemgetter(*columns) if len(columns) > 1 else (lambda row: (row[columns[0]],))
+    for row in rows:
+        key = tuple([row[f] for f in fields])
+        i = index.get(key)
+        if i is None:
+            i = index[key] = len(keys)
+            keys.append(key)
+        date = row['date']
+        if date not in date_ids:
+            date_ids[date] = date[:10]
+        cells.append((i, date, get_values(row)))
+
+    days = set(date_ids.values())
+    dates = date_range(min(days), max(days)) if days else []
+    day_index = {d: i for i, d in enumerate(dates)}
+    column = {raw: day_index[day] for raw, day in date_ids.items()}
+    width = len(dates)
+
+    arrays = [array('d', bytes(8 * len(keys) * width)) for _ in columns]
+    for i, date, values in cells:
+        cell = i * width + column[date]
+        for target, value in zip(arrays, values):
+            target[cell] += value
+
+    return {'fields': list(fields), 'keys': keys, 'dates': dates, 'values': arrays[0],
+            'columns': dict(zip(columns, arrays))}
+
+
+def cube_row(cube, i, column=None):
+    """Daily values of series i (of one column, default the first) as a list"""
+    width = len(cube['dates'])
+    values = cube['columns'][column] if column else cube['values']
+    return values[i * width:(i + 1) * width].tolist()
@@ -0,0 +1,140 @@
+import math
+from operator import itemgetter
+
+EP_THRESHOLD = 0.67        # explained share of the delta needed per dimension
+ELEMENT_EP_MIN = 0.1       # ignore elements explaining less than 10% of the delta
+MAX_ELEMENTS = 3           # keep explanations short enough to act on
+MAX_DEPTH = 2              # drill into at most two nested dimensions
+
+
+def explain_change(rows_a, rows_b, fields, depth=MAX_DEPTH):
+    """
+    Business Purpose: Explain why cost moved between two periods
+
+    rows_a / rows_b are cost rows (dicts with the given dimension fields and
+    'cost') for the baseline and the comparison period. Uses an
+    Adtributor-style search: for each dimension, pick the few elements with
+    the highest surprise (Jensen-Shannon divergence of cost shares) that
+    together explain most of the delta, choose the most surprising dimension,
+    then drill into each chosen element over the remaining dimensions.
+
+    Returns {'total_a', 'total_b', 'delta', 'cells'}: cells are the smallest
+    set of dimension filters found, each with its own a/b/delta/share.
+    """
+    # itemgetter keeps key extraction in C; single fields still key by 1-tuples
+    get_key = itemgetter(*fields) if len(fields) > 1 else (lambda row: (row[fields[0]],))
+    cells = {}
+    for period, rows in ((0, rows_a), (1, rows_b)):
+        for row in rows:
+            key = get_key(row)
+            pair = cells.get(key)
+            if pair is None:
+                pair = cells[key] = [0.0, 0.0]
+            pair[period] += row['cost']
+
+    total_a = sum(pair[0] for pair in cells.values())
+    total_b = sum(pair[1] for pair in cells.values())
+    delta = total_b - total_a
+
+    result_cells = []
+    if delta != 0:
+        _drill(cells, list(range(len(fields))), fields, {}, delta, depth, result_cells)
+    if not result_cells and delta != 0:
+        result_cells.append({'filter': {}, 'a': total_a, 'b': total_b,
+                             'delta': delta, 'share': 1.0})
+
+    result_cells.sort(key=lambda c: abs(c['delta']), reverse=True)
+    return {'total_a': total_a, 'total_b': total_b, 'delta': delta, 'cells': result_cells}
+
+
+def _drill(cells, dims, fields, prefix, total_delta, depth, out):
+    """Recursive step: explain the cells under prefix using the remaining dims"""
+    best = _best_dimension(cells, dims)
+    if best is None:
+        return False
+
+    dim, elements = best
+    for value, a, b in elements:
+        element_filter = dict(prefix)
+        element_filter[fields[dim]] = value
+        sub_cells = {k: v for k, v in cells.items() if k[dim] == value}
+        remaining = [d for d in dims if d != dim]
+
+        # Go one level deeper when the element itself is spread over several cells
+        if depth > 1 and remaining and len(sub_cells) > 1:
+            if _drill(sub_cells, remaining, fields, element_filter, total_delta, depth - 1, out):
+                continue
+
+        out.append({
+            'filter': element_filter,
+            'a': a,
+            'b': b,
+            'delta': b - a,
+            'share': (b - a) / total_delta
+        })
+    return True
+
+
+def _best_dimension(cells, dims):
+    """Pick the dimension whose top elements are most surprising and explanatory"""
+    total_a = sum(v[0] for v in cells.values())
+    total_b = sum(v[1] for v in cells.values())
+    delta = total_b - total_a
+    if delta == 0:
+        return None
+
+    # Marginal (a, b) totals for every candidate dimension in one pass
+    all_marginals = {dim: {} for dim in dims}
+    for key, (a, b) in cells.items():
+        for dim in dims:
+            marginals = all_marginals[dim]
+            pair = marginals.get(key[dim])
+            if pair is None:
+                pair = marginals[key[dim]] = [0.0, 0.0]
+            pair[0] += a
+            pair[1] += b
+
+    best = None
+    best_surprise = -1.0
+    for dim in dims:
+        marginals = all_marginals[dim]
+        if len(marginals) < 2 and len(dims) > 1:
+            continue
+
+        scored = []
+        for value, (a, b) in marginals.items():
+            ep = (b - a) / delta
+            if ep < ELEMENT_EP_MIN:
+                continue
+            p = a / total_a if total_a else 0.0
+            q = b / total_b if total_b else 0.0
+            scored.append((_js_surprise(p, q), ep, value, a, b))
+        scored.sort(reverse=True)
+
+        chosen = []
+        explained = 0.0
+        surprise = 0.0
+        for s, ep, value, a, b in scored[:MAX_ELEMENTS]:
+            chosen.append((value, a, b))
+            explained += ep
+            surprise += s
+            if explained >= EP_THRESHOLD:
+                break
+
+        if chosen and explained >= EP_THRESHOLD and surprise > best_surprise:
+            best, best_surprise = (dim, chosen), surprise
+
+    return best
+
+
+def _js_surprise(p, q):
+    """Jensen-Shannon divergence between baseline share p and new share q"""
+    m = (p + q) / 2
+    if m == 0:
+        return 0.0
+    s = 0.0
+    if p > 0:
+        s += p * math.log(p / m)
+    if q > 0:
+        s += q * math.log(q / m)
+    return s / 2
@@ -0,0 +1,208 @@
+import calendar
+import os
+from datetime import datetime, timedelta
+
+from dynamo_helpers import to_dynamo, from_dynamo
+from rolling_stats import daily_series, estimated_dates, split_days, with_pending, ALL
+
+FORECAST_TABLE = os.environ.get('COST_FORECAST_TABLE', 'cost-forecast')
+SEASON = 7                      # weekly seasonality
+
+# Fixed smoothing parameters: state is updated one settled day at a time,
+# never refit from history
+ALPHA = float(os.environ.get('FORECAST_ALPHA', '0.3'))    # level
+BETA = float(os.environ.get('FORECAST_BETA', '0.05'))     # trend
+GAMMA = float(os.environ.get('FORECAST_GAMMA', '0.1'))    # weekday seasonality
+PHI = float(os.environ.get('FORECAST_PHI', '0.9'))        # trend damping
+Z_80 = 1.2816
+Z_95 = 1.96
+
+
+def new_state(sid):
+    return {
+        'id': sid,
+        'last_date': None,
+        'warmup': [],           # first SEASON days, used to initialize level/seasonals
+        'level': 0.0,
+        'trend': 0.0,
+        'seasonal': [0.0] * SEASON,
+        'sse': 0.0,             # one-step-ahead squared errors
+        'errors': 0,
+        'mtd_month': None,
+        'mtd_cost': 0.0,
+        'pending': {}           # estimated days after last_date, replaced on every run
+    }
+
+
+def _weekday(date):
+    return datetime.strptime(date, '%Y-%m-%d').date().weekday()
+
+
+def push_day(state, date, cost):
+    """
+    Damped-trend additive Holt-Winters update for one settled day
+    The one-step forecast error is recorded before the update for intervals
+    """
+    month = date[:7]
+    if state['mtd_month'] != month:
+        state['mtd_month'], state['mtd_cost'] = month, 0.0
+    state['mtd_cost'] += cost
+
+    if len(state['warmup']) < SEASON:
+        state['warmup'].append([date, cost])
+        if len(state['warmup']) == SEASON:
+            mean = sum(c for _, c in state['warmup']) / SEASON
+            state['level'] = mean
+            for d, c in state['warmup']:
+                state['seasonal'][_weekday(d)] = c - mean
+        return
+
+    s = _weekday(date)
+    level, trend, seasonal = state['level'], state['trend'], state['seasonal'][s]
+
+    error = cost - (level + PHI * trend + seasonal)
+    state['sse'] += error * error
+    state['errors'] += 1
+
+    new_level = ALPHA * (cost - seasonal) + (1 - ALPHA) * (level + PHI * trend)
+    state['trend'] = BETA * (new_level - level) + (1 - BETA) * PHI * trend
+    state['seasonal'][s] = GAMMA * (cost - new_level) + (1 - GAMMA) * seasonal
+    state['level'] = new_level
+
+
+def advance_to(state, date, cost):
+    """Fold in a settled day (zero-filling gaps); days already seen are ignored"""
+    day = datetime.strptime(date, '%Y-%m-%d').date()
+    if state['last_date']:
+        last = datetime.strptime(state['last_date'], '%Y-%m-%d').date()
+        if day <= last:
+            return False
+        gap = last + timedelta(days=1)
+        while gap < day:
+            push_day(state, gap.strftime('%Y-%m-%d'), 0.0)
+            gap += timedelta(days=1)
+    push_day(state, date, cost)
+    state['last_date'] = date
+    return True
+
+
+def forecast_days(state, horizon):
+    """Point forecasts for the next horizon days after last_date"""
+    if not state['last_date']:
+        return []
+    last = datetime.strptime(state['last_date'], '%Y-%m-%d').date()
+
+    if len(state['warmup']) < SEASON:
+        # Not enough history for seasonality yet: carry the mean forward
+        costs = [c for _, c in state['warmup']]
+        mean = sum(costs) / len(costs)
+        return [max(mean, 0.0)] * horizon
+
+    points = []
+    damped = 0.0
+    for h in range(1, horizon + 1):
+        damped += PHI ** h
+        day = last + timedelta(days=h)
+        value = state['level'] + damped * state['trend'] + state['seasonal'][day.weekday()]
+        points.append(max(value, 0.0))
+    return points
+
+
+def month_end_projection(state, today=None):
+    """
+    Business Purpose: Project current-month spend with prediction intervals
+
+    Month-to-date actuals (including estimated days) plus forecasts for
+    every remaining day of the month. Intervals treat daily errors as
+    independent with the observed one-step variance, widened for horizon.
+    """
+    settled_date = state['last_date']
+    state = with_pending(state, advance_to)
+    today = today or datetime.now().date()
+    month = today.strftime('%Y-%m')
+    month_end = today.replace(day=calendar.monthrange(today.year, today.month)[1])
+
+    last = datetime.strptime(state['last_date'], '%Y-%m-%d').date() if state['last_date'] else None
+    actual = state['mtd_cost'] if state['mtd_month'] == month else 0.0
+
+    horizon = (month_end - last).days if last else 0
+    points = forecast_days(state, horizon)
+    # Only forecast days in the current month count toward month end
+    remaining = [v for h, v in enumerate(points, 1)
+                 if (last + timedelta(days=h)).strftime('%Y-%m') == month]
+
+    sigma2 = state['sse'] / state['errors'] if state['errors'] else 0.0
+    variance = sum(sigma2 * (1 + (h - 1) * ALPHA ** 2) for h in range(1, len(remaining) + 1))
+    spread = variance ** 0.5
+    projected = actual + sum(remaining)
+
+    return {
+        'month': month,
+        'actual_to_date': actual,
+        'forecast_remaining': sum(remaining),
+        'projected_total': projected,
+        'interval_80': [max(projected - Z_80 * spread, actual), projected + Z_80 * spread],
+        'interval_95': [max(projected - Z_95 * spread, actual), projected + Z_95 * spread],
+        'days_remaining': len(remaining),
+        'last_date': state['last_date'],
+        'last_settled_date': settled_date
+    }
+
+
+def forecast_series(rows):
+    """Per-service and account-total daily series from ledger rows"""
+    return {sid: days for sid, days in daily_series(rows).items() if sid.endswith(f"#{ALL}")}
+
+
+def update_forecasts(dynamodb, rows):
+    """
+    Business Requirement: Keep forecast models current without refitting
+
+    Loads every stored model state, applies only the settled days it has
+    not seen, replaces the estimated days and writes back the changed
+    states. Every state is advanced to the window's last settled day, so a
+    service that stops costing decays on zeros instead of being projected
+    from its old level.
+    """
+    table = dynamodb.Table(FORECAST_TABLE)
+    series = forecast_series(rows)
+    estimated = estimated_dates(rows)
+    window_end = max((row['date'] for row in rows if row['date'] not in estimated), default=None)
+    states = {state['id']: state for state in load_forecast_states(dynamodb)}
+
+    changed = []
+    for sid in sorted(set(series) | set(states)):
+        days = series.get(sid, {})
+        state = states.setdefault(sid, new_state(sid))
+        settled, _ = split_days(days, estimated)
+        updated = False
+        for date in sorted(settled):
+            updated = advance_to(state, date, settled[date]) or updated
+        if window_end and state['last_date']:
+            # No row through the end of the window is no spend
+            updated = advance_to(state, window_end, 0.0) or updated
+        _, pending = split_days(days, estimated, state['last_date'])
+        if pending != (state.get('pending') or {}):
+            state['pending'] = pending
+            updated = True
+        if updated:
+            changed.append(sid)
+
+    with table.batch_writer(overwrite_by_pkeys=['id']) as batch:
+        for sid in changed:
+            batch.put_item(Item=to_dynamo(states[sid]))
+
+    print(f"Forecast state updated for {len(changed)} series")
+
+
+def load_forecast_states(dynamodb):
+    """All persisted forecast states (one item per service plus the total)"""
+    table = dynamodb.Table(FORECAST_TABLE)
+    states = []
+    kwargs = {}
+    while True:
+        response = table.scan(**kwargs)
+        states.extend(from_dynamo(item) for item in response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return states
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
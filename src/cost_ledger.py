@@ -0,0 +1,61 @@
+import os
+from decimal import Decimal
+
+from cost_cube import metric_values
+
+# One row per (date, service, region); the table's stream feeds cost_rollups
+LEDGER_TABLE = os.environ.get('COST_LEDGER_TABLE', 'cost-ledger')
+
+
+def ledger_id(date, service, region):
+    return f"{date}#{service}#{region}"
+
+
+def ledger_rows(cost_data):
+    """
+    Business Logic: Flatten a SERVICE x REGION Cost Explorer response into
+    daily ledger rows keyed by (date, service, region)
+    Every fetched metric becomes a column ('cost' is BlendedCost)
+    """
+    rows = {}
+    for result in cost_data['ResultsByTime']:
+        date = result['TimePeriod']['Start']
+        estimated = bool(result.get('Estimated', False))
+
+        for group in result['Groups']:
+            service = group['Keys'][0] if group['Keys'][0] else 'Unknown'
+            region = group['Keys'][1] if len(group['Keys']) > 1 else 'Global'
+            values = metric_values(group['Metrics'])
+
+            row_id = ledger_id(date, service, region)
+            if row_id not in rows:
+                rows[row_id] = {
+                    'id': row_id,
+                    'date': date,
+                    'service': service,
+                    'region': region,
+                    'cost': 0.0,
+                    'estimated': estimated
+                }
+            row = rows[row_id]
+            for field, value in values.items():
+                row[field] = row.get(field, 0.0) + value
+
+    return list(rows.values())
+
+
+def store_daily_ledger(dynamodb, rows):
+    """
+    Business Requirement: Keep a settled daily history that rollups build on
+
+    Rows are overwritten in place, so re-running the same window only emits
+    stream records for days whose cost actually changed.
+    """
+    table = dynamodb.Table(LEDGER_TABLE)
+
+    with table.batch_writer(overwrite_by_pkeys=['id']) as batch:
+        for row in rows:
+            item = {k: Decimal(str(v)) if isinstance(v, float) else v for k, v in row.items()}
+            batch.put_item(Item=item)
+
+    print(f"Stored {len(rows)} ledger rows")
@@ -0,0 +1,235 @@
+import os
+from datetime import datetime
+from decimal import Decimal
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+from dynamo_helpers import batch_get_items
+
+ROLLUP_TABLE = os.environ.get('COST_ROLLUP_TABLE', 'cost-rollups')
+ALL = '*'
+
+# Stream sequence numbers are up to 40 digits; zero-padding makes string
+# comparison match numeric order
+SEQUENCE_WIDTH = 64
+
+_deserializer = TypeDeserializer()
+_serializer = TypeSerializer()
+
+
+def lambda_handler(event, context):
+    """
+    Business Purpose: Maintain day/week/month/quarter cost rollups incrementally
+
+    Triggered by the cost-ledger DynamoDB stream (NEW_AND_OLD_IMAGES). Each
+    ledger change is folded into precomputed aggregates so long-range
+    dashboard queries read a handful of rollup items instead of daily rows.
+    """
+    dynamodb = boto3.resource('dynamodb')
+    store = DynamoRollupStore(dynamodb)
+
+    counts = process_records(event.get('Records', []), store)
+    print(f"Rollups: {counts}")
+    return counts
+
+
+def period_keys(date):
+    """'2024-05-14' -> [('day', '2024-05-14'), ('week', '2024-W20'), ('month', '2024-05'), ('quarter', '2024-Q2')]"""
+    day = datetime.strptime(date[:10], '%Y-%m-%d').date()
+    iso_year, iso_week, _ = day.isocalendar()
+    return [
+        ('day', day.strftime('%Y-%m-%d')),
+        ('week', f"{iso_year}-W{iso_week:02d}"),
+        ('month', day.strftime('%Y-%m')),
+        ('quarter', f"{day.year}-Q{(day.month - 1) // 3 + 1}")
+    ]
+
+
+def rollup_id(period, key, service=ALL, region=ALL):
+    return f"{period}#{key}#{service}#{region}"
+
+
+def rollup_targets(row):
+    """
+    Every rollup item a ledger row contributes to: per service x region,
+    per service, per region and account total, for each period. The account
+    total item also collects the set of service|region cells in the period.
+    """
+    targets = []
+    for period, key in period_keys(row['date']):
+        for service, region in ((row['service'], row['region']),
+                                (row['service'], ALL),
+                                (ALL, row['region']),
+                                (ALL, ALL)):
+            target = {
+                'id': rollup_id(period, key, service, region),
+                'period': period,
+                'period_key': key,
+                'service': service,
+                'region': region
+            }
+            if service == ALL and region == ALL:
+                target['cell'] = cell_key(row['service'], row['region'])
+            targets.append(target)
+    return targets
+
+
+def cell_key(service, region):
+    return f"{service}|{region}"
+
+
+def record_change(record):
+    """
+    Turn a stream record into (ledger_id, sequence, row, delta)
+    Returns None when the record does not change any cost
+    """
+    change = record['dynamodb']
+    new = _image(change.get('NewImage'))
+    old = _image(change.get('OldImage'))
+
+    row = new or old
+    if not row or 'date' not in row:
+        return None
+
+    delta = Decimal(new.get('cost', 0) if new else 0) - Decimal(old.get('cost', 0) if old else 0)
+    if delta == 0:
+        return None
+
+    sequence = str(change['SequenceNumber']).zfill(SEQUENCE_WIDTH)
+    return row['id'], sequence, row, delta
+
+
+def process_records(records, store):
+    """Apply stream records in order; redelivered records are skipped by the store"""
+    counts = {'applied': 0, 'duplicate': 0, 'unchanged': 0}
+    for record in records:
+        change = record_change(record)
+        if change is None:
+            counts['unchanged'] += 1
+            continue
+
+        row_id, sequence, row, delta = change
+        if store.apply(row_id, sequence, rollup_targets(row), delta):
+            counts['applied'] += 1
+        else:
+            counts['duplicate'] += 1
+    return counts
+
+
+def _image(image):
+    if not image:
+        return None
+    return {k: _deserializer.deserialize(v) for k, v in image.items()}
+
+
+class DynamoRollupStore:
+    """
+    Rollup items plus one 'applied#<ledger id>' marker per ledger row holding
+    the last applied stream sequence number. Marker check and rollup ADDs run
+    in one transaction, so redelivered records are no-ops.
+    """
+
+    def __init__(self, dynamodb, table_name=ROLLUP_TABLE):
+        self.dynamodb = dynamodb
+        self.table = dynamodb.Table(table_name)
+
+    def apply(self, row_id, sequence, targets, delta):
+        items = [{
+            'Update': {
+                'TableName': self.table.name,
+                'Key': {'id': f"applied#{row_id}"},
+                'UpdateExpression': 'SET #q = :seq',
+                'ConditionExpression': 'attribute_not_exists(#q) OR #q < :seq',
+                'ExpressionAttributeNames': {'#q': 'seq'},
+                'ExpressionAttributeValues': {':seq': sequence}
+            }
+        }]
+        for target in targets:
+            # The account-total item also collects the period's cell set
+            add_clause = 'ADD #c :delta, #cells :cell' if 'cell' in target else 'ADD #c :delta'
+            update = {
+                'TableName': self.table.name,
+                'Key': {'id': target['id']},
+                'UpdateExpression': f"{add_clause} SET #p = :period, #k = :key, #s = :service, #r = :region",
+                'ExpressionAttributeNames': {
+                    '#c': 'cost', '#p': 'period', '#k': 'period_key',
+                    '#s': 'service', '#r': 'region'
+                },
+                'ExpressionAttributeValues': {
+                    ':delta': delta,
+                    ':period': target['period'],
+                    ':key': target['period_key'],
+                    ':service': target['service'],
+                    ':region': target['region']
+                }
+            }
+            if 'cell' in target:
+                update['ExpressionAttributeNames']['#cells'] = 'cells'
+                update['ExpressionAttributeValues'][':cell'] = {target['cell']}
+            items.append({'Update': update})
+
+        try:
+            self.table.meta.client.transact_write_items(TransactItems=items)
+            return True
+        except ClientError as e:
+            reasons = e.response.get('CancellationReasons') or []
+            if reasons and reasons[0].get('Code') == 'ConditionalCheckFailed':
+                return False
+            raise
+
+    def get(self, ids):
+        """Fetch rollup items by id (missing ids are omitted)"""
+        return batch_get_items(self.dynamodb, self.table, ids)
+
+
+class MemoryRollupStore:
+    """In-process stand-in for DynamoRollupStore, for local runs and tests"""
+
+    def __init__(self):
+        self.items = {}
+        self.applied = {}
+
+    def apply(self, row_id, sequence, targets, delta):
+        if self.applied.get(row_id, '') >= sequence:
+            return False
+        self.applied[row_id] = sequence
+        for target in targets:
+            fields = {k: v for k, v in target.items() if k != 'cell'}
+            item = self.items.setdefault(target['id'], dict(fields, cost=Decimal('0')))
+            item['cost'] += delta
+            if 'cell' in target:
+                item.setdefault('cells', set()).add(target['cell'])
+        return True
+
+    def get(self, ids):
+        return {item_id: self.items[item_id] for item_id in ids if item_id in self.items}
+
+
+def local_stream_record(sequence, old_row=None, new_row=None):
+    """Build a DynamoDB stream record from plain ledger rows (local stand-in)"""
+    def image(row):
+        return {k: _serializer.serialize(Decimal(str(v)) if isinstance(v, float) else v)
+                for k, v in row.items()}
+
+    change = {'SequenceNumber': str(sequence)}
+    if old_row:
+        change['OldImage'] = image(old_row)
+    if new_row:
+        change['NewImage'] = image(new_row)
+
+    if old_row and new_row:
+        event_name = 'MODIFY'
+    elif new_row:
+        event_name = 'INSERT'
+    else:
+        event_name = 'REMOVE'
+    return {'eventName': event_name, 'dynamodb': change}
+
+
+def get_rollup_costs(store, period, keys, service=ALL, region=ALL):
+    """{period_key: cost} for one service/region cell over several periods"""
+    ids = {rollup_id(period, key, service, region): key for key in keys}
+    items = store.get(ids.keys())
+    return {ids[item_id]: float(item['cost']) for item_id, item in items.items()}
@@ -0,0 +1,332 @@
+import gzip
+import json
+import mmap
+import os
+import shutil
+import uuid
+from array import array
+
+try:
+    import numpy as np  # Optional: vectorized scans when a numpy layer is attached
+except ImportError:
+    np = None
+
+# Local (or EFS-mounted) columnar store of CUR aggregates, partitioned by day and service
+COST_STORE_DIR = os.environ.get('COST_STORE_DIR', '/tmp/cost-store')
+STORE_FIELDS = ['service', 'region', 'usage_type', 'account', 'operation', 'resource_id']
+PARTITION_FIELD = 'service'
+# Fields that are constant within a partition and never stored as columns
+PARTITION_KEYS = ('date', PARTITION_FIELD)
+COST_COLUMN = 'cost'
+# Largest mixed-radix group key that fits the int64 fast path
+INT64_MAX = (1 << 63) - 1
+
+
+def _write_file(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _atomic_write(path, data):
+    """Write to a unique temp file, then rename: readers see old or new, never partial"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    _write_file(tmp, data)
+    os.replace(tmp, path)
+
+
+def write_json(path, obj):
+    _atomic_write(path, gzip.compress(json.dumps(obj).encode('utf-8')))
+
+
+def read_json(path, default=None):
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def days_dir(root):
+    return os.path.join(root, 'days')
+
+
+def store_exists(root):
+    """True once cur-refresh has written at least one day under root"""
+    return os.path.isdir(days_dir(root))
+
+
+def day_pointer_path(root, date):
+    return os.path.join(days_dir(root), f"{date}.json")
+
+
+def read_day_pointer(root, date):
+    try:
+        with open(day_pointer_path(root, date), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_partition(path, rows, columns):
+    """
+    One (day, service) partition: a code file plus a JSON dictionary per
+    string column, and the cost column as raw float64
+    """
+    os.makedirs(path)
+    codes_types = {}
+    for column, position in columns:
+        ids = {}
+        codes = array('I', [ids.setdefault(row[position], len(ids)) for row in rows])
+        if len(ids) <= 1 << 16:
+            codes = array('H', codes)
+        codes_types[column] = codes.typecode
+        _write_file(os.path.join(path, f"{column}.codes"), codes.tobytes())
+        _write_file(os.path.join(path, f"{column}.dict.json"), json.dumps(list(ids)).encode('utf-8'))
+    _write_file(os.path.join(path, f"{COST_COLUMN}.f8"), array('d', [row[-1] for row in rows]).tobytes())
+    _write_file(os.path.join(path, 'meta.json'), json.dumps({'rows': len(rows), 'codes': codes_types}).encode('utf-8'))
+
+
+def replace_day_partition(root, date, rows, fields=STORE_FIELDS):
+    """
+    Business Logic: Atomically replace one day's rows ([*field values, cost])
+
+    Rows are split by service into a fresh generation directory; switching
+    the day's pointer file is the single atomic step. The previous
+    generation is removed afterwards (open memory maps stay readable).
+    """
+    fields = list(fields)
+    split = fields.index(PARTITION_FIELD)
+    columns = [(field, i) for i, field in enumerate(fields) if field != PARTITION_FIELD]
+
+    by_service = {}
+    for row in rows:
+        by_service.setdefault(row[split], []).append(row)
+
+    generation = f"{date}.{uuid.uuid4().hex[:12]}"
+    services = {}
+    for n, service in enumerate(sorted(by_service)):
+        name = f"p{n}"
+        _write_partition(os.path.join(days_dir(root), generation, name), by_service[service], columns)
+        services[service] = {'dir': name, 'rows': len(by_service[service])}
+
+    previous = read_day_pointer(root, date)
+    _atomic_write(day_pointer_path(root, date), json.dumps({
+        'date': date,
+        'generation': generation,
+        'fields': [field for field, _ in columns],
+        'services': services
+    }).encode('utf-8'))
+    if previous:
+        shutil.rmtree(os.path.join(days_dir(root), previous['generation']), ignore_errors=True)
+
+
+def drop_day_partition(root, date):
+    previous = read_day_pointer(root, date)
+    try:
+        os.remove(day_pointer_path(root, date))
+    except FileNotFoundError:
+        pass
+    if previous:
+        shutil.rmtree(os.path.join(days_dir(root), previous['generation']), ignore_errors=True)
+
+
+def stored_days(root):
+    directory = days_dir(root)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[:-5] for name in os.listdir(directory) if name.endswith('.json'))
+
+
+class Partition:
+    """Read-only view of one (day, service) partition; columns are mapped lazily"""
+
+    def __init__(self, root, pointer, service):
+        self.date = pointer['date']
+        self.service = service
+        self.path = os.path.join(days_dir(root), pointer['generation'], pointer['services'][service]['dir'])
+        with open(os.path.join(self.path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        self.rows = meta['rows']
+        self.codes_types = meta['codes']
+
+    def _map(self, filename):
+        with open(os.path.join(self.path, filename), 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def codes(self, column):
+        """memoryview of the column's dictionary codes, straight off the mapped file"""
+        return memoryview(self._map(f"{column}.codes")).cast(self.codes_types[column])
+
+    def cost(self):
+        return memoryview(self._map(f"{COST_COLUMN}.f8")).cast('d')
+
+    def dictionary(self, column):
+        with open(os.path.join(self.path, f"{column}.dict.json"), encoding='utf-8') as f:
+            return json.load(f)
+
+
+def read_day_partition(root, date):
+    """Decode a whole day back into rows (for inspection; queries use scan_store)"""
+    pointer = read_day_pointer(root, date)
+    if pointer is None:
+        return None
+    fields = [PARTITION_FIELD] + pointer['fields']
+    rows = []
+    for service in pointer['services']:
+        part = Partition(root, pointer, service)
+        decoded = [[part.dictionary(c)[code] for code in part.codes(c)] for c in pointer['fields']]
+        for i, cost in enumerate(part.cost()):
+            rows.append([service] + [values[i] for values in decoded] + [cost])
+    return {'date': date, 'fields': fields, 'rows': rows}
+
+
+def _scan_numpy(part, group_columns, filter_codes):
+    cost = np.frombuffer(part.cost(), dtype=np.float64)
+    mask = None
+    for column, wanted in filter_codes:
+        matches = np.isin(np.frombuffer(part.codes(column), dtype=part.codes_types[column]), wanted)
+        mask = matches if mask is None else mask & matches
+
+    codes = [np.frombuffer(part.codes(column), dtype=part.codes_types[column]).astype(np.int64)
+             for column, _ in group_columns]
+    if mask is not None:
+        codes, cost = [c[mask] for c in codes], cost[mask]
+    if not len(cost):
+        return []
+
+    radix = 1
+    for _, size in group_columns:
+        radix *= size
+    if radix > INT64_MAX:
+        # A combined key would overflow int64: group on the stacked code columns instead
+        unique, inverse = np.unique(np.stack(codes, axis=1), axis=0, return_inverse=True)
+        sums = np.bincount(inverse.ravel(), weights=cost)
+        return [(tuple(row), total) for row, total in zip(unique.tolist(), sums.tolist())]
+
+    # One integer key per row: mixed-radix code over the group columns
+    key = np.zeros(len(cost), dtype=np.int64)
+    for column_codes, (_, size) in zip(codes, group_columns):
+        key = key * size + column_codes
+
+    unique, inverse = np.unique(key, return_inverse=True)
+    sums = np.bincount(inverse.ravel(), weights=cost)
+    results = []
+    for combined, total in zip(unique.tolist(), sums.tolist()):
+        codes = []
+        for _, size in reversed(group_columns):
+            combined, code = divmod(combined, size)
+            codes.append(code)
+        results.append((tuple(reversed(codes)), total))
+    return results
+
+
+def _scan_python(part, group_columns, filter_codes):
+    filters = [set(wanted) for _, wanted in filter_codes]
+    views = [part.cost()] + [part.codes(c) for c, _ in filter_codes] + [part.codes(c) for c, _ in group_columns]
+    n_filters = len(filters)
+    totals = {}
+    for row in zip(*views):
+        if n_filters and not all(row[1 + j] in filters[j] for j in range(n_filters)):
+            continue
+        key = row[1 + n_filters:]
+        totals[key] = totals.get(key, 0.0) + row[0]
+    return list(totals.items())
+
+
+def scan_partition(part, group_by, filters):
+    """
+    Sum cost by group_by over one partition, after filters ({field: values})
+    Returns [(group value tuple, cost)]
+    """
+    filter_codes = []
+    for column, values in filters.items():
+        if column in PARTITION_KEYS:
+            continue
+        wanted = [code for code, value in enumerate(part.dictionary(column)) if value in values]
+        if not wanted:
+            return []
+        filter_codes.append((column, wanted))
+
+    stored = [field for field in group_by if field not in PARTITION_KEYS]
+    dictionaries = {column: part.dictionary(column) for column in stored}
+    group_columns = [(column, max(len(dictionaries[column]), 1)) for column in stored]
+
+    scan = _scan_numpy if np is not None else _scan_python
+    constants = {'date': part.date, PARTITION_FIELD: part.service}
+    results = []
+    for codes, total in scan(part, group_columns, filter_codes):
+        decoded = dict(zip(stored, (dictionaries[c][code] for c, code in zip(stored, codes))))
+        results.append((tuple(constants[f] if f in constants else decoded[f] for f in group_by), total))
+    return results
+
+
+def scan_store(root, start, end, group_by=(), filters=None):
+    """
+    Business Logic: Group-by/filter query over stored CUR aggregates
+
+    - Only days in [start, end] are read and only services passing the
+      service filter are opened (partition pruning)
+    - Only the filtered and grouped columns plus cost are memory-mapped
+    - Each partition is scanned with numpy (mask + bincount) when available,
+      otherwise in one loop over memoryview casts of the mapped columns.
+      Group codes combine into one int64 key unless the dictionary sizes
+      could overflow it, in which case the stacked code columns are grouped
+    Returns ({group value tuple: cost}, stats)
+    """
+    group_by = list(group_by)
+    filters = {field: set(values) for field, values in (filters or {}).items()}
+    totals = {}
+    stats = {'days': 0, 'partitions': 0, 'rows_scanned': 0}
+
+    for date in stored_days(root):
+        if date < start or date > end:
+            continue
+        # A concurrent refresh may remove the generation we are reading: retry once on the new one
+        for attempt in range(2):
+            pointer = read_day_pointer(root, date)
+            if pointer is None:
+                break
+            unknown = [f for f in group_by + list(filters) if f not in PARTITION_KEYS and f not in pointer['fields']]
+            if unknown:
+                raise ValueError(f"Unknown store fields: {', '.join(unknown)}")
+            services = [s for s in pointer['services']
+                        if PARTITION_FIELD not in filters or s in filters[PARTITION_FIELD]]
+            try:
+                day_totals = {}
+                rows = 0
+                for service in services:
+                    part = Partition(root, pointer, service)
+                    rows += part.rows
+                    for key, cost in scan_partition(part, group_by, filters):
+                        day_totals[key] = day_totals.get(key, 0.0) + cost
+            except FileNotFoundError:
+                if attempt:
+                    raise
+                continue
+            for key, cost in day_totals.items():
+                totals[key] = totals.get(key, 0.0) + cost
+            stats['days'] += 1
+            stats['partitions'] += len(services)
+            stats['rows_scanned'] += rows
+            break
+
+    return totals, stats
+
+
+def query_store(root, start, end, group_by=(), filters=None, limit=None):
+    """Ranked rows [{**group values, 'cost'}] plus total and scan stats"""
+    totals, stats = scan_store(root, start, end, group_by, filters)
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    rows = [dict(zip(group_by, key), cost=cost) for key, cost in ranked[:limit]]
+    return {
+        'start': start,
+        'end': end,
+        'group_by': list(group_by),
+        'rows': rows,
+        'total_cost': sum(totals.values()),
+        'groups': len(totals),
+        **stats
+    }
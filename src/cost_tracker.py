@@ -3,55 +3,85 @@ import json
 from datetime import datetime, timedelta
 import os
 
+from cost_cube import iter_ce_rows, group_field
+from budgets import evaluate_budgets
+from hourly_burn import update_hourly, burn_checks, ALL
+from alert_state import observe, reconcile_alerts, record_notified
+
+# Dimensions budgets can be scoped by (at most two: Cost Explorer limit),
+# e.g. "SERVICE,REGION", "SERVICE,LINKED_ACCOUNT" or "SERVICE,TAG:Team"
+BUDGET_DIMENSIONS = [d.strip() for d in os.environ.get('BUDGET_DIMENSIONS', 'SERVICE,REGION').split(',') if d.strip()]
+BURN_KINDS = ('projected_over_limit', 'burn_rate_spike')
+
 def lambda_handler(event, context):
     """
     Business Purpose: Daily cost monitoring to prevent surprise bills
-    This function checks yesterday's AWS costs and alerts if over threshold
+    This function checks yesterday's AWS costs and alerts if the total is
+    over threshold or any scoped budget (daily, weekly or month-to-date) is exceeded
+    
+    Scheduled with {"mode": "hourly"} (or TRACKER_MODE=hourly) it checks
+    hourly burn rates instead
     """
     
+    mode = (event or {}).get('mode', os.environ.get('TRACKER_MODE', 'daily'))
+    if mode == 'hourly':
+        return check_hourly_burn()
+    
     # Initialize AWS clients
     ce_client = boto3.client('ce')  # Cost Explorer
     sns_client = boto3.client('sns')
+    dynamodb = boto3.resource('dynamodb')
     
     # Get yesterday's costs (business requirement: daily monitoring)
     end_date = datetime.now().date()
     start_date = end_date - timedelta(days=1)
     
     try:
-        # Query Cost Explorer API
-        response = ce_client.get_cost_and_usage(
-            TimePeriod={
-                'Start': start_date.strftime('%Y-%m-%d'),
-                'End': end_date.strftime('%Y-%m-%d')
-            },
-            Granularity='DAILY',
-            Metrics=['BlendedCost'],
-            GroupBy=[
-                {
-                    'Type': 'DIMENSION',
-                    'Key': 'SERVICE'
-                }
-            ]
-        )
+        # Query Cost Explorer API: one grouped day feeds the total and every budget
+        cells = list(iter_ce_rows(ce_client, start_date, end_date, BUDGET_DIMENSIONS))
+        fields = [group_field(d)[1] for d in BUDGET_DIMENSIONS]
         
         # Process the cost data
         daily_cost = 0
         service_costs = {}
         
-        for result in response['ResultsByTime']:
-            for group in result['Groups']:
-                service = group['Keys'][0]
-                cost = float(group['Metrics']['BlendedCost']['Amount'])
-                service_costs[service] = cost
-                daily_cost += cost
+        for cell in cells:
+            cost = cell['cost']
+            if 'service' in cell:
+                service_costs[cell['service']] = service_costs.get(cell['service'], 0) + cost
+            daily_cost += cost
+        
+        budgets = []
+        # Alert kinds checked in full this run; their alerts with no check are resolved
+        kinds = ['daily_total']
+        try:
+            budgets = evaluate_budgets(dynamodb, start_date.strftime('%Y-%m-%d'), cells, fields)
+            kinds.append('budget')
+        except Exception as e:
+            print(f"Error evaluating budgets: {str(e)}")
+        breached = [b for b in budgets if b['breached']]
         
         # Business logic: Alert if over threshold
         threshold = float(os.environ.get('COST_THRESHOLD', '5.0'))  # $5 default
         
-        if daily_cost > threshold:
+        # Only alerts that are new or have escalated since the last notification go out
+        checks = [observe('daily_total', 'account', daily_cost, threshold)]
+        checks += [observe('budget', b['id'], b['spend'], b['limit'], budget=b) for b in budgets]
+        notify = reconcile_alerts(dynamodb, checks, kinds)
+        
+        if notify:
+            notified_budgets = [c['budget'] for c in notify if c['kind'] == 'budget']
             message = f"⚠️ AWS Cost Alert!\n\n"
             message += f"Yesterday's total: ${daily_cost:.2f}\n"
             message += f"Threshold: ${threshold:.2f}\n\n"
+            
+            if notified_budgets:
+                message += f"Budgets exceeded ({len(notified_budgets)}):\n"
+                for budget in notified_budgets[:10]:
+                    message += (f"• {budget['name']} ({budget['window']}): "
+                                f"${budget['spend']:.2f} of ${budget['limit']:.2f}\n")
+                message += "\n"
+            
             message += "Top services:\n"
             
             # Sort services by cost
@@ -66,22 +96,19 @@ def lambda_handler(event, context):
                 Message=message,
                 Subject=f"AWS Cost Alert: ${daily_cost:.2f}"
             )
-            
-            return {
-                'statusCode': 200,
-                'body': json.dumps({
-                    'message': 'Alert sent',
-                    'daily_cost': daily_cost,
-                    'threshold_exceeded': True
-                })
-            }
+            # Only after a successful publish: a failed one is retried next run
+            record_notified(dynamodb, notify)
         
         return {
             'statusCode': 200,
             'body': json.dumps({
-                'message': 'Cost within threshold',
+                'message': 'Alert sent' if notify else ('Alert already sent' if daily_cost > threshold or breached
+                                                        else 'Cost within threshold'),
                 'daily_cost': daily_cost,
-                'threshold_exceeded': False
+                'threshold_exceeded': daily_cost > threshold,
+                'budgets_evaluated': len(budgets),
+                'budgets_exceeded': [b['id'] for b in breached],
+                'alerts_sent': [{'kind': c['kind'], 'subject': c['subject'], 'reason': c['reason']} for c in notify]
             })
         }
         
@@ -90,4 +117,65 @@ def lambda_handler(event, context):
         return {
             'statusCode': 500,
             'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+        }
+
+
+def check_hourly_burn():
+    """
+    Business Purpose: Catch runaway spend within hours instead of a day later
+    Folds only the new CE hours into persisted per-service ring buffers and
+    alerts on burn rates computed from them
+    """
+    ce_client = boto3.client('ce')
+    sns_client = boto3.client('sns')
+    dynamodb = boto3.resource('dynamodb')
+    
+    try:
+        summaries = update_hourly(dynamodb, ce_client)
+        daily_limit = float(os.environ.get('COST_THRESHOLD', '5.0'))
+        checks = burn_checks(summaries, daily_limit)
+        alerts = [c for c in checks if c['breached']]
+        
+        # Only alerts that are new or have escalated since the last notification go out
+        # Without new hours nothing was checked, so no alert can be resolved as vanished
+        kinds = BURN_KINDS if summaries else ()
+        notify = reconcile_alerts(dynamodb, [observe(c['kind'], c['series'], c['value'], c['threshold'], check=c)
+                                             for c in checks], kinds)
+        
+        if notify:
+            total = summaries.get(ALL, {})
+            message = f"🔥 AWS Burn Rate Alert!\n\n"
+            message += f"Last 24h total: ${total.get('last_24h', 0.0):.2f}\n"
+            message += f"Current rate: ${total.get('rate', 0.0):.2f}/hour (limit ${daily_limit:.2f}/day)\n\n"
+            for alert in [n['check'] for n in notify][:10]:
+                name = 'Account total' if alert['series'] == ALL else alert['series']
+                if alert['kind'] == 'projected_over_limit':
+                    message += f"• {name}: on pace for ${alert['projected_daily']:.2f} today\n"
+                else:
+                    message += (f"• {name}: ${alert['rate']:.2f}/hour vs "
+                                f"${alert['baseline_rate']:.2f}/hour usual\n")
+            
+            sns_client.publish(
+                TopicArn=os.environ['SNS_TOPIC_ARN'],
+                Message=message,
+                Subject=f"AWS Burn Rate Alert: ${total.get('rate', 0.0):.2f}/hour"
+            )
+            record_notified(dynamodb, notify)
+        
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'message': 'Alert sent' if notify else ('Alert already sent' if alerts else 'Burn rate within limits'),
+                'last_hour': summaries.get(ALL, {}).get('last_hour'),
+                'series_checked': len(summaries),
+                'alerts': [{'series': a['series'], 'kind': a['kind'], 'rate': a['rate']} for a in alerts],
+                'alerts_sent': [{'series': n['subject'], 'kind': n['kind'], 'reason': n['reason']} for n in notify]
+            })
+        }
+        
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
@@ -0,0 +1,295 @@
+import csv
+import gzip
+import json
+import os
+import re
+from operator import itemgetter
+
+import boto3
+from s3transfer.manager import TransferManager, TransferConfig
+
+from cost_cube import build_cube
+
+# Optional: Parquet reports need pyarrow (e.g. from a Lambda layer)
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+CUR_BUCKET = os.environ.get('CUR_BUCKET', '')
+CUR_PREFIX = os.environ.get('CUR_PREFIX', '')
+# Point at a local S3 stand-in (MinIO, LocalStack) for testing
+CUR_S3_ENDPOINT_URL = os.environ.get('CUR_S3_ENDPOINT_URL') or None
+CUR_DOWNLOAD_DIR = os.environ.get('CUR_DOWNLOAD_DIR', '/tmp/cur')
+CUR_MAX_CONCURRENCY = int(os.environ.get('CUR_MAX_CONCURRENCY', '10'))
+CUR_CHUNK_MB = int(os.environ.get('CUR_CHUNK_MB', '16'))
+# Report parts on disk (downloaded or downloading) at once; bounds /tmp use
+CUR_PARTS_AHEAD = int(os.environ.get('CUR_PARTS_AHEAD', '2'))
+PARQUET_BATCH_ROWS = 65536
+
+MB = 1024 * 1024
+CUR_FIELDS = ['service', 'region', 'usage_type', 'account']
+
+# Normalized column name candidates, CUR 2.0 / Parquet names first, then
+# legacy CSV names ("lineItem/UsageStartDate" -> "line_item_usage_start_date")
+COLUMNS = {
+    'date': ('line_item_usage_start_date',),
+    'service': ('product_product_name', 'product_servicename', 'line_item_product_code'),
+    'region': ('product_region_code', 'product_region'),
+    'usage_type': ('line_item_usage_type',),
+    'account': ('line_item_usage_account_id',),
+    'operation': ('line_item_operation',),
+    'resource_id': ('line_item_resource_id',),
+    'line_item_type': ('line_item_line_item_type',),
+    'cost': ('line_item_blended_cost', 'line_item_unblended_cost')
+}
+
+# Line items are tuples in this order
+LINE_ITEM_FIELDS = ('date', 'service', 'region', 'usage_type', 'account', 'operation', 'resource_id',
+                    'line_item_type', 'cost')
+FIELD_INDEX = {field: i for i, field in enumerate(LINE_ITEM_FIELDS)}
+
+EMPTY_LABELS = {'service': 'Unknown', 'region': 'Global', 'usage_type': 'Unknown', 'account': 'Unknown',
+                'operation': 'Unknown', 'resource_id': ''}
+
+# Line item types that are not spend (kept out of the cube, as in CE's default view)
+EXCLUDED_LINE_ITEM_TYPES = {'Tax', 'Refund', 'Credit'}
+
+
+def normalize_column(name):
+    """'lineItem/UsageStartDate' and 'line_item_usage_start_date' both map to the latter"""
+    name = re.sub(r'(?<=[a-z0-9])([A-Z])', r'_\1', name.replace('/', '_'))
+    return name.lower()
+
+
+def column_map(header):
+    """{field: column position} for the fields this report has"""
+    positions = {normalize_column(name): i for i, name in enumerate(header)}
+    found = {}
+    for field, candidates in COLUMNS.items():
+        for candidate in candidates:
+            if candidate in positions:
+                found[field] = positions[candidate]
+                break
+    missing = [f for f in ('date', 'cost') if f not in found]
+    if missing:
+        raise ValueError(f"CUR file is missing required columns: {', '.join(missing)}")
+    return found
+
+
+def _line_items(records, columns, width):
+    """
+    Turn positional records into LINE_ITEM_FIELDS tuples
+    Optional columns a report lacks read from a padding slot at `width`
+    """
+    get = itemgetter(*[columns.get(field, width) for field in LINE_ITEM_FIELDS])
+    pad = any(field not in columns for field in LINE_ITEM_FIELDS)
+    for record in records:
+        if pad:
+            record = list(record)
+            record.append(None)
+        date, service, region, usage_type, account, operation, resource_id, line_item_type, cost = get(record)
+        yield (str(date)[:10],
+               service or EMPTY_LABELS['service'],
+               region or EMPTY_LABELS['region'],
+               usage_type or EMPTY_LABELS['usage_type'],
+               account or EMPTY_LABELS['account'],
+               operation or EMPTY_LABELS['operation'],
+               resource_id or EMPTY_LABELS['resource_id'],
+               line_item_type or '',
+               float(cost) if cost else 0.0)
+
+
+def iter_csv_line_items(path):
+    """Stream line items from a gzip (or plain) CSV report part, row by row"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        yield from _line_items(reader, column_map(header), len(header))
+
+
+def iter_parquet_line_items(path):
+    """Stream line items from a Parquet report part, one record batch at a time"""
+    if pq is None:
+        raise RuntimeError("Parquet CUR files need pyarrow; attach a pyarrow layer or export CSV")
+    parquet = pq.ParquetFile(path)
+    columns = column_map(parquet.schema_arrow.names)
+    wanted = sorted(set(columns.values()))
+    names = [parquet.schema_arrow.names[i] for i in wanted]
+    position = {i: n for n, i in enumerate(wanted)}
+    columns = {field: position[i] for field, i in columns.items()}
+
+    for batch in parquet.iter_batches(batch_size=PARQUET_BATCH_ROWS, columns=names):
+        data = [batch.column(n).to_pylist() for n in range(batch.num_columns)]
+        yield from _line_items(zip(*data), columns, len(wanted))
+
+
+def iter_line_items(path):
+    if path.endswith('.parquet') or path.endswith('.snappy.parquet'):
+        return iter_parquet_line_items(path)
+    return iter_csv_line_items(path)
+
+
+def aggregate_line_items(items, fields=CUR_FIELDS, totals=None):
+    """
+    Business Logic: Sum line items by (date, fields) in bounded memory
+
+    Memory grows with distinct (day, dimension) combinations, not with the
+    number of line items. Pass totals to keep accumulating across parts.
+    Returns {(date, *field values): cost}.
+    """
+    totals = {} if totals is None else totals
+    key_of = itemgetter(0, *[FIELD_INDEX[f] for f in fields])
+    type_index = FIELD_INDEX['line_item_type']
+    for item in items:
+        if item[type_index] in EXCLUDED_LINE_ITEM_TYPES:
+            continue
+        key = key_of(item)
+        totals[key] = totals.get(key, 0.0) + item[-1]
+    return totals
+
+
+def totals_to_rows(totals, fields=CUR_FIELDS):
+    for key, cost in totals.items():
+        row = dict(zip(fields, key[1:]))
+        row['date'] = key[0]
+        row['cost'] = cost
+        yield row
+
+
+def ingest_files(paths, fields=CUR_FIELDS):
+    """Aggregate local CUR parts (CSV, gzip CSV or Parquet) into a cost cube"""
+    totals = {}
+    for path in paths:
+        aggregate_line_items(iter_line_items(path), fields, totals)
+    return build_cube(totals_to_rows(totals, fields), fields)
+
+
+def s3_client():
+    return boto3.client('s3', endpoint_url=CUR_S3_ENDPOINT_URL)
+
+
+def parse_manifest(manifest):
+    """
+    (assembly id, billing period 'YYYYMMDD', part keys) from a legacy CUR
+    manifest (assemblyId/reportKeys) or a CUR 2.0 one (executionId/dataFiles)
+    """
+    assembly = manifest.get('assemblyId') or manifest.get('executionId')
+    keys = manifest.get('reportKeys')
+    if keys is None:
+        # s3://bucket/key -> key
+        keys = [uri.split('/', 3)[3] for uri in manifest.get('dataFiles', [])]
+    period = manifest['billingPeriod']['start'][:10].replace('-', '')[:8]
+    return assembly, period, keys
+
+
+def read_manifest(client, bucket, key):
+    return json.loads(client.get_object(Bucket=bucket, Key=key)['Body'].read())
+
+
+def list_report_parts(client, bucket, prefix):
+    """
+    Keys of the current report parts under prefix, per billing period
+
+    Every delivery writes a new assembly next to the older ones, so listing
+    the data files would count a period several times. Only the newest
+    manifest of each billing period is used, and its part keys are returned.
+    """
+    manifests = []
+    for page in client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if obj['Key'].endswith('Manifest.json'):
+                manifests.append(obj)
+    manifests.sort(key=lambda obj: (obj['LastModified'], -len(obj['Key'])), reverse=True)
+
+    keys = {}
+    for obj in manifests:
+        _, period, part_keys = parse_manifest(read_manifest(client, bucket, obj['Key']))
+        keys.setdefault(period, part_keys)
+    return [key for period in sorted(keys) for key in keys[period]]
+
+
+def iter_downloaded_parts(client, bucket, keys, dest_dir=CUR_DOWNLOAD_DIR, ahead=CUR_PARTS_AHEAD):
+    """
+    Business Logic: Download report parts as a bounded pipeline
+
+    Yields (key, local path) in key order. At most `ahead` parts are on
+    disk or downloading at once, and a part's file is deleted as soon as
+    the consumer moves on to the next one, so /tmp holds a few parts rather
+    than the whole report. s3transfer splits each part larger than
+    CUR_CHUNK_MB into up to CUR_MAX_CONCURRENCY parallel ranged GETs.
+    """
+    config = TransferConfig(
+        multipart_threshold=CUR_CHUNK_MB * MB,
+        multipart_chunksize=CUR_CHUNK_MB * MB,
+        max_request_concurrency=CUR_MAX_CONCURRENCY
+    )
+    os.makedirs(dest_dir, exist_ok=True)
+    keys = list(keys)
+    paths = [os.path.join(dest_dir, key.replace('/', '_')) for key in keys]
+    started = {}
+    try:
+        with TransferManager(client, config) as manager:
+            for i, key in enumerate(keys):
+                for j in range(i, min(i + max(ahead, 1), len(keys))):
+                    if j not in started:
+                        started[j] = manager.download(bucket, keys[j], paths[j])
+                started[i].result()
+                try:
+                    yield key, paths[i]
+                finally:
+                    del started[i]
+                    _remove(paths[i])
+    finally:
+        # Consumer stopped early or a download failed: drop parts fetched ahead
+        for j in started:
+            _remove(paths[j])
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def ingest_s3(client, bucket, prefix, fields=CUR_FIELDS, dest_dir=CUR_DOWNLOAD_DIR):
+    """
+    Aggregate the current report parts under prefix into a cube
+    Parts stream through a bounded download pipeline and are deleted from
+    /tmp once aggregated
+    """
+    keys = list_report_parts(client, bucket, prefix)
+    totals = {}
+    for _, path in iter_downloaded_parts(client, bucket, keys, dest_dir):
+        aggregate_line_items(iter_line_items(path), fields, totals)
+    print(f"Aggregated {len(keys)} CUR parts into {len(totals)} cells")
+    return build_cube(totals_to_rows(totals, fields), fields)
+
+
+def cube_summary(cube):
+    width = len(cube['dates'])
+    return {
+        'series': len(cube['keys']),
+        'days': width,
+        'first_date': cube['dates'][0] if width else None,
+        'last_date': cube['dates'][-1] if width else None,
+        'total_cost': sum(cube['values'])
+    }
+
+
+def lambda_handler(event, context):
+    """
+    Business Purpose: Deep cost analysis from the Cost and Usage Report
+    Ingests every report part under CUR_PREFIX (or event['prefix']); local
+    runs can pass event['paths'] to aggregate files on disk instead
+    """
+    event = event or {}
+    if event.get('paths'):
+        cube = ingest_files(event['paths'])
+    else:
+        cube = ingest_s3(s3_client(), event.get('bucket', CUR_BUCKET), event.get('prefix', CUR_PREFIX))
+    return {'statusCode': 200, 'body': json.dumps(cube_summary(cube))}
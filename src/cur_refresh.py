@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+from urllib.parse import unquote_plus
+
+from cur_ingest import (
+    CUR_BUCKET, CUR_DOWNLOAD_DIR,
+    s3_client, iter_downloaded_parts, iter_line_items, aggregate_line_items, parse_manifest, read_manifest
+)
+from cost_store import COST_STORE_DIR, STORE_FIELDS, read_json, write_json, replace_day_partition, drop_day_partition
+
+
+class S3ReportSource:
+    """Report files in S3 (or a local S3 stand-in via CUR_S3_ENDPOINT_URL)"""
+
+    def __init__(self, client, bucket):
+        self.client = client
+        self.bucket = bucket
+
+    def manifest(self, key):
+        return read_manifest(self.client, self.bucket, key)
+
+    def checksums(self, keys):
+        """{key: ETag} from one paginated listing of the parts' common prefix"""
+        wanted = set(keys)
+        prefix = os.path.commonprefix(list(keys))
+        found = {}
+        for page in self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                if obj['Key'] in wanted:
+                    found[obj['Key']] = obj['ETag'].strip('"')
+        missing = wanted - set(found)
+        if missing:
+            raise ValueError(f"Manifest lists {len(missing)} missing report parts")
+        return found
+
+    def fetch(self, keys, dest_dir):
+        """(key, path) per part; each file is deleted once the caller moves on"""
+        return iter_downloaded_parts(self.client, self.bucket, keys, dest_dir)
+
+
+class LocalReportSource:
+    """Report files under a local directory, keys relative to it (for testing)"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def manifest(self, key):
+        with open(os.path.join(self.root, key), encoding='utf-8') as f:
+            return json.load(f)
+
+    def checksums(self, keys):
+        found = {}
+        for key in keys:
+            digest = hashlib.sha256()
+            with open(os.path.join(self.root, key), 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            found[key] = digest.hexdigest()
+        return found
+
+    def fetch(self, keys, dest_dir):
+        return ((key, os.path.join(self.root, key)) for key in keys)
+
+
+def part_ids(checksums, keys):
+    """
+    Identify parts by content checksum, so a part re-delivered unchanged under
+    a new assembly's key is recognized; repeated checksums get an occurrence suffix
+    """
+    ids = {}
+    seen = {}
+    for key in sorted(keys):
+        checksum = checksums[key]
+        n = seen.get(checksum, 0)
+        seen[checksum] = n + 1
+        ids[f"{checksum}#{n}" if n else checksum] = key
+    return ids
+
+
+def state_path(root, period):
+    return os.path.join(root, '_state', f"{period}.json.gz")
+
+
+def part_path(root, part_id):
+    return os.path.join(root, '_parts', f"{part_id.replace('#', '-')}.json.gz")
+
+
+def aggregate_part(path, fields):
+    """One part's totals as {date: [[*field values, cost], ...]}"""
+    by_day = {}
+    for key, cost in aggregate_line_items(iter_line_items(path), fields).items():
+        by_day.setdefault(key[0], []).append(list(key[1:]) + [cost])
+    return by_day
+
+
+def refresh(source, manifest_key, root=COST_STORE_DIR, fields=STORE_FIELDS, dest_dir=CUR_DOWNLOAD_DIR):
+    """
+    Business Logic: Apply a CUR delivery incrementally
+
+    1. Same assemblyId as last processed: nothing to do
+    2. Parts whose checksum was already processed are skipped; only new
+       parts are downloaded, one at a time, and aggregated (per-part
+       totals are kept)
+    3. Days touched by new or vanished parts are rebuilt from the per-part
+       totals of the current parts, and each day partition is replaced
+       atomically; untouched days are not rewritten
+    The state file is written last, so an interrupted run simply redoes
+    the same work next time.
+    """
+    assembly, period, keys = parse_manifest(source.manifest(manifest_key))
+    state = read_json(state_path(root, period), {'assembly_id': None, 'parts': {}})
+    if state.get('fields', fields) != list(fields):
+        # Stored per-part totals have another layout: rebuild the period from scratch
+        state = {'assembly_id': None, 'parts': {}}
+    if assembly and state['assembly_id'] == assembly:
+        return {'status': 'unchanged', 'period': period, 'assembly_id': assembly}
+
+    current = part_ids(source.checksums(keys), keys)
+    known = state['parts']
+    added = [part_id for part_id in current if part_id not in known]
+    removed = [part_id for part_id in known if part_id not in current]
+
+    part_days = {part_id: known[part_id]['days'] for part_id in current if part_id in known}
+    affected = set()
+    for part_id in removed:
+        affected.update(known[part_id]['days'])
+
+    # Parts stream in one at a time; only their per-day totals are kept
+    added_keys = {current[part_id]: part_id for part_id in added}
+    for key, path in source.fetch(list(added_keys), dest_dir) if added else ():
+        part_id = added_keys[key]
+        by_day = aggregate_part(path, fields)
+        write_json(part_path(root, part_id), by_day)
+        part_days[part_id] = sorted(by_day)
+        affected.update(by_day)
+
+    # Rebuild only the affected days, reading each relevant part once
+    totals = {day: {} for day in affected}
+    for part_id, days in part_days.items():
+        if not affected.intersection(days):
+            continue
+        by_day = read_json(part_path(root, part_id), {})
+        for day in affected.intersection(by_day):
+            day_totals = totals[day]
+            for row in by_day[day]:
+                cell = tuple(row[:-1])
+                day_totals[cell] = day_totals.get(cell, 0.0) + row[-1]
+
+    for day in sorted(totals):
+        if totals[day]:
+            replace_day_partition(root, day, [list(cell) + [cost] for cell, cost in totals[day].items()], fields)
+        else:
+            drop_day_partition(root, day)
+
+    write_json(state_path(root, period), {
+        'assembly_id': assembly,
+        'fields': list(fields),
+        'parts': {part_id: {'key': current[part_id], 'days': part_days[part_id]} for part_id in current}
+    })
+    for part_id in removed:
+        try:
+            os.remove(part_path(root, part_id))
+        except FileNotFoundError:
+            pass
+
+    result = {
+        'status': 'refreshed',
+        'period': period,
+        'assembly_id': assembly,
+        'parts': len(current),
+        'parts_processed': len(added),
+        'parts_skipped': len(current) - len(added),
+        'parts_removed': len(removed),
+        'days_replaced': sorted(affected)
+    }
+    print(f"CUR refresh {period}: {len(added)}/{len(current)} parts processed, {len(affected)} days replaced")
+    return result
+
+
+def lambda_handler(event, context):
+    """
+    Business Purpose: Keep the CUR store current as AWS rewrites the month
+    Triggered by the manifest's S3 PutObject event, or invoked with
+    {"manifest": key} (plus "local_root" to read report files from disk)
+    """
+    event = event or {}
+    if event.get('local_root'):
+        source = LocalReportSource(event['local_root'])
+        manifest_key = event['manifest']
+    elif event.get('Records'):
+        s3_event = event['Records'][0]['s3']
+        source = S3ReportSource(s3_client(), s3_event['bucket']['name'])
+        manifest_key = unquote_plus(s3_event['object']['key'])
+    else:
+        source = S3ReportSource(s3_client(), event.get('bucket', CUR_BUCKET))
+        manifest_key = event['manifest']
+
+    result = refresh(source, manifest_key, event.get('store_dir', COST_STORE_DIR))
+    return {'statusCode': 200, 'body': json.dumps(result)}
@@ -0,0 +1,53 @@
+def lttb_indices(values, max_points):
+    """
+    Largest-Triangle-Three-Buckets downsampling
+
+    Returns the indices of at most max_points samples from an evenly spaced
+    series. First and last points are always kept; from each bucket in between
+    the point forming the largest triangle with the previously kept point and
+    the next bucket's average is chosen, which preserves spikes and dips that
+    plain averaging or striding would flatten.
+    """
+    n = len(values)
+    if max_points >= n or max_points < 3:
+        return list(range(n))
+
+    indices = [0]
+    bucket_size = (n - 2) / (max_points - 2)
+    a = 0  # index of the previously selected point
+
+    for i in range(max_points - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+
+        # Average of the next bucket (the last point for the final bucket)
+        next_start = end
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        if next_start >= next_end:
+            avg_x, avg_y = n - 1, values[n - 1]
+        else:
+            avg_x = (next_start + next_end - 1) / 2
+            avg_y = sum(values[next_start:next_end]) / (next_end - next_start)
+
+        # Triangle area is proportional to |(ax - avg_x)(y - ay) - (ax - x)(avg_y - ay)|
+        ay = values[a]
+        dx = a - avg_x
+        dy = avg_y - ay
+        best = start
+        best_area = -1.0
+        for j in range(start, end):
+            area = abs(dx * (values[j] - ay) - (a - j) * dy)
+            if area > best_area:
+                best, best_area = j, area
+
+        indices.append(best)
+        a = best
+
+    indices.append(n - 1)
+    return indices
+
+
+def downsample_rows(rows, max_points, value_key='cost'):
+    """Apply LTTB to a list of row dicts ordered by time"""
+    indices = lttb_indices([row[value_key] for row in rows], max_points)
+    return [rows[i] for i in indices]
@@ -0,0 +1,39 @@
+from decimal import Decimal
+
+
+def to_dynamo(obj):
+    """Convert floats to Decimal and tuples to lists (recursively) for DynamoDB writes"""
+    if isinstance(obj, float):
+        return Decimal(str(obj))
+    elif isinstance(obj, dict):
+        return {k: to_dynamo(v) for k, v in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return [to_dynamo(v) for v in obj]
+    else:
+        return obj
+
+
+def from_dynamo(obj):
+    """Convert DynamoDB Decimals back to int/float (recursively)"""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    elif isinstance(obj, dict):
+        return {k: from_dynamo(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [from_dynamo(v) for v in obj]
+    else:
+        return obj
+
+
+def batch_get_items(dynamodb, table, ids):
+    """Fetch items by 'id' in batches of 100, retrying unprocessed keys"""
+    items = {}
+    ids = list(ids)
+    for i in range(0, len(ids), 100):
+        request = {table.name: {'Keys': [{'id': item_id} for item_id in ids[i:i + 100]]}}
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response['Responses'].get(table.name, []):
+                items[item['id']] = item
+            request = response.get('UnprocessedKeys')
+    return items
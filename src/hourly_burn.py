@@ -0,0 +1,198 @@
+import os
+from datetime import datetime, timedelta
+
+from cost_cube import iter_ce_rows
+from dynamo_helpers import to_dynamo, from_dynamo, batch_get_items
+
+HOURLY_TABLE = os.environ.get('COST_HOURLY_TABLE', 'cost-hourly')
+CHECKPOINT_ID = '#checkpoint'
+ALL = '*'
+
+RING_HOURS = 168                                                  # one week per series
+BURN_WINDOW = int(os.environ.get('BURN_WINDOW_HOURS', '3'))       # recent burn-rate window
+WINDOWS = (BURN_WINDOW, 24, RING_HOURS)
+SETTLE_HOURS = int(os.environ.get('HOURLY_SETTLE_HOURS', '2'))    # CE hourly data lag
+BACKFILL_HOURS = int(os.environ.get('HOURLY_BACKFILL_HOURS', '24'))
+MAX_LOOKBACK_HOURS = 14 * 24                                      # CE hourly retention
+
+BURN_RATE_FACTOR = float(os.environ.get('BURN_RATE_FACTOR', '3.0'))
+BURN_MIN_RATE = float(os.environ.get('BURN_MIN_RATE', '0.10'))   # $/hour
+
+
+def hour_key(moment):
+    return moment.strftime('%Y-%m-%dT%H:00:00Z')
+
+
+def parse_hour(key):
+    return datetime.strptime(key, '%Y-%m-%dT%H:%M:%SZ')
+
+
+def new_state(sid):
+    return {
+        'id': sid,
+        'last_hour': None,
+        'count': 0,
+        'ring': [0.0] * RING_HOURS,   # last RING_HOURS hourly costs, indexed by count % RING_HOURS
+        'sums': {str(w): 0.0 for w in WINDOWS}
+    }
+
+
+def push_hour(state, cost):
+    """O(1): each window sum adds the new hour and drops the hour leaving it"""
+    count = state['count']
+    ring = state['ring']
+    cost = round(cost, 6)
+    for w in WINDOWS:
+        leaving = ring[(count - w) % RING_HOURS] if count >= w else 0.0
+        state['sums'][str(w)] = round(state['sums'][str(w)] + cost - leaving, 6)
+    ring[count % RING_HOURS] = cost
+    state['count'] = count + 1
+
+
+def advance_to(state, hour, cost):
+    """Append one hour, zero-filling hours since last_hour; hours already seen are ignored"""
+    moment = parse_hour(hour)
+    if state['last_hour']:
+        last = parse_hour(state['last_hour'])
+        if moment <= last:
+            return False
+        gap = int((moment - last).total_seconds() // 3600) - 1
+        for _ in range(min(gap, RING_HOURS)):
+            push_hour(state, 0.0)
+    push_hour(state, cost)
+    state['last_hour'] = hour
+    return True
+
+
+def burn_summary(state):
+    """
+    Recent hourly burn rate against the series' own trailing baseline
+    The baseline excludes the recent window so a spike does not mask itself
+    """
+    count = state['count']
+    sums = state['sums']
+    recent_hours = min(count, BURN_WINDOW)
+    baseline_hours = min(count, RING_HOURS) - recent_hours
+
+    rate = sums[str(BURN_WINDOW)] / recent_hours if recent_hours else 0.0
+    baseline = (sums[str(RING_HOURS)] - sums[str(BURN_WINDOW)]) / baseline_hours if baseline_hours else None
+    return {
+        'last_hour': state['last_hour'],
+        'hours': count,
+        'rate': rate,
+        'baseline_rate': baseline,
+        'projected_daily': rate * 24,
+        'last_24h': sums['24']
+    }
+
+
+def hour_range(first, end):
+    """Hour keys from first up to (excluding) end"""
+    hours = []
+    moment = first
+    while moment < end:
+        hours.append(hour_key(moment))
+        moment += timedelta(hours=1)
+    return hours
+
+
+def fetch_new_hours(ce_client, last_hour, now=None):
+    """
+    Business Logic: Fetch only settled hours CE has not given us yet
+
+    Starts at the hour after the checkpoint (or BACKFILL_HOURS ago on the
+    first run, never beyond CE's 14-day hourly retention) and stops
+    SETTLE_HOURS before now. Returns (hours, {service: {hour: cost}}).
+    """
+    now = now or datetime.utcnow()
+    end = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=SETTLE_HOURS)
+    earliest = end - timedelta(hours=MAX_LOOKBACK_HOURS)
+    start = parse_hour(last_hour) + timedelta(hours=1) if last_hour else end - timedelta(hours=BACKFILL_HOURS)
+    start = max(start, earliest)
+    if start >= end:
+        return [], {}
+
+    series = {}
+    for row in iter_ce_rows(ce_client, start, end, ['SERVICE'], granularity='HOURLY'):
+        hour = hour_key(parse_hour(row['date']))
+        for sid in (row['service'], ALL):
+            hours = series.setdefault(sid, {})
+            hours[hour] = hours.get(hour, 0.0) + row['cost']
+    return hour_range(start, end), series
+
+
+def update_hourly(dynamodb, ce_client, now=None):
+    """
+    Business Requirement: Keep per-service hourly ring buffers current
+
+    Loads the checkpoint and every known series, folds in the new hours up
+    to the last hour CE returned any spend for (earlier hours without spend
+    are zero) and writes back the states and the checkpoint.
+    Returns {series_id: burn summary}; empty when no new hours.
+    """
+    table = dynamodb.Table(HOURLY_TABLE)
+    checkpoint = table.get_item(Key={'id': CHECKPOINT_ID}).get('Item')
+    checkpoint = from_dynamo(checkpoint) if checkpoint else {'id': CHECKPOINT_ID, 'last_hour': None, 'services': []}
+
+    hours, series = fetch_new_hours(ce_client, checkpoint['last_hour'], now)
+    # Hours after the last one with any spend may still be published late:
+    # leave them (and the checkpoint) for the next run instead of zero-filling
+    with_data = [hour for costs in series.values() for hour in costs]
+    hours = [hour for hour in hours if with_data and hour <= max(with_data)]
+    if not hours:
+        return {}
+
+    sids = set(checkpoint['services']) | set(series) | {ALL}
+    items = batch_get_items(dynamodb, table, sids)
+    states = {sid: from_dynamo(items[sid]) if sid in items else new_state(sid) for sid in sids}
+
+    for sid, state in states.items():
+        costs = series.get(sid, {})
+        for hour in hours:
+            # A brand-new series starts at its first hour with spend
+            if state['last_hour'] is None and hour not in costs:
+                continue
+            advance_to(state, hour, costs.get(hour, 0.0))
+
+    checkpoint['last_hour'] = hours[-1]
+    checkpoint['services'] = sorted(sid for sid, state in states.items() if state['last_hour'])
+
+    with table.batch_writer(overwrite_by_pkeys=['id']) as batch:
+        for state in states.values():
+            if state['last_hour']:
+                batch.put_item(Item=to_dynamo(state))
+        # Checkpoint last: a failed run re-fetches, and seen hours are skipped
+        batch.put_item(Item=to_dynamo(checkpoint))
+
+    print(f"Hourly buffers advanced {len(hours)} hours for {len(checkpoint['services'])} series")
+    return {sid: burn_summary(state) for sid, state in states.items() if state['last_hour']}
+
+
+def burn_checks(summaries, daily_limit):
+    """
+    Business Logic: Burn-rate checks from the incremental summaries
+
+    - The account total breaches when its recent rate projects past the
+      daily limit
+    - A service breaches when its recent rate is BURN_RATE_FACTOR times
+      its own trailing baseline and at least BURN_MIN_RATE per hour
+    Every check is returned with 'value', 'threshold' and 'breached' so
+    alert state can also see what has recovered.
+    """
+    checks = []
+    for sid, summary in summaries.items():
+        if sid == ALL:
+            checks.append(dict(summary, series=sid, kind='projected_over_limit',
+                               value=summary['projected_daily'], threshold=daily_limit))
+            continue
+
+        baseline = summary['baseline_rate']
+        if baseline is None or summary['hours'] < 24 + BURN_WINDOW:
+            continue
+        checks.append(dict(summary, series=sid, kind='burn_rate_spike', value=summary['rate'],
+                           threshold=max(BURN_RATE_FACTOR * baseline, BURN_MIN_RATE)))
+
+    for check in checks:
+        check['breached'] = check['value'] > check['threshold']
+    checks.sort(key=lambda c: c['rate'], reverse=True)
+    return checks
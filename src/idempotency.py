@@ -0,0 +1,104 @@
+import json
+import os
+import time
+import uuid
+
+from botocore.exceptions import ClientError
+
+RUNS_TABLE = os.environ.get('COST_RUNS_TABLE', 'cost-runs')
+# A run that has not completed within the lease (Lambda's max timeout) is
+# presumed dead and may be taken over by a retry
+RUN_LEASE_SECONDS = int(os.environ.get('RUN_LEASE_SECONDS', '900'))
+# Completed records expire via DynamoDB TTL on 'expires_at'
+RUN_RECORD_DAYS = int(os.environ.get('RUN_RECORD_DAYS', '35'))
+
+
+def run_key(job, account_id, start_date, end_date):
+    """Runs are identified by what they compute, not when they were invoked"""
+    return f"{job}#{account_id}#{start_date}#{end_date}"
+
+
+def claim_run(table, run_id, now=None):
+    """
+    Business Logic: Claim a run with a conditional write
+
+    Returns {'status': 'claimed', 'token', 'sent'} when this invocation
+    should do the work: token identifies its lease and sent lists the side
+    effects an earlier, failed attempt already performed.
+    {'status': 'completed', 'response': ...} when an earlier invocation
+    succeeded and {'status': 'in_progress'} while another one holds it.
+    """
+    now = int(now or time.time())
+    token = uuid.uuid4().hex
+    try:
+        previous = table.put_item(
+            Item={
+                'id': run_id,
+                'status': 'in_progress',
+                'token': token,
+                'lease_until': now + RUN_LEASE_SECONDS,
+                'expires_at': now + RUN_RECORD_DAYS * 86400
+            },
+            ConditionExpression='attribute_not_exists(id) OR #s = :failed OR (#s = :running AND #l < :now)',
+            ExpressionAttributeNames={'#s': 'status', '#l': 'lease_until'},
+            ExpressionAttributeValues={':running': 'in_progress', ':failed': 'failed', ':now': now},
+            ReturnValues='ALL_OLD'
+        ).get('Attributes') or {}
+        sent = list(previous.get('sent') or [])
+        if sent:
+            # Keep the record of side effects until the run completes
+            _held_put(table, run_id, token, {'status': 'in_progress', 'lease_until': now + RUN_LEASE_SECONDS,
+                                             'sent': sent, 'expires_at': now + RUN_RECORD_DAYS * 86400})
+        return {'status': 'claimed', 'token': token, 'sent': sent}
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+    item = table.get_item(Key={'id': run_id}, ConsistentRead=True).get('Item')
+    if item and item['status'] == 'completed':
+        return {'status': 'completed', 'response': json.loads(item['response'])}
+    return {'status': 'in_progress'}
+
+
+def _held_put(table, run_id, token, fields):
+    """Write the run record only while this invocation still holds the lease"""
+    try:
+        table.put_item(
+            Item=dict(fields, id=run_id, token=token),
+            ConditionExpression='#s = :running AND #t = :token',
+            ExpressionAttributeNames={'#s': 'status', '#t': 'token'},
+            ExpressionAttributeValues={':running': 'in_progress', ':token': token}
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        print(f"Run {run_id}: lease lost to another invocation; record left unchanged")
+        return False
+
+
+def complete_run(table, run_id, token, response, now=None):
+    """
+    Record a successful run; later duplicates return its response unchanged
+    Returns False when the lease expired and another invocation took over
+    """
+    now = int(now or time.time())
+    return _held_put(table, run_id, token, {
+        'status': 'completed',
+        'completed_at': now,
+        'response': json.dumps(response),
+        'expires_at': now + RUN_RECORD_DAYS * 86400
+    })
+
+
+def release_run(table, run_id, token, sent=(), now=None):
+    """
+    Give up an unfinished or failed run so a retry can start over at once
+    sent names side effects that already happened, for the retry to skip
+    """
+    now = int(now or time.time())
+    return _held_put(table, run_id, token, {
+        'status': 'failed',
+        'sent': sorted(sent),
+        'expires_at': now + RUN_RECORD_DAYS * 86400
+    })
@@ -0,0 +1,63 @@
+import re
+
+# Approximate us-east-1 list prices; other regions differ by a few percent
+EBS_GB_MONTH = {'gp2': 0.10, 'gp3': 0.08, 'io1': 0.125, 'io2': 0.125, 'st1': 0.045, 'sc1': 0.015, 'standard': 0.05}
+DEFAULT_EBS_GB_MONTH = 0.10
+IDLE_EIP_MONTH = 3.60
+# Cost Explorer also reports pseudo-regions such as 'global' and 'NoRegion'
+REGION_PATTERN = re.compile(r'^[a-z]{2}(-[a-z]+)+-\d$')
+
+
+def find_idle_resources(ec2, account_id, region):
+    """
+    Unattached EBS volumes and unassociated Elastic IPs in one account-region
+    Returns {'volumes', 'volume_gb', 'addresses', 'monthly_cost'}
+    """
+    volumes, volume_gb, monthly_cost = 0, 0, 0.0
+    paginator = ec2.get_paginator('describe_volumes')
+    for page in paginator.paginate(Filters=[{'Name': 'status', 'Values': ['available']}]):
+        for volume in page['Volumes']:
+            volumes += 1
+            volume_gb += volume['Size']
+            monthly_cost += volume['Size'] * EBS_GB_MONTH.get(volume.get('VolumeType'), DEFAULT_EBS_GB_MONTH)
+
+    addresses = sum(1 for address in ec2.describe_addresses()['Addresses'] if 'AssociationId' not in address)
+    monthly_cost += addresses * IDLE_EIP_MONTH
+    return {'volumes': volumes, 'volume_gb': volume_gb, 'addresses': addresses, 'monthly_cost': monthly_cost}
+
+
+def scan_idle_resources(pool, analyses):
+    """
+    Business Logic: Idle-resource totals per member account
+
+    Each account is scanned in the regions where it had spend, through the
+    session pool's assumed-role clients. Returns ({account_id: totals},
+    errors); an account-region that cannot be scanned is left out.
+    """
+    targets = [(analysis['account_id'], region)
+               for analysis in analyses
+               for region in analysis['regional_costs'] if REGION_PATTERN.match(region)]
+    results, errors = pool.scan(targets, 'ec2', find_idle_resources)
+
+    idle = {}
+    for (account_id, region), found in results.items():
+        totals = idle.setdefault(account_id, {'volumes': 0, 'volume_gb': 0, 'addresses': 0, 'monthly_cost': 0.0})
+        for field, value in found.items():
+            totals[field] += value
+    for (account_id, region), error in errors.items():
+        print(f"Error scanning {account_id} in {region}: {error}")
+    return idle, errors
+
+
+def idle_recommendation(totals):
+    """Recommendation for an account's idle resources, or None when there are none"""
+    if not totals or not (totals['volumes'] or totals['addresses']):
+        return None
+    return {
+        'type': 'idle_resources',
+        'priority': 'high' if totals['monthly_cost'] >= 50 else 'medium',
+        'issue': (f"{totals['volumes']} unattached EBS volumes ({totals['volume_gb']} GiB) and "
+                  f"{totals['addresses']} unassociated Elastic IPs"),
+        'recommendation': 'Snapshot and delete unattached volumes; release unused Elastic IPs',
+        'potential_savings': f"About ${totals['monthly_cost']:.2f}/month"
+    }
@@ -0,0 +1,75 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+PIPELINE_WORKERS = int(os.environ.get('PIPELINE_WORKERS', '4'))
+
+
+def stage(name, fn, requires=(), uses=()):
+    """
+    One pipeline step: fn(inputs) runs once every dependency has finished
+    inputs maps dependency names to their outputs. A failed `requires`
+    dependency skips the stage; a failed `uses` dependency is passed as None.
+    """
+    return {'name': name, 'fn': fn, 'requires': tuple(requires), 'uses': tuple(uses)}
+
+
+def run_pipeline(stages, max_workers=PIPELINE_WORKERS):
+    """
+    Business Logic: Run a stage DAG with independent stages in parallel
+
+    A failing stage never stops stages that do not depend on it. Returns
+    (outputs, report): outputs maps stage names to return values and report
+    maps them to {'status': ok|failed|skipped, 'seconds', 'error'}.
+    """
+    by_name = {s['name']: s for s in stages}
+    for s in stages:
+        for dep in s['requires'] + s['uses']:
+            if dep not in by_name:
+                raise ValueError(f"Stage {s['name']} depends on unknown stage {dep}")
+
+    outputs = {}
+    report = {}
+    pending = dict(by_name)
+    running = {}
+
+    def timed(s, inputs):
+        started = time.perf_counter()
+        try:
+            return s['fn'](inputs), None, time.perf_counter() - started
+        except Exception as e:
+            return None, e, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            for name, s in list(pending.items()):
+                deps = s['requires'] + s['uses']
+                if any(dep not in report for dep in deps):
+                    continue
+                del pending[name]
+                failed = [dep for dep in s['requires'] if report[dep]['status'] != 'ok']
+                if failed:
+                    report[name] = {'status': 'skipped', 'seconds': 0.0,
+                                    'error': f"dependency failed: {', '.join(failed)}"}
+                    continue
+                inputs = {dep: outputs.get(dep) for dep in deps}
+                running[executor.submit(timed, s, inputs)] = name
+
+            if not running:
+                if pending:
+                    raise ValueError(f"Pipeline has a dependency cycle: {', '.join(pending)}")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                output, error, seconds = future.result()
+                if error is None:
+                    outputs[name] = output
+                    report[name] = {'status': 'ok', 'seconds': round(seconds, 3), 'error': None}
+                else:
+                    print(f"Stage {name} failed: {str(error)}")
+                    report[name] = {'status': 'failed', 'seconds': round(seconds, 3), 'error': str(error)}
+
+    print("Pipeline: " + ", ".join(f"{name}={r['status']} {r['seconds']:.2f}s" for name, r in report.items()))
+    return outputs, report
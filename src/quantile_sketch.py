@@ -0,0 +1,181 @@
+import math
+import os
+
+from dynamo_helpers import to_dynamo, from_dynamo, batch_get_items
+from cost_cube import date_range
+from rolling_stats import daily_series, estimated_dates, split_days
+
+SKETCH_TABLE = os.environ.get('COST_SKETCH_TABLE', 'cost-sketches')
+COMPRESSION = int(os.environ.get('SKETCH_COMPRESSION', '50'))
+
+
+def new_digest():
+    """Empty merging t-digest: centroids are [mean, weight] sorted by mean"""
+    return {'centroids': [], 'count': 0, 'min': None, 'max': None}
+
+
+def add_value(digest, value, weight=1):
+    digest['centroids'].append([value, weight])
+    digest['count'] += weight
+    digest['min'] = value if digest['min'] is None else min(digest['min'], value)
+    digest['max'] = value if digest['max'] is None else max(digest['max'], value)
+    if len(digest['centroids']) > 2 * COMPRESSION:
+        _compress(digest)
+
+
+def merge_digests(digests):
+    """Combine sketches from several time buckets into one"""
+    merged = new_digest()
+    for digest in digests:
+        if not digest['count']:
+            continue
+        merged['centroids'].extend([list(c) for c in digest['centroids']])
+        merged['count'] += digest['count']
+        for bound, pick in (('min', min), ('max', max)):
+            merged[bound] = digest[bound] if merged[bound] is None else pick(merged[bound], digest[bound])
+    _compress(merged)
+    return merged
+
+
+def _k(q):
+    """k1 scale function: small centroids near the tails, large in the middle"""
+    return COMPRESSION / (2 * math.pi) * math.asin(2 * q - 1)
+
+
+def _compress(digest):
+    centroids = sorted(digest['centroids'])
+    total = digest['count']
+    if not centroids or total <= 0:
+        digest['centroids'] = []
+        return
+
+    merged = [list(centroids[0])]
+    seen = 0.0
+    k_limit = _k(0.0) + 1
+    for mean, weight in centroids[1:]:
+        current = merged[-1]
+        q = (seen + current[1] + weight) / total
+        if _k(min(q, 1.0)) <= k_limit:
+            # Weighted merge into the current centroid
+            combined = current[1] + weight
+            current[0] += (mean - current[0]) * weight / combined
+            current[1] = combined
+        else:
+            seen += current[1]
+            k_limit = _k(min(seen / total, 1.0)) + 1
+            merged.append([mean, weight])
+    digest['centroids'] = merged
+
+
+def quantile(digest, q):
+    """Estimate the q-quantile (0..1) by interpolating between centroid midpoints"""
+    centroids = sorted(digest['centroids'])
+    if not centroids:
+        return 0.0
+    if len(centroids) == 1 or q <= 0:
+        return digest['min'] if q <= 0 else centroids[0][0]
+    if q >= 1:
+        return digest['max']
+
+    target = q * digest['count']
+    cumulative = 0.0
+    previous_mid, previous_mean = 0.0, digest['min']
+    for mean, weight in centroids:
+        mid = cumulative + weight / 2
+        if target < mid:
+            span = mid - previous_mid
+            fraction = (target - previous_mid) / span if span else 0.0
+            return previous_mean + fraction * (mean - previous_mean)
+        previous_mid, previous_mean = mid, mean
+        cumulative += weight
+
+    span = digest['count'] - previous_mid
+    fraction = (target - previous_mid) / span if span else 1.0
+    return previous_mean + fraction * (digest['max'] - previous_mean)
+
+
+def sketch_id(sid, month):
+    return f"{sid}#{month}"
+
+
+def update_sketches(dynamodb, rows):
+    """
+    Business Requirement: Maintain per-series, per-month daily cost sketches
+
+    One sketch item per series and month; every day of the window is
+    observed, no-spend days as zero, and each settled day is added once
+    (items remember the last folded date), so reruns are no-ops. Estimated
+    days are kept beside the digest in 'pending' and replaced on every run,
+    since a digest cannot take a value back out when a day is restated.
+    """
+    table = dynamodb.Table(SKETCH_TABLE)
+    series = zero_filled(daily_series(rows), [row['date'] for row in rows])
+    estimated = estimated_dates(rows)
+
+    wanted = {}
+    for sid, days in series.items():
+        for date in days:
+            wanted.setdefault(sketch_id(sid, date[:7]), (sid, date[:7]))
+
+    items = batch_get_items(dynamodb, table, wanted.keys())
+    sketches = {item_id: from_dynamo(item) for item_id, item in items.items()}
+
+    changed = set()
+    for sid, days in series.items():
+        settled, _ = split_days(days, estimated)
+        for date in sorted(days):
+            item_id = sketch_id(sid, date[:7])
+            sketch = sketches.setdefault(item_id, dict(new_digest(), id=item_id, last_date=None, pending={}))
+            if date not in settled or (sketch['last_date'] and date <= sketch['last_date']):
+                continue
+            add_value(sketch, days[date])
+            sketch['last_date'] = date
+            changed.add(item_id)
+
+        for month in {date[:7] for date in days}:
+            sketch = sketches[sketch_id(sid, month)]
+            _, pending = split_days(days, estimated, sketch['last_date'])
+            pending = {date: cost for date, cost in pending.items() if date[:7] == month}
+            if pending != (sketch.get('pending') or {}):
+                sketch['pending'] = pending
+                changed.add(sketch['id'])
+
+    with table.batch_writer(overwrite_by_pkeys=['id']) as batch:
+        for item_id in changed:
+            batch.put_item(Item=to_dynamo(sketches[item_id]))
+
+    print(f"Quantile sketches updated: {len(changed)}")
+
+
+def zero_filled(series, dates):
+    """Every series over every day of the window, missing days as zero spend"""
+    if not dates:
+        return series
+    window = date_range(min(dates), max(dates))
+    return {sid: {date: days.get(date, 0.0) for date in window} for sid, days in series.items()}
+
+
+def with_pending(sketch):
+    """The sketch's digest plus its estimated days"""
+    pending = sketch.get('pending') or {}
+    if not pending:
+        return sketch
+    digest = merge_digests([sketch])
+    for cost in pending.values():
+        add_value(digest, cost)
+    return digest
+
+
+def series_quantiles(dynamodb, sid, months, qs=(0.5, 0.9, 0.99)):
+    """
+    Business Intelligence: Daily cost percentiles for a series over many months
+    Reads one small item per month and merges them; no daily history is scanned
+    """
+    table = dynamodb.Table(SKETCH_TABLE)
+    items = batch_get_items(dynamodb, table, [sketch_id(sid, m) for m in months])
+    merged = merge_digests([with_pending(from_dynamo(item)) for item in items.values()])
+
+    result = {'days': merged['count']}
+    for q in qs:
+        result[f"p{int(round(q * 100))}"] = quantile(merged, q)
+    return result
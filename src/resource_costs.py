@@ -0,0 +1,136 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+from dynamo_helpers import to_dynamo, from_dynamo, batch_get_items
+from top_k import new_top_k, add, merge_summaries, top
+
+RESOURCES_TABLE = os.environ.get('COST_RESOURCES_TABLE', 'cost-resources')
+# CE keeps resource-level data for the last 14 days only
+RESOURCE_DAYS = 14
+# Days still being restated by CE are always refetched, never cached
+RESOURCE_SETTLE_DAYS = int(os.environ.get('RESOURCE_SETTLE_DAYS', '2'))
+# Counters kept per service and day; more counters = tighter error bounds
+RESOURCE_SUMMARY_SIZE = int(os.environ.get('RESOURCE_SUMMARY_SIZE', '200'))
+NO_RESOURCE = '(no resource id)'
+
+
+def iter_resource_costs(ce_client, service, start, end):
+    """Stream (date, resource_id, cost) for one service, following NextPageToken"""
+    kwargs = {
+        'TimePeriod': {'Start': start, 'End': end},
+        'Granularity': 'DAILY',
+        'Metrics': ['BlendedCost'],
+        'Filter': {'Dimensions': {'Key': 'SERVICE', 'Values': [service]}},
+        'GroupBy': [{'Type': 'DIMENSION', 'Key': 'RESOURCE_ID'}]
+    }
+    while True:
+        response = ce_client.get_cost_and_usage_with_resources(**kwargs)
+        for result in response['ResultsByTime']:
+            date = result['TimePeriod']['Start'][:10]
+            for group in result['Groups']:
+                cost = float(group['Metrics']['BlendedCost']['Amount'])
+                if cost > 0:
+                    yield date, group['Keys'][0] or NO_RESOURCE, cost
+        if not response.get('NextPageToken'):
+            return
+        kwargs['NextPageToken'] = response['NextPageToken']
+
+
+def summarize_by_day(rows, capacity=None):
+    """One bounded Space-Saving summary per day, so memory never grows with resource count"""
+    capacity = capacity or RESOURCE_SUMMARY_SIZE
+    summaries = {}
+    for date, resource_id, cost in rows:
+        summary = summaries.get(date)
+        if summary is None:
+            summary = summaries[date] = new_top_k(capacity)
+        add(summary, resource_id, cost)
+    return summaries
+
+
+def _cache_id(service, date):
+    return f"{service}#{date}"
+
+
+def _stored(service, date, summary):
+    expires = datetime.strptime(date, '%Y-%m-%d') + timedelta(days=RESOURCE_DAYS + 1)
+    return to_dynamo({
+        'id': _cache_id(service, date),
+        'capacity': summary['capacity'],
+        'counts': summary['counts'],
+        'errors': summary['errors'],
+        'total': summary['total'],
+        'expires_at': int(time.mktime(expires.timetuple()))
+    })
+
+
+def service_day_summaries(dynamodb, ce_client, service, dates, settled_before):
+    """
+    Business Logic: Per-day resource summaries for one service, cached by day
+
+    Settled days come from the cost-resources table when present. The
+    remaining days are fetched in one paginated query over their span and
+    the settled ones are stored for later requests (they expire with the
+    14-day window).
+    """
+    table = dynamodb.Table(RESOURCES_TABLE)
+    cached = batch_get_items(dynamodb, table, [_cache_id(service, d) for d in dates if d < settled_before])
+    summaries = {}
+    for date in dates:
+        item = cached.get(_cache_id(service, date))
+        if item:
+            summaries[date] = from_dynamo(item)
+
+    missing = [d for d in dates if d not in summaries]
+    if missing:
+        end = (datetime.strptime(missing[-1], '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+        fetched = summarize_by_day(iter_resource_costs(ce_client, service, missing[0], end))
+        with table.batch_writer(overwrite_by_pkeys=['id']) as batch:
+            for date in missing:
+                summary = fetched.get(date) or new_top_k(RESOURCE_SUMMARY_SIZE)
+                summaries[date] = summary
+                if date < settled_before:
+                    batch.put_item(Item=_stored(service, date, summary))
+    return summaries
+
+
+def top_resources(dynamodb, ce_client, services, days, k, today=None):
+    """
+    Top-k resources per service over the last `days` days (at most 14)
+    Returns [{'service', 'total_cost', 'resources': [...], 'other'}]
+    """
+    today = today or datetime.now().date()
+    days = min(days, RESOURCE_DAYS)
+    dates = [(today - timedelta(days=n)).strftime('%Y-%m-%d') for n in range(days, 0, -1)]
+    settled_before = (today - timedelta(days=RESOURCE_SETTLE_DAYS)).strftime('%Y-%m-%d')
+
+    results = []
+    for service in services:
+        summaries = service_day_summaries(dynamodb, ce_client, service, dates, settled_before)
+        merged = merge_summaries(summaries[d] for d in dates)
+        items, other, other_error = top(merged, k)
+        total_cost = merged['total']
+        resources = []
+        for resource_id, cost, error in items:
+            item = {
+                'resource_id': resource_id,
+                'cost': cost,
+                'percentage': (cost / total_cost * 100) if total_cost > 0 else 0
+            }
+            if error:
+                item['max_error'] = error
+            resources.append(item)
+        other_item = {
+            'cost': other,
+            'percentage': (other / total_cost * 100) if total_cost > 0 else 0
+        }
+        if other_error:
+            other_item['max_error'] = other_error
+        results.append({
+            'service': service,
+            'total_cost': total_cost,
+            'resources': resources,
+            'other': other_item
+        })
+    return results
@@ -0,0 +1,152 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from compression import compress, should_compress
+
+# Module-level state survives across warm Lambda invocations
+_cache = OrderedDict()   # least recently used first
+_refreshing = set()
+_lock = threading.Lock()
+
+SOFT_TTL = int(os.environ.get('RESPONSE_CACHE_SOFT_TTL', '300'))    # 5 min fresh
+HARD_TTL = int(os.environ.get('RESPONSE_CACHE_HARD_TTL', '3600'))   # 1 hour max staleness
+# Bodies kept per warm container; the least recently used entry is evicted
+MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '256'))
+GZIP_BODIES = os.environ.get('RESPONSE_CACHE_GZIP', 'true').lower() == 'true'
+
+# Query parameters that never change the response (dashboard cache busters)
+IGNORED_PARAMS = {'_', 'cb', 'nocache'}
+
+
+def normalize_params(query_params):
+    """
+    Lower-case, stripped parameter names and stripped values
+    Callers validate, key and build from this one dict, so '?Format=x' and
+    '?format=x' can never be read differently
+    """
+    params = {}
+    for key, value in (query_params or {}).items():
+        if value is None:
+            continue
+        params[key.strip().lower()] = str(value).strip()
+    return params
+
+
+def make_cache_key(endpoint, query_params):
+    """
+    Normalize endpoint + query parameters into a stable cache key
+    Parameter order, key case and cache-buster params do not create new entries
+    """
+    params = sorted((key, value) for key, value in normalize_params(query_params).items()
+                    if key not in IGNORED_PARAMS)
+
+    query = '&'.join(f"{k}={v}" for k, v in params)
+    return f"{endpoint}?{query}"
+
+
+def build_entry(body, data_version=None, content_type='application/json'):
+    """
+    Pre-serialize a response body (and its gzip form) for direct reuse
+    body is a JSON string or binary bytes (e.g. MessagePack; 'body' is None)
+    With data_version the ETag is weak (W/"..."): bodies that differ only in
+    volatile fields such as last_updated share it, which weak validators
+    allow and strong ones do not. Without it, the strong ETag hashes the body.
+    """
+    if isinstance(body, bytes):
+        body_bytes, body = body, None
+    else:
+        body_bytes = body.encode('utf-8')
+    encoded = {}
+    if GZIP_BODIES and should_compress(body_bytes):
+        encoded['gzip'] = compress(body_bytes, 'gzip')
+
+    if data_version is not None:
+        digest = hashlib.sha256(data_version.encode('utf-8')).hexdigest()[:32]
+        etag = f'W/"{digest}"'
+    else:
+        digest = hashlib.sha256(body_bytes).hexdigest()[:32]
+        etag = f'"{digest}"'
+    return {
+        'body': body,
+        'body_bytes': body_bytes,
+        'content_type': content_type,
+        'encoded': encoded,
+        'etag': etag,
+        'created': time.time()
+    }
+
+
+def get_encoded_body(entry, encoding):
+    """Compressed body for an entry, compressed at most once per encoding"""
+    if encoding not in entry['encoded']:
+        entry['encoded'][encoding] = compress(entry['body_bytes'], encoding)
+    return entry['encoded'][encoding]
+
+
+def get_cached_response(key, builder):
+    """
+    Business Purpose: Serve API responses without re-running aggregation
+
+    builder() returns (body, data_version, content_type): the serialized body,
+    a string identifying the underlying data for the ETag and its media type.
+    Fresh entries are
+    returned directly; entries past SOFT_TTL are still served while a
+    background thread rebuilds them; entries past HARD_TTL are rebuilt inline.
+    """
+    now = time.time()
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            _cache.move_to_end(key)
+
+    if entry is not None:
+        age = now - entry['created']
+        if age < SOFT_TTL:
+            return entry
+        if age < HARD_TTL:
+            _start_refresh(key, builder)
+            return entry
+
+    entry = build_entry(*builder())
+    _store(key, entry)
+    return entry
+
+
+def _store(key, entry):
+    with _lock:
+        _cache[key] = entry
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def _start_refresh(key, builder):
+    """Start at most one background rebuild per key"""
+    with _lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    # Lambda freezes the thread after the response is sent; an unfinished
+    # refresh resumes on the next warm invocation and the stale body keeps serving
+    thread = threading.Thread(target=_refresh, args=(key, builder), daemon=True)
+    thread.start()
+
+
+def _refresh(key, builder):
+    try:
+        _store(key, build_entry(*builder()))
+    except Exception as e:
+        # Keep serving the stale body until HARD_TTL forces an inline rebuild
+        print(f"Cache refresh error for {key}: {str(e)}")
+    finally:
+        with _lock:
+            _refreshing.discard(key)
+
+
+def clear_cache():
+    """Drop all cached responses"""
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,91 @@
+try:
+    import msgpack  # Optional: only used when bundled with the Lambda
+except ImportError:
+    msgpack = None
+
+FORMATS = ('json', 'columnar')
+ENCODINGS = ('json', 'msgpack')
+
+# Row fields kept as plain arrays; other string fields are dictionary-encoded
+PLAIN_FIELDS = {'date'}
+
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'msgpack': 'application/msgpack'
+}
+
+
+def validate_format_params(query_params):
+    """Return an error message for unsupported format/encoding, else None"""
+    fmt = query_params.get('format', 'json')
+    encoding = query_params.get('encoding', 'json')
+    if fmt not in FORMATS:
+        return f"Unsupported format '{fmt}' (expected one of: {', '.join(FORMATS)})"
+    if encoding not in ENCODINGS:
+        return f"Unsupported encoding '{encoding}' (expected one of: {', '.join(ENCODINGS)})"
+    if encoding == 'msgpack' and msgpack is None:
+        return "MessagePack encoding is not available on this deployment"
+    return None
+
+
+def to_columnar(data):
+    """
+    Business Purpose: Compact payloads for charting clients
+
+    Lists of row dicts become parallel arrays keyed by field name, so key
+    names are sent once instead of once per row. Repeated labels (service,
+    region) are dictionary-encoded as {'dictionary': [...], 'codes': [...]}.
+    Nested objects (e.g. per-metric breakdowns) are converted the same way.
+    Scalar fields are passed through unchanged.
+    """
+    result = _columnar_fields(data)
+    result['format'] = 'columnar'
+    return result
+
+
+def _columnar_fields(data):
+    result = {}
+    for key, value in data.items():
+        if isinstance(value, list) and value and all(isinstance(row, dict) for row in value):
+            result[key] = rows_to_columns(value)
+        elif isinstance(value, dict):
+            result[key] = _columnar_fields(value)
+        else:
+            result[key] = value
+    return result
+
+
+def rows_to_columns(rows):
+    fields = []
+    for row in rows:
+        for field in row:
+            if field not in fields:
+                fields.append(field)
+
+    columns = {}
+    for field in fields:
+        values = [row.get(field) for row in rows]
+        if field not in PLAIN_FIELDS and all(isinstance(v, str) for v in values):
+            columns[field] = dictionary_encode(values)
+        else:
+            columns[field] = values
+    columns['length'] = len(rows)
+    return columns
+
+
+def dictionary_encode(values):
+    """['a', 'b', 'a'] -> {'dictionary': ['a', 'b'], 'codes': [0, 1, 0]}"""
+    dictionary = []
+    index = {}
+    codes = []
+    for value in values:
+        if value not in index:
+            index[value] = len(dictionary)
+            dictionary.append(value)
+        codes.append(index[value])
+    return {'dictionary': dictionary, 'codes': codes}
+
+
+def pack_msgpack(data, default):
+    """Serialize with MessagePack; default converts Decimals like json.dumps"""
+    return msgpack.packb(data, default=default, use_bin_type=True)
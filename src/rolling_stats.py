@@ -0,0 +1,214 @@
+import copy
+import os
+from datetime import datetime, timedelta
+
+from dynamo_helpers import to_dynamo, from_dynamo, batch_get_items
+
+STATS_TABLE = os.environ.get('COST_STATS_TABLE', 'cost-stats')
+WINDOWS = (7, 30, 90)
+RING_SIZE = max(WINDOWS)
+EWMA_ALPHA = float(os.environ.get('EWMA_ALPHA', '0.3'))
+ALL = '*'
+
+
+def series_id(service=ALL, region=ALL):
+    return f"{service}#{region}"
+
+
+def new_state(sid):
+    return {
+        'id': sid,
+        'last_date': None,
+        'count': 0,
+        'ring': [0.0] * RING_SIZE,   # last RING_SIZE daily costs, indexed by count % RING_SIZE
+        'sums': {str(w): 0.0 for w in WINDOWS},
+        'ewma': None,
+        'mean': 0.0,                 # Welford mean/M2 over the RING_SIZE window
+        'm2': 0.0,
+        'pending': {}                # estimated days after last_date, replaced on every run
+    }
+
+
+def push_day(state, cost):
+    """
+    Fold one day's cost into the series state in O(1)
+    Window sums add the new day and subtract the day leaving each window;
+    Welford mean/M2 do the same for the variance window.
+    """
+    count = state['count']
+    ring = state['ring']
+
+    for w in WINDOWS:
+        leaving = ring[(count - w) % RING_SIZE] if count >= w else 0.0
+        state['sums'][str(w)] += cost - leaving
+
+    # Welford: remove the value leaving the variance window, then add the new one
+    n = min(count, RING_SIZE)
+    if count >= RING_SIZE:
+        old = ring[count % RING_SIZE]
+        if n > 1:
+            old_mean = state['mean']
+            state['mean'] = (n * old_mean - old) / (n - 1)
+            state['m2'] -= (old - old_mean) * (old - state['mean'])
+        else:
+            state['mean'], state['m2'] = 0.0, 0.0
+        n -= 1
+    n += 1
+    delta = cost - state['mean']
+    state['mean'] += delta / n
+    state['m2'] = max(state['m2'] + delta * (cost - state['mean']), 0.0)
+
+    if state['ewma'] is None:
+        state['ewma'] = cost
+    else:
+        state['ewma'] = EWMA_ALPHA * cost + (1 - EWMA_ALPHA) * state['ewma']
+
+    ring[count % RING_SIZE] = cost
+    state['count'] = count + 1
+
+
+def advance_to(state, date, cost):
+    """
+    Append a settled day, zero-filling days with no spend since last_date
+    Days already folded in are ignored, so re-running a window is a no-op
+    """
+    day = datetime.strptime(date, '%Y-%m-%d').date()
+    if state['last_date']:
+        last = datetime.strptime(state['last_date'], '%Y-%m-%d').date()
+        if day <= last:
+            return False
+        gap = (day - last).days - 1
+        for _ in range(min(gap, RING_SIZE)):
+            push_day(state, 0.0)
+    push_day(state, cost)
+    state['last_date'] = date
+    return True
+
+
+def with_pending(state, advance=advance_to):
+    """
+    Copy of a state with its estimated days folded in; the stored state
+    holds settled days only, so restated estimates never need unwinding
+    """
+    pending = state.get('pending') or {}
+    if not pending:
+        return state
+    current = copy.deepcopy(state)
+    for date in sorted(pending):
+        advance(current, date, pending[date])
+    return current
+
+
+def summarize(state):
+    """Window averages, EWMA and standard deviation for one series, including estimated days"""
+    settled_date = state['last_date']
+    estimated_days = len(state.get('pending') or {})
+    state = with_pending(state)
+    count = state['count']
+    summary = {
+        'last_date': state['last_date'],
+        'settled_date': settled_date,
+        'estimated_days': estimated_days,
+        'days': count,
+        'ewma': state['ewma'] or 0.0
+    }
+    for w in WINDOWS:
+        days = min(count, w)
+        summary[f"sum_{w}"] = state['sums'][str(w)]
+        summary[f"avg_{w}"] = state['sums'][str(w)] / days if days else 0.0
+    n = min(count, RING_SIZE)
+    summary[f"stddev_{RING_SIZE}"] = (state['m2'] / (n - 1)) ** 0.5 if n > 1 else 0.0
+    return summary
+
+
+def daily_series(rows):
+    """
+    Group ledger rows into {series_id: {date: cost}}, including
+    per-service, per-region and account-total series. Estimated rows are
+    included; estimated_dates tells them apart.
+    """
+    series = {}
+    for row in rows:
+        for service, region in ((row['service'], row['region']),
+                                (row['service'], ALL),
+                                (ALL, row['region']),
+                                (ALL, ALL)):
+            days = series.setdefault(series_id(service, region), {})
+            days[row['date']] = days.get(row['date'], 0.0) + row['cost']
+    return series
+
+
+def estimated_dates(rows):
+    """Dates Cost Explorer still marks as estimated (they may be restated)"""
+    return {row['date'] for row in rows if row.get('estimated')}
+
+
+def split_days(days, estimated, last_date=None):
+    """
+    (settled, pending) for one series: settled days are folded in once,
+    pending holds the estimated days after last_date with their latest cost
+    (zero on estimated days the series had no spend)
+    """
+    settled = {date: cost for date, cost in days.items() if date not in estimated}
+    first = min(days) if days else None
+    pending = {date: days.get(date, 0.0) for date in estimated
+               if first and date >= first and (not last_date or date > last_date)}
+    return settled, pending
+
+
+def update_states(states, series, estimated=()):
+    """
+    Apply new settled days to each series state and replace its estimated
+    days; returns ids that changed
+    """
+    changed = []
+    for sid, days in series.items():
+        state = states.get(sid) or new_state(sid)
+        states[sid] = state
+        settled, _ = split_days(days, estimated)
+
+        # Days missing from a series within the window are zero spend
+        updated = False
+        if settled:
+            first = datetime.strptime(min(settled), '%Y-%m-%d').date()
+            last = datetime.strptime(max(settled), '%Y-%m-%d').date()
+            day = first
+            while day <= last:
+                date = day.strftime('%Y-%m-%d')
+                updated = advance_to(state, date, settled.get(date, 0.0)) or updated
+                day += timedelta(days=1)
+
+        _, pending = split_days(days, estimated, state['last_date'])
+        if pending != (state.get('pending') or {}):
+            state['pending'] = pending
+            updated = True
+        if updated:
+            changed.append(sid)
+    return changed
+
+
+def update_rolling_stats(dynamodb, rows):
+    """
+    Business Requirement: Keep long-range trend statistics without rescanning history
+
+    Loads the state for every series touched by rows, folds in the new
+    settled days, replaces the estimated ones (restated on later runs) and
+    writes back only the changed states.
+    Returns {series_id: summary}.
+    """
+    table = dynamodb.Table(STATS_TABLE)
+    series = daily_series(rows)
+    states = load_states(dynamodb, table, series.keys())
+    changed = update_states(states, series, estimated_dates(rows))
+
+    with table.batch_writer(overwrite_by_pkeys=['id']) as batch:
+        for sid in changed:
+            batch.put_item(Item=to_dynamo(states[sid]))
+
+    print(f"Rolling stats updated for {len(changed)} series")
+    return {sid: summarize(state) for sid, state in states.items()}
+
+
+def load_states(dynamodb, table, ids):
+    items = batch_get_items(dynamodb, table, ids)
+    return {sid: from_dynamo(item) for sid, item in items.items()}
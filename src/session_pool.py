@@ -0,0 +1,172 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from itertools import zip_longest
+
+import boto3
+
+MEMBER_ROLE_NAME = os.environ.get('MEMBER_ROLE_NAME', 'CostDashboardReadOnly')
+ROLE_SESSION_SECONDS = int(os.environ.get('ROLE_SESSION_SECONDS', '3600'))
+# Credentials are renewed this long before they expire, so a call never
+# starts with credentials about to lapse mid-request
+REFRESH_MARGIN = timedelta(seconds=int(os.environ.get('CREDENTIAL_REFRESH_MARGIN', '300')))
+STS_CONCURRENCY = int(os.environ.get('STS_CONCURRENCY', '4'))
+SCAN_CONCURRENCY = int(os.environ.get('SCAN_CONCURRENCY', '16'))
+# A failed AssumeRole is not retried for this long, so one account without
+# the member role costs a single STS call per scan, not one per region
+ASSUME_FAILURE_BACKOFF = timedelta(seconds=int(os.environ.get('ASSUME_FAILURE_BACKOFF', '60')))
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+class SessionPool:
+    """
+    Business Logic: Reuse cross-account credentials and clients
+
+    - Assumed-role credentials are cached per account until REFRESH_MARGIN
+      before they expire; concurrent requests for the same account share
+      a single AssumeRole call
+    - Clients are cached per (account, region, service) and rebuilt only
+      when that account's credentials are renewed
+    - At most STS_CONCURRENCY AssumeRole calls are in flight at once
+    - A failed AssumeRole is remembered for ASSUME_FAILURE_BACKOFF
+    - The pool's own account uses the Lambda's credentials directly
+    """
+
+    def __init__(self, role_name=MEMBER_ROLE_NAME, sts_client=None, max_sts_calls=STS_CONCURRENCY):
+        self.role_name = role_name
+        self.sts = sts_client or boto3.client('sts')
+        self.sts_slots = threading.BoundedSemaphore(max_sts_calls)
+        self.lock = threading.Lock()
+        self.account_locks = {}
+        self.sessions = {}       # account_id -> (boto3 Session, refresh_at or None)
+        self.clients = {}        # (account_id, region, service) -> (client, session)
+        self.failures = {}       # account_id -> (error message, retry_at)
+        self.own_account = None
+        self.sts_calls = 0
+
+    def _account_lock(self, account_id):
+        with self.lock:
+            return self.account_locks.setdefault(account_id, threading.Lock())
+
+    def _fresh(self, account_id):
+        entry = self.sessions.get(account_id)
+        if not entry:
+            return None
+        session, refresh_at = entry
+        if refresh_at is None or refresh_at > _now():
+            return session
+        return None
+
+    def session(self, account_id):
+        """boto3 Session for the account, assuming the member role when needed"""
+        session = self._fresh(account_id)
+        if session:
+            return session
+
+        with self._account_lock(account_id):
+            # Another thread may have refreshed while we waited
+            session = self._fresh(account_id)
+            if session:
+                return session
+            failure = self.failures.get(account_id)
+            if failure and failure[1] > _now():
+                raise RuntimeError(f"AssumeRole into {account_id} failed recently: {failure[0]}")
+
+            if self.own_account is None:
+                with self.sts_slots:
+                    self.own_account = self.sts.get_caller_identity()['Account']
+            if account_id == self.own_account:
+                session, refresh_at = boto3.session.Session(), None
+            else:
+                with self.sts_slots:
+                    with self.lock:
+                        self.sts_calls += 1
+                    try:
+                        response = self.sts.assume_role(
+                            RoleArn=f"arn:aws:iam::{account_id}:role/{self.role_name}",
+                            RoleSessionName='cost-dashboard',
+                            DurationSeconds=ROLE_SESSION_SECONDS
+                        )
+                    except Exception as e:
+                        self.failures[account_id] = (str(e), _now() + ASSUME_FAILURE_BACKOFF)
+                        raise
+                credentials = response['Credentials']
+                session = boto3.session.Session(
+                    aws_access_key_id=credentials['AccessKeyId'],
+                    aws_secret_access_key=credentials['SecretAccessKey'],
+                    aws_session_token=credentials['SessionToken']
+                )
+                # Short sessions renew at half their remaining life instead
+                now = _now()
+                expiration = credentials['Expiration']
+                refresh_at = max(expiration - REFRESH_MARGIN, now + (expiration - now) / 2)
+
+            self.sessions[account_id] = (session, refresh_at)
+            self.failures.pop(account_id, None)
+            return session
+
+    def client(self, account_id, service, region):
+        """Cached client for (account, region, service); thread-safe to share"""
+        session = self.session(account_id)
+        key = (account_id, region, service)
+        cached = self.clients.get(key)
+        if cached and cached[1] is session:
+            return cached[0]
+
+        # Sessions are not thread-safe, so client creation is serialized
+        with self._account_lock(account_id):
+            cached = self.clients.get(key)
+            if cached and cached[1] is session:
+                return cached[0]
+            client = session.client(service, region_name=region)
+            self.clients[key] = (client, session)
+            return client
+
+    def scan(self, targets, service, fn, max_workers=SCAN_CONCURRENCY):
+        """
+        Run fn(client, account_id, region) for every (account_id, region) target
+        Returns ({(account_id, region): result}, {(account_id, region): error});
+        one account or region failing does not stop the rest
+        """
+        by_account = {}
+        for account_id, region in targets:
+            by_account.setdefault(account_id, []).append(region)
+        # Round-robin over accounts spreads the first wave across accounts,
+        # so their AssumeRole calls overlap instead of queueing
+        ordered = [(account_id, region)
+                   for wave in zip_longest(*by_account.values())
+                   for account_id, region in zip(by_account, wave) if region is not None]
+
+        results, errors = {}, {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(lambda a, r: fn(self.client(a, service, r), a, r), account_id, region):
+                    (account_id, region)
+                for account_id, region in ordered
+            }
+            for future in as_completed(futures):
+                target = futures[future]
+                try:
+                    results[target] = future.result()
+                except Exception as e:
+                    errors[target] = str(e)
+
+        print(f"Scanned {len(results)} account-regions ({len(errors)} failed, {self.sts_calls} AssumeRole calls so far)")
+        return results, errors
+
+
+# One pool per warm Lambda: credentials and clients survive across invocations
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SessionPool()
+        return _pool
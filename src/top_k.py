@@ -0,0 +1,129 @@
+import heapq
+import os
+
+# Counters kept per requested result; more counters = tighter error bounds
+CAPACITY_FACTOR = int(os.environ.get('TOP_K_CAPACITY_FACTOR', '50'))
+
+
+def new_top_k(capacity):
+    """
+    Weighted Space-Saving summary with at most `capacity` counters
+
+    counts[key] never underestimates a key's true total and overestimates it
+    by at most errors[key]. Any key whose true share exceeds
+    total / capacity is guaranteed to be tracked. quantities[key] sums a
+    companion value (e.g. usage) while the key is tracked, so it is exact
+    only for keys whose error is 0.
+    """
+    return {'capacity': capacity, 'counts': {}, 'errors': {}, 'quantities': {}, 'heap': [], 'total': 0.0}
+
+
+def add(summary, key, weight, quantity=0.0):
+    """O(log capacity) update; memory stays bounded regardless of key cardinality"""
+    counts = summary['counts']
+    # Summaries stored before quantities were tracked have none
+    quantities = summary.setdefault('quantities', {})
+    summary['total'] += weight
+
+    if key in counts:
+        counts[key] += weight
+        quantities[key] = quantities.get(key, 0.0) + quantity
+    elif len(counts) < summary['capacity']:
+        counts[key] = weight
+        summary['errors'][key] = 0.0
+        quantities[key] = quantity
+    else:
+        # Evict the smallest counter; the newcomer inherits its count as error
+        floor_count, floor_key = _pop_min(summary)
+        del counts[floor_key]
+        del summary['errors'][floor_key]
+        quantities.pop(floor_key, None)
+        counts[key] = floor_count + weight
+        summary['errors'][key] = floor_count
+        quantities[key] = quantity
+
+    heapq.heappush(summary['heap'], (counts[key], key))
+    if len(summary['heap']) > 4 * summary['capacity']:
+        # Drop stale heap entries left behind by increments
+        summary['heap'] = [(c, k) for k, c in counts.items()]
+        heapq.heapify(summary['heap'])
+
+
+def _pop_min(summary):
+    heap = summary['heap']
+    counts = summary['counts']
+    while True:
+        count, key = heapq.heappop(heap)
+        if counts.get(key) == count:
+            return count, key
+
+
+def top(summary, k):
+    """
+    Business Logic: Top-k keys plus an 'everything else' bucket
+
+    Returns (items, other, other_error): items are (key, cost, max_error)
+    sorted by cost and other is the grand total minus the reported costs,
+    so the rows add up to the total. Reported costs can be overstated by
+    their max_error, so other can be understated by up to other_error
+    (the sum of those errors); it is never overstated.
+    """
+    counts = summary['counts']
+    items = heapq.nlargest(k, counts.items(), key=lambda kv: kv[1])
+    result = [(key, cost, summary['errors'][key]) for key, cost in items]
+    # Merged counters can sum past the total (their floors overlap); other is then 0
+    other = max(summary['total'] - sum(cost for _, cost, _ in result), 0.0)
+    return result, other, sum(error for _, _, error in result)
+
+
+def top_k_stream(pairs, k):
+    """Run (key, cost) pairs from a paginated stream through Space-Saving"""
+    summary = new_top_k(max(k * CAPACITY_FACTOR, k))
+    for key, cost in pairs:
+        add(summary, key, cost)
+    return summary
+
+
+def merge_summaries(summaries, capacity=None):
+    """
+    Merge Space-Saving summaries (e.g. one per day) for use with top() or add()
+
+    Counts and errors add up. A key missing from a full summary may have had
+    up to that summary's smallest count there, so that floor is added to
+    both its count and its error; merged counts therefore still never
+    underestimate. The largest `capacity` counters are kept (default: the
+    largest input capacity).
+    """
+    summaries = list(summaries)
+    counts, errors, quantities = {}, {}, {}
+    floors, total = [], 0.0
+    for summary in summaries:
+        total += summary['total']
+        full = len(summary['counts']) >= summary['capacity']
+        floors.append(min(summary['counts'].values()) if full and summary['counts'] else 0.0)
+        for key in summary['counts']:
+            counts[key] = 0.0
+            errors[key] = 0.0
+
+    for summary, floor in zip(summaries, floors):
+        summary_quantities = summary.get('quantities', {})
+        for key in counts:
+            if key in summary['counts']:
+                counts[key] += summary['counts'][key]
+                errors[key] += summary['errors'][key]
+                quantities[key] = quantities.get(key, 0.0) + summary_quantities.get(key, 0.0)
+            else:
+                counts[key] += floor
+                errors[key] += floor
+
+    if capacity is None:
+        capacity = max((summary['capacity'] for summary in summaries), default=0)
+    kept = heapq.nlargest(capacity, counts.items(), key=lambda kv: kv[1])
+    return {
+        'capacity': capacity,
+        'counts': dict(kept),
+        'errors': {key: errors[key] for key, _ in kept},
+        'quantities': {key: quantities.get(key, 0.0) for key, _ in kept},
+        'heap': sorted((count, key) for key, count in kept),
+        'total': total
+    }
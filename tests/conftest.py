@@ -0,0 +1,109 @@
+import copy
+import re
+
+import pytest
+from botocore.exceptions import ClientError
+
+CONDITION_TOKEN = re.compile(r"attribute_not_exists\(([#\w]+)\)|[#:]\w+|\w+|[()=<>]")
+
+
+class FakeBatch:
+    def __init__(self, table):
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def put_item(self, Item):
+        self.table.put_item(Item=Item)
+
+
+class FakeTable:
+    """Just enough of a boto3 Table for the modules under test"""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = {}
+
+    def _check(self, key, kwargs):
+        """Evaluate the ConditionExpression subset the modules use (=, <, AND, OR, attribute_not_exists)"""
+        expression = kwargs.get('ConditionExpression')
+        if not expression:
+            return
+        item = self.items.get(key) or {}
+        names = kwargs.get('ExpressionAttributeNames', {})
+        values = kwargs.get('ExpressionAttributeValues', {})
+        code = []
+        for match in CONDITION_TOKEN.finditer(expression):
+            token = match.group(0)
+            if match.group(1):
+                code.append(repr(names.get(match.group(1), match.group(1)) not in item))
+            elif token.startswith('#'):
+                code.append(repr(item.get(names[token])))
+            elif token.startswith(':'):
+                code.append(repr(values[token]))
+            elif token in ('AND', 'OR'):
+                code.append(token.lower())
+            elif token == '=':
+                code.append('==')
+            elif token in ('(', ')', '<', '>'):
+                code.append(token)
+            else:
+                code.append(repr(item.get(token)))
+        try:
+            passed = eval(' '.join(code))
+        except TypeError:   # comparison with a missing attribute
+            passed = False
+        if not passed:
+            raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': expression}},
+                              'ConditionalOperation')
+
+    def put_item(self, Item, **kwargs):
+        self._check(Item['id'], kwargs)
+        old = self.items.get(Item['id'])
+        self.items[Item['id']] = copy.deepcopy(Item)
+        if kwargs.get('ReturnValues') == 'ALL_OLD' and old:
+            return {'Attributes': copy.deepcopy(old)}
+        return {}
+
+    def delete_item(self, Key, **kwargs):
+        self._check(Key['id'], kwargs)
+        self.items.pop(Key['id'], None)
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        item = self.items.get(Key['id'])
+        return {'Item': copy.deepcopy(item)} if item else {}
+
+    def batch_writer(self, **kwargs):
+        return FakeBatch(self)
+
+    def scan(self, **kwargs):
+        return {'Items': [copy.deepcopy(item) for item in self.items.values()]}
+
+
+class FakeDynamo:
+    """boto3 DynamoDB resource stand-in: Table() plus batch_get_item"""
+
+    def __init__(self):
+        self.tables = {}
+
+    def Table(self, name):
+        return self.tables.setdefault(name, FakeTable(name))
+
+    def batch_get_item(self, RequestItems):
+        responses = {}
+        assert sum(len(request['Keys']) for request in RequestItems.values()) <= 100
+        for name, request in RequestItems.items():
+            table = self.Table(name)
+            responses[name] = [copy.deepcopy(table.items[key['id']])
+                               for key in request['Keys'] if key['id'] in table.items]
+        return {'Responses': responses}
+
+
+@pytest.fixture
+def dynamodb():
+    return FakeDynamo()
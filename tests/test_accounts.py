@@ -0,0 +1,147 @@
+import threading
+from datetime import datetime
+
+import pytest
+
+import cost_analyzer
+from accounts import account_analyses
+from cost_analyzer import analyze_linked_accounts, run_outcome
+from cost_cube import COST_METRICS
+
+START, END = datetime(2024, 5, 13), datetime(2024, 5, 15)
+
+
+def group(keys, cost, metrics):
+    return {'Keys': keys, 'Metrics': {m: {'Amount': str(cost)} for m in metrics}}
+
+
+class FakeCE:
+    """Answers LINKED_ACCOUNT x SERVICE on two pages and LINKED_ACCOUNT x REGION on one"""
+
+    def __init__(self):
+        self.calls = []
+
+    def get_cost_and_usage(self, **kwargs):
+        self.calls.append(kwargs)
+        second = [g['Key'] for g in kwargs['GroupBy']][1]
+        metrics = kwargs['Metrics']
+        if second == 'REGION':
+            return {'ResultsByTime': [
+                {'TimePeriod': {'Start': '2024-05-13'}, 'Groups': [
+                    group(['111', 'eu-west-1'], 10.0, metrics), group(['222', 'us-east-1'], 2.0, metrics)]},
+                {'TimePeriod': {'Start': '2024-05-14'}, 'Groups': [
+                    group(['111', 'us-east-1'], 4.0, metrics)]}
+            ]}
+        if 'NextPageToken' not in kwargs:
+            return {'NextPageToken': 'page-2', 'ResultsByTime': [
+                {'TimePeriod': {'Start': '2024-05-13'}, 'Groups': [
+                    group(['111', 'AmazonEC2'], 8.0, metrics), group(['111', 'AmazonS3'], 2.0, metrics),
+                    group(['222', 'AmazonS3'], 2.0, metrics)]}
+            ]}
+        return {'ResultsByTime': [
+            {'TimePeriod': {'Start': '2024-05-14'}, 'Groups': [
+                group(['111', 'AmazonEC2'], 4.0, metrics), group(['333', 'AmazonS3'], 0.0, metrics)]}
+        ]}
+
+
+class FakeSNS:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.published = []
+        self.messages = {}
+        self.lock = threading.Lock()
+
+    def publish(self, **kwargs):
+        account_id = kwargs['MessageAttributes']['account_id']['StringValue']
+        if account_id in self.failing:
+            raise RuntimeError('SNS throttled')
+        with self.lock:
+            self.published.append(account_id)
+            self.messages[account_id] = kwargs['Message']
+
+
+@pytest.fixture
+def linked(monkeypatch):
+    monkeypatch.setenv('SNS_TOPIC_ARN', 'arn:aws:sns:us-east-1:111:reports')
+    monkeypatch.setattr(cost_analyzer.boto3, 'client', lambda service, **kwargs: None)
+    monkeypatch.setattr(cost_analyzer, 'account_names', lambda org_client: {'111': 'prod'})
+    monkeypatch.setattr(cost_analyzer, 'ANALYZE_LINKED_ACCOUNTS', True)
+
+
+def test_account_analyses_splits_both_queries_per_account():
+    ce = FakeCE()
+    analyses = account_analyses(ce, START, END, {'111': 'prod'})
+
+    assert len(ce.calls) == 3
+    assert ce.calls[0]['Metrics'] == COST_METRICS
+    prod = analyses['111']
+    assert prod['account_name'] == 'prod'
+    assert prod['total_cost'] == 14.0
+    assert prod['service_costs'] == {'AmazonEC2': 12.0, 'AmazonS3': 2.0}
+    assert prod['daily_costs'] == {'2024-05-13': 10.0, '2024-05-14': 4.0}
+    assert prod['regional_costs'] == {'eu-west-1': 10.0, 'us-east-1': 4.0}
+    assert prod['top_service'] == ('AmazonEC2', 12.0)
+    assert prod['top_region'] == ('eu-west-1', 10.0)
+    assert prod['metric_totals']['amortized_cost'] == 14.0
+    # Accounts without a name show their id
+    assert analyses['222']['account_name'] == '222'
+    assert analyses['333']['total_cost'] == 0.0
+
+
+def test_linked_accounts_report_every_account_with_spend(linked):
+    sns = FakeSNS()
+    result = analyze_linked_accounts(FakeCE(), sns, START, END)
+
+    assert sorted(sns.published) == ['111', '222']
+    assert result == {'accounts': 3, 'reported': ['111', '222'], 'already_reported': 0, 'failed': [],
+                      'idle_scan_errors': 0}
+
+
+def test_reports_list_idle_resources_from_member_accounts(linked, monkeypatch):
+    class Pool:
+        def scan(self, targets, service, fn):
+            assert service == 'ec2'
+            self.targets = sorted(targets)
+            return {('111', 'eu-west-1'): {'volumes': 2, 'volume_gb': 500, 'addresses': 1, 'monthly_cost': 53.6}}, {}
+
+    pool = Pool()
+    monkeypatch.setattr(cost_analyzer, 'SCAN_IDLE_RESOURCES', True)
+    monkeypatch.setattr(cost_analyzer, 'get_pool', lambda: pool)
+    sns = FakeSNS()
+    analyze_linked_accounts(FakeCE(), sns, START, END)
+
+    assert pool.targets == [('111', 'eu-west-1'), ('111', 'us-east-1'), ('222', 'us-east-1')]
+    assert '[HIGH] Idle_Resources' in sns.messages['111']
+    assert '2 unattached EBS volumes (500 GiB)' in sns.messages['111']
+    assert 'Idle_Resources' not in sns.messages['222']
+
+
+def test_failed_account_is_retried_alone(linked):
+    sns = FakeSNS(failing={'222'})
+    first = analyze_linked_accounts(FakeCE(), sns, START, END)
+    assert first['reported'] == ['111'] and first['failed'] == ['222']
+
+    failed, sent = run_outcome({'report': {'status': 'ok'}, 'accounts': {'status': 'ok'}}, {'accounts': first})
+    assert failed == ['accounts']
+    assert sent == ['account#111', 'report']
+
+    # The retry's accounts stage sends only the account that failed
+    sns.failing.clear()
+    accounts = next(s for s in cost_analyzer.analysis_stages(FakeCE(), sns, START, END, 'run-1', sent=sent)
+                    if s['name'] == 'accounts')
+    retry = accounts['fn']({})
+    assert sns.published == ['111', '222']
+    assert retry == {'accounts': 3, 'reported': ['222'], 'already_reported': 1, 'failed': [],
+                     'idle_scan_errors': 0}
+
+    failed, sent = run_outcome({'report': {'status': 'ok'}, 'accounts': {'status': 'ok'}},
+                               {'accounts': retry}, sent)
+    assert failed == []
+    assert sent == ['account#111', 'account#222', 'accounts', 'report']
+
+
+def test_stage_errors_are_failed_and_not_sent():
+    failed, sent = run_outcome({'report': {'status': 'failed'}, 'accounts': {'status': 'ok'}},
+                               {'accounts': {'reported': ['111'], 'failed': []}})
+    assert failed == ['report']
+    assert sent == ['account#111', 'accounts']
@@ -0,0 +1,110 @@
+import alert_state
+from alert_state import ALERT_STATE_TABLE, COOLDOWN_SECONDS, observe, reconcile_alerts, record_notified
+
+NOW = 1_700_000_000
+
+
+def check(value, subject='team-data', kind='budget', threshold=10.0):
+    return observe(kind, subject, value, threshold)
+
+
+def run(dynamodb, value, now=NOW, publish=True, **kwargs):
+    notify = reconcile_alerts(dynamodb, [check(value)], now=now, **kwargs)
+    if publish:
+        record_notified(dynamodb, notify, now=now)
+    return [n['reason'] for n in notify]
+
+
+def stored(dynamodb, subject='team-data', kind='budget'):
+    return dynamodb.Table(ALERT_STATE_TABLE).items[check(0, subject, kind)['id']]
+
+
+def test_new_alert_is_notified_once(dynamodb):
+    assert run(dynamodb, 12.0) == ['new']
+    version = stored(dynamodb)['version']
+
+    assert run(dynamodb, 12.0, NOW + 3600) == []
+    # Nothing changed: no write either
+    assert stored(dynamodb)['version'] == version
+    assert stored(dynamodb)['notified_level'] == 1
+
+
+def test_only_a_higher_severity_is_resent(dynamodb):
+    run(dynamodb, 12.0)
+
+    assert run(dynamodb, 14.0, NOW + 60) == []
+    assert run(dynamodb, 21.0, NOW + 120) == ['escalated']
+    assert run(dynamodb, 19.0, NOW + 180) == []
+
+
+def test_failed_publish_is_sent_again(dynamodb):
+    assert run(dynamodb, 12.0, publish=False) == ['new']
+    assert stored(dynamodb)['notified_level'] == 0
+
+    assert run(dynamodb, 12.0, NOW + 3600) == ['new']
+    assert run(dynamodb, 12.0, NOW + 7200) == []
+
+
+def test_failed_escalation_is_sent_again(dynamodb):
+    run(dynamodb, 12.0)
+    assert run(dynamodb, 21.0, NOW + 60, publish=False) == ['escalated']
+    assert run(dynamodb, 21.0, NOW + 120) == ['escalated']
+
+
+def test_resolves_below_the_hysteresis_band(dynamodb):
+    run(dynamodb, 12.0)
+
+    assert run(dynamodb, 9.5, NOW + 60) == []
+    assert stored(dynamodb)['firing']
+    run(dynamodb, 8.5, NOW + 120)
+    assert not stored(dynamodb)['firing']
+    assert stored(dynamodb)['resolved_at'] == NOW + 120
+
+
+def test_flapping_inside_the_cooldown_is_not_resent(dynamodb):
+    run(dynamodb, 12.0)
+    run(dynamodb, 5.0, NOW + 60)
+
+    assert run(dynamodb, 12.0, NOW + 120) == []
+    assert stored(dynamodb)['firing']
+    # Worse than what was notified: sent despite the cooldown
+    assert run(dynamodb, 21.0, NOW + 180) == ['escalated']
+
+    run(dynamodb, 5.0, NOW + 240)
+    # The cooldown runs from the last notification
+    assert run(dynamodb, 12.0, NOW + 180 + COOLDOWN_SECONDS) == ['new']
+
+
+def test_alerts_without_a_check_are_resolved_for_checked_kinds(dynamodb):
+    reconcile_alerts(dynamodb, [check(12.0, 'deleted-budget'), check(30.0, 'account', 'daily_total')], now=NOW)
+
+    reconcile_alerts(dynamodb, [], kinds=['daily_total'], now=NOW + 60)
+    assert stored(dynamodb, 'deleted-budget')['firing']
+    assert not stored(dynamodb, 'account', 'daily_total')['firing']
+
+    reconcile_alerts(dynamodb, [], kinds=['budget'], now=NOW + 120)
+    assert not stored(dynamodb, 'deleted-budget')['firing']
+
+
+def test_losing_the_version_race_does_not_notify(dynamodb, monkeypatch):
+    run(dynamodb, 12.0)
+    table = dynamodb.Table(ALERT_STATE_TABLE)
+    read = alert_state.batch_get_items
+
+    def read_then_lose_race(*args):
+        items = read(*args)
+        for item in table.items.values():
+            item['version'] += 1      # another run wrote after our read
+        return items
+
+    monkeypatch.setattr(alert_state, 'batch_get_items', read_then_lose_race)
+    assert run(dynamodb, 21.0, NOW + 60) == []
+
+
+def test_recording_after_a_newer_write_leaves_it(dynamodb):
+    notify = reconcile_alerts(dynamodb, [check(12.0)], now=NOW)
+    stored(dynamodb)['version'] += 1
+
+    record_notified(dynamodb, notify, now=NOW)
+
+    assert stored(dynamodb)['notified_level'] == 0
@@ -0,0 +1,69 @@
+from datetime import date, timedelta
+
+import pytest
+
+import anomaly_detection
+from anomaly_detection import detect_anomalies, usage_type_region
+from cost_cube import build_cube
+
+
+@pytest.fixture(params=['python', 'numpy'])
+def scoring(request, monkeypatch):
+    if request.param == 'python':
+        monkeypatch.setattr(anomaly_detection, 'np', None)
+    else:
+        monkeypatch.setattr(anomaly_detection, 'np', pytest.importorskip('numpy'))
+    return request.param
+
+
+def cube(costs, usage_type='EUW1-BoxUsage:m5.large'):
+    """One series with costs[n] on day n; the last day is scored"""
+    start = date(2024, 5, 1)
+    rows = [{'date': (start + timedelta(days=n)).strftime('%Y-%m-%d'), 'service': 'Amazon EC2',
+             'usage_type': usage_type, 'cost': cost} for n, cost in enumerate(costs)]
+    return build_cube(rows, ['service', 'usage_type'])
+
+
+@pytest.mark.parametrize('usage_type, region', [
+    ('EUW1-BoxUsage:t3.micro', 'eu-west-1'),
+    ('APS3-TimedStorage-ByteHrs', 'ap-south-1'),
+    ('BoxUsage:t3.micro', 'us-east-1'),
+    ('DataTransfer-Out-Bytes', 'us-east-1'),
+    ('USE1-EUW1-AWS-Out-Bytes', 'us-east-1'),
+    ('EU-DataTransfer-Out-Bytes', 'Global'),
+])
+def test_usage_type_region(usage_type, region):
+    assert usage_type_region(usage_type) == region
+
+
+def test_anomalies_carry_the_derived_region():
+    start = date(2024, 5, 1)
+    rows = []
+    for n in range(36):
+        day = (start + timedelta(days=n)).strftime('%Y-%m-%d')
+        rows.append({'date': day, 'service': 'Amazon EC2', 'usage_type': 'EUW1-BoxUsage:m5.large',
+                     'cost': 100.0 if n == 35 else 10.0})
+    anomalies = detect_anomalies(build_cube(rows, ['service', 'usage_type']))
+
+    assert len(anomalies) == 1
+    assert anomalies[0]['region'] == 'eu-west-1'
+    assert anomalies[0]['kind'] == 'recurring'
+
+
+def test_first_charge_on_a_silent_series_is_one_time(scoring):
+    anomalies = detect_anomalies(cube([0.0] * 35 + [12.0], 'Global-Registration'))
+
+    assert [(a['kind'], a['cost']) for a in anomalies] == [('one_time', 12.0)]
+
+
+def test_spend_continuing_from_yesterday_is_new_recurring(scoring):
+    anomalies = detect_anomalies(cube([0.0] * 34 + [8.0, 9.0]))
+
+    assert [a['kind'] for a in anomalies] == ['new_recurring']
+
+
+def test_flat_history_scales_by_the_baseline_floor(scoring):
+    # MAD is 0: the scale falls back to 10% of the baseline ($1), so the
+    # threshold of 3.5 is crossed at exactly $13.50
+    assert [a['score'] for a in detect_anomalies(cube([10.0] * 35 + [13.5]))] == [3.5]
+    assert detect_anomalies(cube([10.0] * 35 + [13.4])) == []
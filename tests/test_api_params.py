@@ -0,0 +1,148 @@
+import json
+
+import pytest
+
+import cost_api_fixed
+from response_cache import clear_cache
+
+
+def metrics(cost):
+    return {name: {'Amount': str(cost)} for name in cost_api_fixed.COST_METRICS}
+
+
+class FakeCE:
+    def __init__(self):
+        self.calls = []
+
+    def get_cost_and_usage(self, **kwargs):
+        self.calls.append(kwargs)
+        if 'GroupBy' in kwargs:
+            groups = [{'Keys': [f"key{i}"], 'Metrics': metrics(i + 1)} for i in range(20)]
+            return {'ResultsByTime': [{'TimePeriod': {'Start': '2024-01-01'}, 'Groups': groups}]}
+        return {'ResultsByTime': [{'TimePeriod': {'Start': f"2024-01-{d:02d}"}, 'Total': metrics(d)}
+                                  for d in range(1, 31)]}
+
+
+@pytest.fixture
+def ce(monkeypatch):
+    clear_cache()
+    cost_api_fixed._fetches.clear()
+    fake = FakeCE()
+    monkeypatch.setattr(cost_api_fixed.boto3, 'client', lambda service, **kwargs: fake)
+    return fake
+
+
+def call(endpoint, params):
+    event = {'pathParameters': {'endpoint': endpoint}, 'queryStringParameters': params}
+    return cost_api_fixed.lambda_handler(event, None)
+
+
+def test_params_an_endpoint_ignores_do_not_create_cache_entries(ce):
+    first = call('services', {'top': '5'})
+    second = call('services', {'top': '5', 'utm_source': 'mail', 'days': '30'})
+
+    assert first['statusCode'] == second['statusCode'] == 200
+    assert first['headers']['ETag'] == second['headers']['ETag']
+    assert len(ce.calls) == 1
+
+
+def test_etag_is_weak_and_revalidates(ce):
+    first = call('weekly', {})
+    etag = first['headers']['ETag']
+    assert etag.startswith('W/"')
+
+    event = {'pathParameters': {'endpoint': 'weekly'}, 'queryStringParameters': {},
+             'headers': {'If-None-Match': etag}}
+    assert cost_api_fixed.lambda_handler(event, None)['statusCode'] == 304
+    # A client that drops the weak prefix still matches under weak comparison
+    event['headers']['If-None-Match'] = etag[2:]
+    assert cost_api_fixed.lambda_handler(event, None)['statusCode'] == 304
+
+
+def test_param_names_are_normalized_before_building(ce):
+    mixed = call('weekly', {' Format ': 'columnar'})
+    plain = call('weekly', {'format': 'columnar'})
+
+    assert json.loads(mixed['body'])['format'] == 'columnar'
+    assert json.loads(plain['body']) == json.loads(mixed['body'])
+
+
+def test_invalid_mixed_case_param_is_rejected(ce):
+    response = call('weekly', {'FORMAT': 'xml'})
+    assert response['statusCode'] == 400
+
+
+def test_series_params_are_read_after_normalization(ce):
+    response = call('weekly', {'Days': '30', 'MAX_POINTS ': '10'})
+    body = json.loads(response['body'])
+
+    assert len(body['daily_breakdown']) == 10
+    assert body['downsampled_from'] == 30
+    assert ce.calls[0]['TimePeriod']['Start'] != ce.calls[0]['TimePeriod']['End']
+    # Same normalized parameters: served from the cache
+    assert json.loads(call('weekly', {'days': '30', 'max_points': '10'})['body']) == body
+    assert len(ce.calls) == 1
+
+
+def test_series_param_limits_apply_to_mixed_case_names(ce):
+    response = call('weekly', {'Granularity': 'HOURLY', 'DAYS': '30'})
+    assert response['statusCode'] == 400
+
+
+def test_breakdown_top_is_read_after_normalization(ce):
+    body = json.loads(call('services', {'Top': '5'})['body'])
+
+    assert [s['service'] for s in body['services']] == ['key19', 'key18', 'key17', 'key16', 'key15']
+    assert sum(s['cost'] for s in body['services']) + body['other']['cost'] == pytest.approx(body['total_cost'])
+    # Exact counts: no error bound on the other bucket
+    assert 'max_error' not in body['other']
+    assert json.loads(call('services', {'top': '5'})['body']) == body
+    assert len(ce.calls) == 1
+
+
+def test_drilldown_without_a_mounted_store_is_503(ce, monkeypatch, tmp_path):
+    monkeypatch.setattr(cost_api_fixed, 'COST_STORE_DIR', str(tmp_path / 'missing'))
+
+    response = call('drilldown', {'group_by': 'service'})
+
+    assert response['statusCode'] == 503
+    assert 'COST_STORE_DIR' in json.loads(response['body'])['error']
+    assert ce.calls == []
+
+
+def test_every_metric_comes_back_in_one_response(ce):
+    services = json.loads(call('services', {})['body'])
+    weekly = json.loads(call('weekly', {})['body'])
+
+    assert set(services['metrics']) == set(cost_api_fixed.METRICS)
+    assert services['metrics']['blended']['services'] == services['services']
+    assert all(set(cost_api_fixed.METRICS) <= set(row) for row in weekly['daily_breakdown'])
+    assert weekly['metrics']['amortized']['weekly_total'] == pytest.approx(
+        sum(row['amortized'] for row in weekly['daily_breakdown']))
+    # The dashboard switches metric from these; asking for one is served by the same fetches
+    assert json.loads(call('services', {'metric': 'amortized'})['body'])['services'] == \
+        services['metrics']['amortized']['services']
+    assert len(ce.calls) == 2
+
+
+def test_unit_cost_uses_usage_from_the_same_record(ce):
+    body = json.loads(call('usage-types', {'top': '3'})['body'])
+
+    assert [(u['usage_quantity'], u['unit_cost']) for u in body['usage_types']] == \
+        [(20.0, 1.0), (19.0, 1.0), (18.0, 1.0)]
+
+
+def test_unit_cost_is_omitted_for_keys_with_an_error_bound(ce, monkeypatch):
+    monkeypatch.setattr(cost_api_fixed, 'CAPACITY_FACTOR', 1)
+
+    body = json.loads(call('usage-types', {'top': '2'})['body'])
+
+    assert all(u['max_error'] for u in body['usage_types'])
+    assert not any('unit_cost' in u or 'usage_quantity' in u for u in body['usage_types'])
+
+
+def test_columnar_format_converts_per_metric_breakdowns(ce):
+    body = json.loads(call('services', {'format': 'columnar', 'top': '3'})['body'])
+
+    assert body['metrics']['unblended']['services']['length'] == 3
+    assert body['metrics']['unblended']['services']['service']['dictionary'] == ['key19', 'key18', 'key17']
@@ -0,0 +1,87 @@
+from budgets import BUDGETS_TABLE, compile_budgets, evaluate_budgets, evaluate_cells, update_window_spend
+
+FIELDS = ['service', 'region', 'tag:Team']
+
+CELLS = [
+    {'service': 'AmazonEC2', 'region': 'eu-west-1', 'tag:Team': 'data', 'cost': 10.0},
+    {'service': 'AmazonEC2', 'region': 'us-east-1', 'tag:Team': 'web', 'cost': 5.0},
+    {'service': 'AmazonS3', 'region': 'eu-west-1', 'tag:Team': 'data', 'cost': 2.0},
+]
+
+
+def budget(budget_id, filters=None, limit=10, window='daily'):
+    return {'id': budget_id, 'name': budget_id, 'limit': limit, 'window': window, 'filters': filters or {}}
+
+
+def spend_by_id(budgets):
+    index = compile_budgets(budgets, FIELDS)
+    return dict(zip((b['id'] for b in index['budgets']), evaluate_cells(index, CELLS)))
+
+
+def test_unfiltered_dimensions_match_everything():
+    assert spend_by_id([
+        budget('all'),
+        budget('ec2', {'service': ['AmazonEC2']}),
+        budget('empty-filter', {'service': ['AmazonEC2'], 'region': []}),
+    ]) == {'all': 17.0, 'ec2': 15.0, 'empty-filter': 15.0}
+
+
+def test_every_constrained_dimension_must_match():
+    assert spend_by_id([
+        budget('ec2-eu', {'service': ['AmazonEC2'], 'region': ['eu-west-1']}),
+        budget('data-eu', {'region': ['eu-west-1'], 'tag:Team': ['data']}),
+        budget('s3-web', {'service': ['AmazonS3'], 'tag:Team': ['web']}),
+        budget('any-of', {'service': ['AmazonEC2', 'AmazonS3'], 'tag:Team': ['data']}),
+    ]) == {'ec2-eu': 10.0, 'data-eu': 12.0, 's3-web': 0.0, 'any-of': 12.0}
+
+
+def test_one_cell_counts_toward_every_budget_it_matches():
+    spend = spend_by_id([
+        budget('team-data', {'tag:Team': ['data']}),
+        budget('eu', {'region': ['eu-west-1']}),
+        budget('ec2-data', {'service': ['AmazonEC2'], 'tag:Team': ['data']}),
+    ])
+    # The EC2 / eu-west-1 / data cell lands in all three
+    assert spend == {'team-data': 12.0, 'eu': 12.0, 'ec2-data': 10.0}
+
+
+def test_unknown_dimensions_and_windows_are_unsupported():
+    index = compile_budgets([budget('acct', {'account': ['111']}), budget('yearly', window='yearly'),
+                             budget('ok')], FIELDS)
+
+    assert [b['id'] for b in index['budgets']] == ['ok']
+    assert [b['id'] for b in index['unsupported']] == ['acct', 'yearly']
+
+
+def test_windows_roll_over_at_week_and_month_boundaries():
+    state = {'id': 'b'}
+    # Sunday 2024-03-31 ends ISO week 13 and March
+    for date, cost in (('2024-03-30', 4.0), ('2024-03-31', 6.0)):
+        update_window_spend(state, date, cost)
+    assert (state['daily'], state['weekly'], state['mtd']) == (6.0, 10.0, 10.0)
+
+    update_window_spend(state, '2024-04-01', 3.0)
+    assert (state['week'], state['weekly'], state['month'], state['mtd']) == ('2024-W14', 3.0, '2024-04', 3.0)
+
+    # The rest of week 14 adds to both windows
+    for date in ('2024-04-02', '2024-04-03', '2024-04-04', '2024-04-05', '2024-04-06', '2024-04-07'):
+        update_window_spend(state, date, 1.0)
+    assert (state['weekly'], state['mtd']) == (9.0, 9.0)
+
+
+def test_rerunning_a_folded_day_does_not_double_count():
+    state = {'id': 'b'}
+    assert update_window_spend(state, '2024-05-14', 5.0)
+    assert not update_window_spend(state, '2024-05-14', 5.0)
+    assert not update_window_spend(state, '2024-05-13', 5.0)
+    assert state['mtd'] == 5.0
+
+
+def test_evaluate_budgets_persists_window_spend(dynamodb):
+    table = dynamodb.Table(BUDGETS_TABLE)
+    table.items['ec2'] = budget('ec2', {'service': ['AmazonEC2']}, limit=20, window='mtd')
+
+    first = evaluate_budgets(dynamodb, '2024-05-13', CELLS, FIELDS)
+    second = evaluate_budgets(dynamodb, '2024-05-14', CELLS, FIELDS)
+
+    assert [(r['spend'], r['breached']) for r in first + second] == [(15.0, False), (30.0, True)]
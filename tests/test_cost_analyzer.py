@@ -0,0 +1,31 @@
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeSerializer
+
+from cost_analyzer import analyze_costs, store_cost_data
+from cost_cube import COST_METRICS
+
+
+def ce_response():
+    def group(service, region, cost):
+        return {'Keys': [service, region], 'Metrics': {m: {'Amount': str(cost)} for m in COST_METRICS}}
+
+    return {'ResultsByTime': [
+        {'TimePeriod': {'Start': '2024-05-13'}, 'Groups': [group('AmazonEC2', 'eu-west-1', 12.5),
+                                                           group('AmazonS3', 'us-east-1', 1.25)]},
+        {'TimePeriod': {'Start': '2024-05-14'}, 'Groups': [group('AmazonEC2', 'eu-west-1', 13.0)]}
+    ]}
+
+
+def test_stores_a_real_analysis(dynamodb, monkeypatch):
+    monkeypatch.delenv('DYNAMODB_TABLE', raising=False)
+    analysis = analyze_costs(ce_response())
+    assert analysis['top_service'] == ('AmazonEC2', 25.5)
+
+    store_cost_data(dynamodb, analysis, 'run-1')
+
+    item = dynamodb.Table('cost-analysis').items['run-1']
+    # The same conversion boto3 applies on put_item: raises on floats and tuples
+    serialized = TypeSerializer().serialize(item)
+    assert serialized['M']['top_service'] == {'L': [{'S': 'AmazonEC2'}, {'N': '25.5'}]}
+    assert item['top_region'] == ['eu-west-1', Decimal('25.5')]
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+import cost_api_fixed
+
+from cost_compare import compare_periods, parse_period
+from cost_rollups import MemoryRollupStore, local_stream_record, process_records
+
+
+def row(date, service, region, cost):
+    return {'id': f"{date}#{service}#{region}", 'date': date, 'service': service, 'region': region, 'cost': cost}
+
+
+def test_parse_period_uses_the_fewest_rollups():
+    assert parse_period('2024-05-01:2024-06-12') == [
+        ('month', '2024-05'), ('day', '2024-06-01'), ('day', '2024-06-02'),
+        ('week', '2024-W23'), ('day', '2024-06-10'), ('day', '2024-06-11'), ('day', '2024-06-12')
+    ]
+    with pytest.raises(ValueError):
+        parse_period('last month')
+
+
+@pytest.mark.parametrize('spec', ['2024-13', '2024-00', '2024-W60', '2024-W00', '2023-W53', '2024-Q5',
+                                  '2024-02-30', '2024-05-01:2024-05-32'])
+def test_parse_period_rejects_periods_that_do_not_exist(spec):
+    with pytest.raises(ValueError):
+        parse_period(spec)
+
+
+def test_parse_period_accepts_the_last_iso_week_of_a_long_year():
+    assert parse_period('2020-W53') == [('week', '2020-W53')]
+
+
+def test_compare_with_a_nonexistent_period_is_a_bad_request():
+    response = cost_api_fixed.lambda_handler(
+        {'pathParameters': {'endpoint': 'compare'}, 'queryStringParameters': {'a': '2024-13', 'b': '2024-05'}}, None)
+
+    assert response['statusCode'] == 400
+    assert '2024-13' in json.loads(response['body'])['error']
+
+
+def test_zeroed_cells_count_as_disappeared():
+    store = MemoryRollupStore()
+    s3 = row('2024-06-03', 'AmazonS3', 'us-east-1', 5.0)
+    process_records([
+        local_stream_record(1, new_row=row('2024-05-03', 'AmazonEC2', 'eu-west-1', 10.0)),
+        local_stream_record(2, new_row=row('2024-05-04', 'AmazonS3', 'us-east-1', 3.0)),
+        local_stream_record(3, new_row=row('2024-06-03', 'AmazonEC2', 'eu-west-1', 12.0)),
+        local_stream_record(4, new_row=row('2024-06-04', 'AWSLambda', 'eu-west-1', 2.0)),
+        # S3 spend in June was recorded and then removed again
+        local_stream_record(5, new_row=s3),
+        local_stream_record(6, old_row=s3)
+    ], store)
+
+    result = compare_periods(store, '2024-05', '2024-06')
+
+    assert result['delta'] == pytest.approx(1.0)
+    assert result['new_items'] == [{'service': 'AWSLambda', 'region': 'eu-west-1', 'cost': 2.0}]
+    assert result['disappeared_items'] == [{'service': 'AmazonS3', 'region': 'us-east-1', 'cost': 3.0}]
+    services = {r['service']: r['status'] for r in result['services']}
+    assert services == {'AmazonEC2': 'changed', 'AmazonS3': 'disappeared', 'AWSLambda': 'new'}
+    regions = {r['region']: r['status'] for r in result['regions']}
+    assert regions == {'eu-west-1': 'changed', 'us-east-1': 'disappeared'}
@@ -0,0 +1,58 @@
+from cost_explain import EP_THRESHOLD, explain_change
+
+FIELDS = ['service', 'region']
+
+
+def row(service, region, cost):
+    return {'service': service, 'region': region, 'cost': cost}
+
+
+def baseline():
+    return [row('EC2', 'us-east-1', 100.0), row('EC2', 'eu-west-1', 100.0), row('EC2', 'ap-south-1', 100.0),
+            row('S3', 'us-east-1', 100.0), row('RDS', 'eu-west-1', 100.0)]
+
+
+def test_single_cell_driver():
+    rows_b = baseline()
+    rows_b[3] = row('S3', 'us-east-1', 250.0)
+
+    result = explain_change(baseline(), rows_b, FIELDS)
+
+    assert result['delta'] == 150.0
+    assert result['cells'] == [{'filter': {'service': 'S3'}, 'a': 100.0, 'b': 250.0, 'delta': 150.0, 'share': 1.0}]
+
+
+def test_drills_into_the_region_of_a_spread_service():
+    rows_b = baseline()
+    rows_b[1] = row('EC2', 'eu-west-1', 300.0)
+
+    result = explain_change(baseline(), rows_b, FIELDS)
+
+    assert result['cells'] == [{'filter': {'service': 'EC2', 'region': 'eu-west-1'},
+                                'a': 100.0, 'b': 300.0, 'delta': 200.0, 'share': 1.0}]
+
+
+def test_one_level_stops_at_the_first_dimension():
+    rows_b = baseline()
+    rows_b[1] = row('EC2', 'eu-west-1', 300.0)
+
+    cells = explain_change(baseline(), rows_b, FIELDS, depth=1)['cells']
+
+    assert [len(c['filter']) for c in cells] == [1]
+
+
+def test_no_change_has_no_cells():
+    result = explain_change(baseline(), baseline(), FIELDS)
+
+    assert result['delta'] == 0
+    assert result['cells'] == []
+
+
+def test_empty_periods():
+    assert explain_change([], [], FIELDS) == {'total_a': 0, 'total_b': 0, 'delta': 0, 'cells': []}
+
+    # Everything is new: the largest new cells explain the jump
+    result = explain_change([], baseline(), FIELDS)
+    assert result['total_b'] == 500.0
+    assert all(c['a'] == 0 for c in result['cells'])
+    assert sum(c['share'] for c in result['cells']) >= EP_THRESHOLD
@@ -0,0 +1,98 @@
+from datetime import date, timedelta
+
+import pytest
+
+import cost_api_fixed
+from cost_forecast import FORECAST_TABLE, advance_to, month_end_projection, new_state, update_forecasts
+from dynamo_helpers import from_dynamo, to_dynamo
+from rolling_stats import ALL, series_id
+
+TOTAL = series_id(ALL, ALL)
+
+
+def days(start, n):
+    first = date.fromisoformat(start)
+    return [(first + timedelta(days=i)).isoformat() for i in range(n)]
+
+
+def rows(costs, service='AmazonEC2', estimated=()):
+    return [{'date': d, 'service': service, 'region': 'eu-west-1', 'cost': cost, 'estimated': d in estimated}
+            for d, cost in costs.items()]
+
+
+def stored(dynamodb, sid):
+    return from_dynamo(dynamodb.Table(FORECAST_TABLE).items[sid])
+
+
+def test_advance_to_zero_fills_gaps_and_ignores_seen_days():
+    state = new_state(TOTAL)
+    assert advance_to(state, '2024-05-01', 10.0)
+    assert advance_to(state, '2024-05-04', 7.0)
+
+    assert state['warmup'] == [['2024-05-01', 10.0], ['2024-05-02', 0.0], ['2024-05-03', 0.0], ['2024-05-04', 7.0]]
+    assert not advance_to(state, '2024-05-03', 5.0)
+    assert state['mtd_cost'] == 17.0
+
+
+def test_estimated_days_are_pending_until_settled(dynamodb):
+    update_forecasts(dynamodb, rows({'2024-05-01': 10.0, '2024-05-02': 4.0}, estimated={'2024-05-02'}))
+    state = stored(dynamodb, TOTAL)
+    assert state['last_date'] == '2024-05-01'
+    assert state['pending'] == {'2024-05-02': 4.0}
+
+    # Restated: the estimate is replaced, not added
+    update_forecasts(dynamodb, rows({'2024-05-01': 10.0, '2024-05-02': 9.0}, estimated={'2024-05-02'}))
+    state = stored(dynamodb, TOTAL)
+    assert state['pending'] == {'2024-05-02': 9.0}
+    assert month_end_projection(state, date(2024, 5, 2))['actual_to_date'] == 19.0
+
+    # Settled: folded in once and no longer pending
+    update_forecasts(dynamodb, rows({'2024-05-01': 10.0, '2024-05-02': 10.0}))
+    state = stored(dynamodb, TOTAL)
+    assert (state['last_date'], state['pending'], state['mtd_cost']) == ('2024-05-02', {}, 20.0)
+
+
+def test_projection_across_the_month_boundary():
+    state = new_state(TOTAL)
+    for d in days('2024-05-01', 31):
+        advance_to(state, d, 10.0)
+
+    june = month_end_projection(state, date(2024, 6, 1))
+    assert (june['month'], june['actual_to_date'], june['days_remaining']) == ('2024-06', 0.0, 30)
+    assert june['projected_total'] == pytest.approx(300.0)
+
+    # An estimated June day counts toward June's actuals
+    state['pending'] = {'2024-06-01': 12.0}
+    june = month_end_projection(state, date(2024, 6, 1))
+    assert (june['actual_to_date'], june['days_remaining']) == (12.0, 29)
+    assert june['last_settled_date'] == '2024-05-31'
+
+
+def test_series_without_spend_are_zero_filled_to_the_window_end(dynamodb):
+    window = days('2024-05-01', 14)
+    update_forecasts(dynamodb, rows({d: 10.0 for d in window[:7]}, 'AmazonS3')
+                     + rows({d: 5.0 for d in window[:7]}))
+    level = stored(dynamodb, series_id('AmazonS3', ALL))['level']
+
+    # S3 stops costing anything: it no longer appears in the rows
+    update_forecasts(dynamodb, rows({d: 5.0 for d in window[7:]}))
+    state = stored(dynamodb, series_id('AmazonS3', ALL))
+    assert state['last_date'] == window[-1]
+    assert state['level'] < level
+    # Well below 17 remaining days at the old $10/day
+    assert month_end_projection(state, date(2024, 5, 15))['forecast_remaining'] < 170.0
+
+
+def test_forecast_endpoint_skips_states_left_on_an_older_day(dynamodb, monkeypatch):
+    table = dynamodb.Table(FORECAST_TABLE)
+    for sid, last in ((TOTAL, '2024-05-14'), (series_id('AmazonEC2', ALL), '2024-05-14'),
+                      (series_id('Retired', ALL), '2024-03-01')):
+        state = new_state(sid)
+        advance_to(state, last, 10.0)
+        table.items[sid] = to_dynamo(state)
+    monkeypatch.setattr(cost_api_fixed.boto3, 'resource', lambda service, **kwargs: dynamodb)
+
+    result = cost_api_fixed.get_forecast(None)
+
+    assert result['total']['last_date'] == '2024-05-14'
+    assert [s['service'] for s in result['services']] == ['AmazonEC2']
@@ -0,0 +1,80 @@
+from decimal import Decimal
+
+from cost_rollups import (
+    ALL, DynamoRollupStore, MemoryRollupStore, get_rollup_costs, local_stream_record, period_keys, process_records, rollup_id
+)
+
+
+def row(cost, date='2024-05-14', service='AmazonEC2', region='eu-west-1'):
+    return {'id': f"{date}#{service}#{region}", 'date': date, 'service': service, 'region': region, 'cost': cost}
+
+
+def test_period_keys():
+    assert period_keys('2024-05-14') == [
+        ('day', '2024-05-14'), ('week', '2024-W20'), ('month', '2024-05'), ('quarter', '2024-Q2')
+    ]
+
+
+def test_insert_updates_every_rollup_level():
+    store = MemoryRollupStore()
+    counts = process_records([local_stream_record(1, new_row=row(10.5))], store)
+
+    assert counts == {'applied': 1, 'duplicate': 0, 'unchanged': 0}
+    for period, key in period_keys('2024-05-14'):
+        for service, region in (('AmazonEC2', 'eu-west-1'), ('AmazonEC2', ALL), (ALL, 'eu-west-1'), (ALL, ALL)):
+            assert store.items[rollup_id(period, key, service, region)]['cost'] == Decimal('10.5')
+    assert store.items[rollup_id('month', '2024-05')]['cells'] == {'AmazonEC2|eu-west-1'}
+
+
+def test_modify_applies_only_the_delta():
+    store = MemoryRollupStore()
+    process_records([
+        local_stream_record(1, new_row=row(10.0)),
+        local_stream_record(2, old_row=row(10.0), new_row=row(12.5)),
+        local_stream_record(3, new_row=row(4.0, date='2024-05-20', service='AmazonS3'))
+    ], store)
+
+    assert get_rollup_costs(store, 'month', ['2024-05']) == {'2024-05': 16.5}
+    assert get_rollup_costs(store, 'day', ['2024-05-14'], service='AmazonEC2') == {'2024-05-14': 12.5}
+
+
+def test_redelivered_and_stale_records_are_skipped():
+    store = MemoryRollupStore()
+    first = local_stream_record(5, new_row=row(10.0))
+    counts = process_records([first, first, local_stream_record(4, new_row=row(99.0))], store)
+
+    assert counts == {'applied': 1, 'duplicate': 2, 'unchanged': 0}
+    assert get_rollup_costs(store, 'quarter', ['2024-Q2']) == {'2024-Q2': 10.0}
+
+
+def test_sequence_numbers_compare_numerically():
+    store = MemoryRollupStore()
+    process_records([local_stream_record(9, new_row=row(1.0))], store)
+    counts = process_records([local_stream_record(10, old_row=row(1.0), new_row=row(3.0))], store)
+
+    assert counts['applied'] == 1
+    assert get_rollup_costs(store, 'day', ['2024-05-14']) == {'2024-05-14': 3.0}
+
+
+def test_unchanged_cost_and_remove():
+    store = MemoryRollupStore()
+    counts = process_records([
+        local_stream_record(1, new_row=row(7.0)),
+        local_stream_record(2, old_row=row(7.0), new_row=row(7.0)),
+        local_stream_record(3, old_row=row(7.0))
+    ], store)
+
+    assert counts == {'applied': 2, 'duplicate': 0, 'unchanged': 1}
+    assert get_rollup_costs(store, 'week', ['2024-W20']) == {'2024-W20': 0.0}
+
+
+def test_dynamo_store_reads_rollups_in_batches(dynamodb):
+    table = dynamodb.Table('cost-rollups')
+    for day in range(1, 151):
+        item_id = rollup_id('day', f"2024-05-{day:03d}")
+        table.items[item_id] = {'id': item_id, 'cost': Decimal(day)}
+
+    items = DynamoRollupStore(dynamodb).get([rollup_id('day', f"2024-05-{day:03d}") for day in range(1, 161)])
+
+    assert len(items) == 150
+    assert items[rollup_id('day', '2024-05-150')]['cost'] == Decimal(150)
@@ -0,0 +1,71 @@
+import pytest
+
+import cost_store
+from cost_store import query_store, replace_day_partition, store_exists
+
+ROWS = [
+    ['AmazonEC2', 'us-east-1', 'BoxUsage', '111', 'RunInstances', 'i-1', 10.0],
+    ['AmazonEC2', 'us-east-1', 'BoxUsage', '111', 'RunInstances', 'i-2', 5.0],
+    ['AmazonEC2', 'eu-west-1', 'EUW1-BoxUsage', '222', 'RunInstances', 'i-3', 3.0],
+    ['AmazonS3', 'us-east-1', 'TimedStorage', '111', 'PutObject', 'bucket-a', 2.0],
+]
+
+
+@pytest.fixture(params=['python', 'numpy'])
+def scan(request, monkeypatch):
+    if request.param == 'python':
+        monkeypatch.setattr(cost_store, 'np', None)
+    else:
+        monkeypatch.setattr(cost_store, 'np', pytest.importorskip('numpy'))
+    return request.param
+
+
+@pytest.fixture
+def store(tmp_path):
+    root = str(tmp_path / 'store')
+    replace_day_partition(root, '2024-01-01', ROWS)
+    replace_day_partition(root, '2024-01-02', ROWS[:1])
+    return root
+
+
+def test_groups_and_filters_across_days(store, scan):
+    result = query_store(store, '2024-01-01', '2024-01-02', ['region', 'account'], {'service': ['AmazonEC2']})
+
+    assert result['rows'] == [
+        {'region': 'us-east-1', 'account': '111', 'cost': 25.0},
+        {'region': 'eu-west-1', 'account': '222', 'cost': 3.0},
+    ]
+    assert result['total_cost'] == 28.0
+    assert result['days'] == 2
+
+
+def test_partition_keys_and_column_filters(store, scan):
+    result = query_store(store, '2024-01-01', '2024-01-01', ['date', 'service'], {'account': ['111']})
+
+    assert result['rows'] == [
+        {'date': '2024-01-01', 'service': 'AmazonEC2', 'cost': 15.0},
+        {'date': '2024-01-01', 'service': 'AmazonS3', 'cost': 2.0},
+    ]
+
+
+def test_filter_with_no_matching_values_is_empty(store, scan):
+    result = query_store(store, '2024-01-01', '2024-01-02', ['region'], {'account': ['999']})
+
+    assert result['rows'] == []
+    assert result['total_cost'] == 0
+
+
+def test_stacked_codes_when_combined_key_would_overflow(store, monkeypatch):
+    monkeypatch.setattr(cost_store, 'np', pytest.importorskip('numpy'))
+    expected = query_store(store, '2024-01-01', '2024-01-02', ['region', 'usage_type', 'resource_id'])
+
+    monkeypatch.setattr(cost_store, 'INT64_MAX', 1)
+    assert query_store(store, '2024-01-01', '2024-01-02', ['region', 'usage_type', 'resource_id']) == expected
+
+
+def test_store_exists_only_after_a_day_is_written(tmp_path):
+    root = str(tmp_path / 'store')
+    assert not store_exists(root)
+
+    replace_day_partition(root, '2024-01-01', ROWS)
+    assert store_exists(root)
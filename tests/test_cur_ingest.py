@@ -0,0 +1,122 @@
+import gzip
+import io
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+import cur_ingest
+from cur_ingest import ingest_s3, iter_downloaded_parts, list_report_parts
+
+HEADER = 'lineItem/UsageStartDate,product/ProductName,product/region,lineItem/UsageType,' \
+         'lineItem/UsageAccountId,lineItem/LineItemType,lineItem/BlendedCost\n'
+
+
+def part(cost):
+    return gzip.compress((HEADER + f"2024-05-01T00:00:00Z,Amazon EC2,eu-west-1,BoxUsage,111,Usage,{cost}\n").encode())
+
+
+class FakeS3:
+    """list_objects_v2 paginator and get_object over an in-memory bucket"""
+
+    def __init__(self, objects):
+        self.objects = objects   # key -> (bytes, LastModified)
+
+    def get_paginator(self, name):
+        assert name == 'list_objects_v2'
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        yield {'Contents': [{'Key': key, 'LastModified': modified}
+                            for key, (_, modified) in sorted(self.objects.items()) if key.startswith(Prefix)]}
+
+    def get_object(self, Bucket, Key):
+        return {'Body': io.BytesIO(self.objects[Key][0])}
+
+
+class Done:
+    def result(self):
+        return None
+
+
+class FakeTransferManager:
+    """Writes objects synchronously and records how many parts were on disk at once"""
+    peak = 0
+
+    def __init__(self, client, config):
+        self.client = client
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def download(self, bucket, key, path):
+        with open(path, 'wb') as f:
+            f.write(self.client.objects[key][0])
+        FakeTransferManager.peak = max(FakeTransferManager.peak, len(os.listdir(os.path.dirname(path))))
+        return Done()
+
+
+@pytest.fixture
+def transfers(monkeypatch):
+    FakeTransferManager.peak = 0
+    monkeypatch.setattr(cur_ingest, 'TransferManager', FakeTransferManager)
+    return FakeTransferManager
+
+
+def manifest(assembly, keys):
+    return json.dumps({'assemblyId': assembly, 'billingPeriod': {'start': '20240501T000000.000Z'},
+                       'reportKeys': keys}).encode()
+
+
+def delivered_report():
+    old, new = datetime(2024, 5, 2), datetime(2024, 5, 3)
+    base = 'cur/report/20240501-20240601'
+    return FakeS3({
+        # The first assembly is still in the bucket next to the current one
+        f"{base}/a1/report-1.csv.gz": (part(10), old),
+        f"{base}/a1/report-Manifest.json": (manifest('a1', [f"{base}/a1/report-1.csv.gz"]), old),
+        f"{base}/a2/report-1.csv.gz": (part(12), new),
+        f"{base}/a2/report-2.csv.gz": (part(3), new),
+        f"{base}/a2/report-Manifest.json": (manifest('a2', [f"{base}/a2/report-1.csv.gz",
+                                                             f"{base}/a2/report-2.csv.gz"]), new),
+        f"{base}/report-Manifest.json": (manifest('a2', [f"{base}/a2/report-1.csv.gz",
+                                                          f"{base}/a2/report-2.csv.gz"]), new),
+    })
+
+
+def test_only_the_current_assembly_is_listed():
+    assert list_report_parts(delivered_report(), 'bucket', 'cur/') == [
+        'cur/report/20240501-20240601/a2/report-1.csv.gz',
+        'cur/report/20240501-20240601/a2/report-2.csv.gz'
+    ]
+
+
+def test_ingest_counts_each_period_once_and_cleans_up(tmp_path, transfers):
+    cube = ingest_s3(delivered_report(), 'bucket', 'cur/', dest_dir=str(tmp_path))
+
+    assert cur_ingest.cube_summary(cube)['total_cost'] == 15.0
+    assert os.listdir(tmp_path) == []
+
+
+def test_download_pipeline_keeps_a_bounded_number_of_parts(tmp_path, transfers):
+    s3 = FakeS3({f"part-{n}.csv.gz": (part(n), datetime(2024, 5, 1)) for n in range(6)})
+    seen = []
+    for key, path in iter_downloaded_parts(s3, 'bucket', sorted(s3.objects), str(tmp_path), ahead=2):
+        assert os.path.exists(path)
+        seen.append(key)
+
+    assert seen == sorted(s3.objects)
+    assert transfers.peak == 2
+    assert os.listdir(tmp_path) == []
+
+
+def test_stopping_early_removes_parts_fetched_ahead(tmp_path, transfers):
+    s3 = FakeS3({f"part-{n}.csv.gz": (part(n), datetime(2024, 5, 1)) for n in range(4)})
+    parts = iter_downloaded_parts(s3, 'bucket', sorted(s3.objects), str(tmp_path), ahead=3)
+    next(parts)
+    parts.close()
+    assert os.listdir(tmp_path) == []
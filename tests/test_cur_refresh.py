@@ -0,0 +1,76 @@
+import gzip
+import json
+
+import pytest
+
+from cost_store import read_day_partition, stored_days
+from cur_refresh import LocalReportSource, refresh
+
+HEADER = ('lineItem/UsageStartDate,product/ProductName,product/region,lineItem/UsageType,lineItem/UsageAccountId,'
+          'lineItem/Operation,lineItem/ResourceId,lineItem/LineItemType,lineItem/BlendedCost\n')
+
+
+def write_part(root, key, rows):
+    path = root / key
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = ''.join(f"{day}T00:00:00Z,{service},eu-west-1,BoxUsage,111,RunInstances,i-1,Usage,{cost}\n"
+                    for day, service, cost in rows)
+    # A fixed mtime keeps re-delivered parts byte-identical, as in real deliveries
+    path.write_bytes(gzip.compress((HEADER + lines).encode(), mtime=0))
+
+
+def deliver(root, assembly, parts):
+    """Write one delivery: its parts and the manifest listing them"""
+    keys = []
+    for name, rows in parts.items():
+        key = f"{assembly}/{name}.csv.gz"
+        write_part(root, key, rows)
+        keys.append(key)
+    (root / 'manifest.json').write_text(json.dumps({
+        'assemblyId': assembly, 'billingPeriod': {'start': '20240501T000000.000Z'}, 'reportKeys': keys
+    }))
+    return 'manifest.json'
+
+
+def day_total(store, day):
+    partition = read_day_partition(str(store), day)
+    return sum(row[-1] for row in partition['rows']) if partition else None
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    return tmp_path / 'reports', tmp_path / 'store'
+
+
+def test_only_changed_parts_and_their_days_are_reprocessed(dirs):
+    reports, store = dirs
+    first = {'p1': [('2024-05-01', 'EC2', 10.0), ('2024-05-02', 'EC2', 5.0)],
+             'p2': [('2024-05-03', 'S3', 2.0)]}
+    source = LocalReportSource(str(reports))
+    result = refresh(source, deliver(reports, 'a1', first), root=str(store))
+    assert result['parts_processed'] == 2
+    assert result['days_replaced'] == ['2024-05-01', '2024-05-02', '2024-05-03']
+
+    # Same assembly again: nothing is read
+    assert refresh(source, 'manifest.json', root=str(store))['status'] == 'unchanged'
+
+    # Next delivery: p1 re-delivered unchanged under new keys, p2 restated
+    second = dict(first, p2=[('2024-05-03', 'S3', 2.5)])
+    result = refresh(source, deliver(reports, 'a2', second), root=str(store))
+    assert result['parts_processed'] == 1
+    assert result['parts_skipped'] == 1
+    assert result['days_replaced'] == ['2024-05-03']
+    assert day_total(store, '2024-05-01') == 10.0
+    assert day_total(store, '2024-05-03') == 2.5
+
+
+def test_vanished_parts_drop_their_days(dirs):
+    reports, store = dirs
+    source = LocalReportSource(str(reports))
+    refresh(source, deliver(reports, 'a1', {'p1': [('2024-05-01', 'EC2', 10.0)],
+                                             'p2': [('2024-05-02', 'S3', 4.0)]}), root=str(store))
+
+    result = refresh(source, deliver(reports, 'a2', {'p1': [('2024-05-01', 'EC2', 10.0)]}), root=str(store))
+    assert result['parts_removed'] == 1
+    assert result['days_replaced'] == ['2024-05-02']
+    assert stored_days(str(store)) == ['2024-05-01']
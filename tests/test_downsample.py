@@ -0,0 +1,30 @@
+from downsample import lttb_indices, downsample_rows
+
+
+def test_short_series_is_returned_unchanged():
+    assert lttb_indices([1.0, 2.0, 3.0], 10) == [0, 1, 2]
+    assert lttb_indices([1.0] * 5, 2) == list(range(5))
+
+
+def test_keeps_endpoints_and_point_count():
+    values = [float(i % 7) for i in range(100)]
+    indices = lttb_indices(values, 20)
+
+    assert len(indices) == 20
+    assert indices[0] == 0 and indices[-1] == 99
+    assert indices == sorted(set(indices))
+
+
+def test_keeps_a_single_spike():
+    values = [1.0] * 365
+    values[200] = 50.0
+    assert 200 in lttb_indices(values, 30)
+
+
+def test_downsample_rows_returns_original_rows():
+    rows = [{'date': f"d{i}", 'cost': float(i == 40)} for i in range(100)]
+    sampled = downsample_rows(rows, 10)
+
+    assert len(sampled) == 10
+    assert rows[40] in sampled
+    assert all(row in rows for row in sampled)
@@ -0,0 +1,49 @@
+from datetime import datetime
+
+import hourly_burn
+from hourly_burn import ALL, CHECKPOINT_ID, HOURLY_TABLE, update_hourly
+
+
+class HourlyCE:
+    """Cost Explorer stand-in returning {hour: {service: cost}} for the requested span"""
+
+    def __init__(self, published):
+        self.published = published
+
+    def get_cost_and_usage(self, **kwargs):
+        start, end = kwargs['TimePeriod']['Start'], kwargs['TimePeriod']['End']
+        results = []
+        for hour in sorted(self.published):
+            if start <= hour < end:
+                groups = [{'Keys': [service], 'Metrics': {'BlendedCost': {'Amount': str(cost)}}}
+                          for service, cost in self.published[hour].items()]
+                results.append({'TimePeriod': {'Start': hour}, 'Groups': groups})
+        return {'ResultsByTime': results}
+
+
+def hour(h):
+    return f"2024-05-14T{h:02d}:00:00Z"
+
+
+def test_checkpoint_stops_at_the_last_hour_with_data(dynamodb, monkeypatch):
+    monkeypatch.setattr(hourly_burn, 'BACKFILL_HOURS', 6)
+    now = datetime(2024, 5, 14, 12, 30)   # settled hours end at 10:00
+    ce = HourlyCE({hour(h): {'AmazonEC2': 1.0} for h in range(4, 8)})
+
+    update_hourly(dynamodb, ce, now)
+    table = dynamodb.Table(HOURLY_TABLE)
+    assert table.items[CHECKPOINT_ID]['last_hour'] == hour(7)
+
+    # Hours 8 and 9 arrive late; they are picked up rather than left as zeros
+    ce.published[hour(8)] = {'AmazonEC2': 5.0}
+    ce.published[hour(9)] = {'AmazonEC2': 5.0}
+    summaries = update_hourly(dynamodb, ce, now)
+
+    assert table.items[CHECKPOINT_ID]['last_hour'] == hour(9)
+    assert summaries[ALL]['hours'] == 6
+    assert summaries['AmazonEC2']['last_24h'] == 14.0
+
+
+def test_no_data_leaves_the_checkpoint_alone(dynamodb):
+    assert update_hourly(dynamodb, HourlyCE({}), datetime(2024, 5, 14, 12, 30)) == {}
+    assert CHECKPOINT_ID not in dynamodb.Table(HOURLY_TABLE).items
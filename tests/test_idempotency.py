@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+import cost_analyzer
+from idempotency import RUN_LEASE_SECONDS, claim_run, complete_run, release_run
+from pipeline import stage
+
+
+@pytest.fixture
+def runs(dynamodb):
+    return dynamodb.Table('cost-runs')
+
+
+def test_second_claim_waits_then_replays_the_completed_response(runs):
+    first = claim_run(runs, 'run', now=1000)
+    assert first['status'] == 'claimed'
+    assert claim_run(runs, 'run', now=1001) == {'status': 'in_progress'}
+
+    assert complete_run(runs, 'run', first['token'], {'statusCode': 200}, now=1002)
+    assert claim_run(runs, 'run', now=1003) == {'status': 'completed', 'response': {'statusCode': 200}}
+
+
+def test_expired_lease_is_taken_over_and_the_old_holder_cannot_complete(runs):
+    stale = claim_run(runs, 'run', now=1000)
+    fresh = claim_run(runs, 'run', now=1000 + RUN_LEASE_SECONDS + 1)
+    assert fresh['status'] == 'claimed'
+
+    assert not complete_run(runs, 'run', stale['token'], {'statusCode': 200})
+    assert not release_run(runs, 'run', stale['token'])
+    assert runs.items['run']['status'] == 'in_progress'
+    assert runs.items['run']['token'] == fresh['token']
+
+
+def test_released_run_is_claimable_at_once_and_remembers_what_was_sent(runs):
+    first = claim_run(runs, 'run', now=1000)
+    assert release_run(runs, 'run', first['token'], {'report'})
+
+    retry = claim_run(runs, 'run', now=1001)
+    assert retry['status'] == 'claimed'
+    assert retry['sent'] == ['report']
+    # A retry that also dies keeps the record of what went out
+    third = claim_run(runs, 'run', now=1001 + RUN_LEASE_SECONDS + 1)
+    assert third['sent'] == ['report']
+
+
+class Context:
+    invoked_function_arn = 'arn:aws:lambda:eu-west-1:123456789012:function:cost-analyzer'
+
+
+def test_failed_runs_are_retried_without_resending_the_report(dynamodb, monkeypatch):
+    sent_reports = []
+    ledger_ok = []
+
+    def stages(ce_client, sns_client, start_date, end_date, run_id=None, sent=()):
+        def ledger(inputs):
+            if not ledger_ok:
+                raise RuntimeError('throttled')
+        def report(inputs):
+            if 'report' not in sent:
+                sent_reports.append(run_id)
+        return [stage('ledger', ledger), stage('report', report)]
+
+    monkeypatch.setattr(cost_analyzer, 'analysis_stages', stages)
+    monkeypatch.setattr(cost_analyzer.boto3, 'client', lambda service, **kwargs: None)
+    monkeypatch.setattr(cost_analyzer.boto3, 'resource', lambda service, **kwargs: dynamodb)
+
+    first = cost_analyzer.lambda_handler({}, Context())
+    assert first['statusCode'] == 500
+    assert json.loads(first['body'])['failed_stages'] == ['ledger']
+
+    ledger_ok.append(True)
+    second = cost_analyzer.lambda_handler({}, Context())
+    assert second['statusCode'] == 200
+    assert len(sent_reports) == 1
+
+    # Completed: duplicates replay the successful response
+    assert cost_analyzer.lambda_handler({}, Context()) == second
@@ -0,0 +1,38 @@
+import pytest
+
+from quantile_sketch import SKETCH_TABLE, series_quantiles, sketch_id, update_sketches
+
+
+def rows(costs, estimated=()):
+    return [{'date': date, 'service': service, 'region': 'eu-west-1', 'cost': cost, 'estimated': date in estimated}
+            for (date, service), cost in costs.items()]
+
+
+def test_no_spend_days_are_observed_as_zero(dynamodb):
+    costs = {(f"2024-05-{d:02d}", 'AmazonEC2'): 10.0 for d in range(1, 11)}
+    # S3 only spends on two days of the window
+    costs[('2024-05-03', 'AmazonS3')] = 50.0
+    costs[('2024-05-07', 'AmazonS3')] = 50.0
+    update_sketches(dynamodb, rows(costs))
+
+    sketch = dynamodb.Table(SKETCH_TABLE).items[sketch_id('AmazonS3#*', '2024-05')]
+    assert sketch['count'] == 10
+    result = series_quantiles(dynamodb, 'AmazonS3#*', ['2024-05'], qs=(0.5,))
+    assert result == {'days': 10, 'p50': 0.0}
+
+
+def test_reruns_add_nothing_and_estimates_are_replaced(dynamodb):
+    costs = {(f"2024-05-{d:02d}", 'AmazonEC2'): 10.0 for d in range(1, 6)}
+    update_sketches(dynamodb, rows(costs, estimated={'2024-05-05'}))
+    update_sketches(dynamodb, rows(costs, estimated={'2024-05-05'}))
+
+    sketch = dynamodb.Table(SKETCH_TABLE).items[sketch_id('*#*', '2024-05')]
+    assert sketch['count'] == 4
+    assert sketch['pending'] == {'2024-05-05': pytest.approx(10.0)}
+
+    costs[('2024-05-05', 'AmazonEC2')] = 30.0
+    update_sketches(dynamodb, rows(costs))
+    sketch = dynamodb.Table(SKETCH_TABLE).items[sketch_id('*#*', '2024-05')]
+    assert sketch['count'] == 5
+    assert sketch['pending'] == {}
+    assert series_quantiles(dynamodb, '*#*', ['2024-05'], qs=(1.0,))['p100'] == pytest.approx(30.0)
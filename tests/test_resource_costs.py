@@ -0,0 +1,92 @@
+from datetime import date
+
+import pytest
+
+import resource_costs
+from resource_costs import RESOURCES_TABLE, top_resources
+
+TODAY = date(2024, 5, 20)
+
+
+class FakeCE:
+    """Resource-level costs per day for one service, one page per day"""
+
+    def __init__(self, days):
+        self.days = days
+        self.calls = []
+
+    def get_cost_and_usage_with_resources(self, **kwargs):
+        period = kwargs['TimePeriod']
+        if 'NextPageToken' not in kwargs:
+            self.calls.append((kwargs['Filter']['Dimensions']['Values'][0], period['Start'], period['End']))
+        dates = sorted(d for d in self.days if period['Start'] <= d < period['End'])
+        index = int(kwargs.get('NextPageToken', 0))
+        if not dates:
+            return {'ResultsByTime': []}
+        day = dates[index]
+        response = {'ResultsByTime': [{'TimePeriod': {'Start': day}, 'Groups': [
+            {'Keys': [resource_id], 'Metrics': {'BlendedCost': {'Amount': str(cost)}}}
+            for resource_id, cost in self.days[day].items()
+        ]}]}
+        if index + 1 < len(dates):
+            response['NextPageToken'] = str(index + 1)
+        return response
+
+
+def costs(result):
+    return {item['resource_id']: (item['cost'], item.get('max_error', 0.0)) for item in result['resources']}
+
+
+def test_settled_days_are_cached_and_unsettled_days_refetched(dynamodb):
+    ce = FakeCE({
+        '2024-05-15': {'i-a': 4.0, 'i-b': 1.0},
+        '2024-05-16': {'i-a': 4.0},
+        '2024-05-17': {'i-b': 2.0, '': 0.5},
+        '2024-05-18': {'i-a': 1.0},
+        '2024-05-19': {'i-b': 3.0}
+    })
+    first = top_resources(dynamodb, ce, ['AmazonEC2'], 5, 3, today=TODAY)[0]
+    assert ce.calls == [('AmazonEC2', '2024-05-15', '2024-05-20')]
+    assert first['total_cost'] == pytest.approx(15.5)
+    assert costs(first) == {'i-a': (9.0, 0.0), 'i-b': (6.0, 0.0), '(no resource id)': (0.5, 0.0)}
+    # Days before RESOURCE_SETTLE_DAYS are stored; the last two are not
+    assert sorted(dynamodb.Table(RESOURCES_TABLE).items) == [
+        'AmazonEC2#2024-05-15', 'AmazonEC2#2024-05-16', 'AmazonEC2#2024-05-17']
+
+    # CE restates an unsettled day and a settled one; only the unsettled day is refetched
+    ce.days['2024-05-19'] = {'i-b': 5.0}
+    ce.days['2024-05-15'] = {'i-a': 100.0}
+    second = top_resources(dynamodb, ce, ['AmazonEC2'], 5, 3, today=TODAY)[0]
+    assert ce.calls[1:] == [('AmazonEC2', '2024-05-18', '2024-05-20')]
+    assert costs(second)['i-b'] == (8.0, 0.0)
+    assert costs(second)['i-a'] == (9.0, 0.0)
+
+
+def test_days_without_cost_are_cached_empty(dynamodb):
+    ce = FakeCE({'2024-05-18': {'i-a': 1.0}})
+    top_resources(dynamodb, ce, ['AmazonS3'], 3, 1, today=TODAY)
+    assert dynamodb.Table(RESOURCES_TABLE).items['AmazonS3#2024-05-17']['total'] == 0
+
+    top_resources(dynamodb, ce, ['AmazonS3'], 3, 1, today=TODAY)
+    assert ce.calls[1:] == [('AmazonS3', '2024-05-18', '2024-05-20')]
+
+
+def test_merged_top_k_bounds_resources_evicted_on_some_days(dynamodb, monkeypatch):
+    monkeypatch.setattr(resource_costs, 'RESOURCE_SUMMARY_SIZE', 2)
+    ce = FakeCE({
+        # i-x is evicted on the first day, then it is the only resource
+        '2024-05-14': {'i-x': 1.0, 'i-a': 10.0, 'i-b': 10.0},
+        '2024-05-15': {'i-x': 5.0},
+    })
+    result = top_resources(dynamodb, ce, ['AmazonEC2'], 6, 3, today=TODAY)[0]
+
+    assert result['total_cost'] == pytest.approx(26.0)
+    truth = {'i-x': 6.0, 'i-a': 10.0, 'i-b': 10.0}
+    for resource_id, (cost, error) in costs(result).items():
+        assert cost - error <= truth[resource_id] <= cost
+    assert costs(result)['i-x'] == (15.0, 10.0)
+    assert result['other']['cost'] == 0.0
+    assert result['other']['max_error'] == 11.0
+
+    # The cached days merge to the same answer
+    assert top_resources(dynamodb, ce, ['AmazonEC2'], 6, 3, today=TODAY)[0] == result
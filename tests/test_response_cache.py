@@ -0,0 +1,27 @@
+import response_cache
+from response_cache import get_cached_response, make_cache_key, clear_cache
+
+
+def setup_function():
+    clear_cache()
+
+
+def builder(body):
+    return lambda: (body, None, 'application/json')
+
+
+def test_entries_are_bounded_least_recently_used_first(monkeypatch):
+    monkeypatch.setattr(response_cache, 'MAX_ENTRIES', 2)
+    get_cached_response('a', builder('{"a": 1}'))
+    get_cached_response('b', builder('{"b": 1}'))
+    # Touch 'a' so 'b' is the least recently used
+    get_cached_response('a', builder('{"a": 2}'))
+    get_cached_response('c', builder('{"c": 1}'))
+
+    assert list(response_cache._cache) == ['a', 'c']
+    assert get_cached_response('a', builder('{"a": 3}'))['body'] == '{"a": 1}'
+
+
+def test_cache_key_ignores_order_and_cache_busters():
+    assert make_cache_key('services', {'top': '5', 'metric': 'blended', '_': '123'}) == \
+        make_cache_key('services', {'metric': 'blended', 'top': '5'})
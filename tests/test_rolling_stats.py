@@ -0,0 +1,57 @@
+import pytest
+
+from rolling_stats import ALL, series_id, daily_series, estimated_dates, summarize, update_states
+
+
+def rows(costs, estimated=()):
+    return [{'date': date, 'service': 'AmazonEC2', 'region': 'eu-west-1', 'cost': cost,
+             'estimated': date in estimated} for date, cost in costs.items()]
+
+
+def run(states, costs, estimated=()):
+    batch = rows(costs, estimated)
+    return update_states(states, daily_series(batch), estimated_dates(batch))
+
+
+def test_estimated_days_are_included_and_restated():
+    states = {}
+    run(states, {'2024-05-01': 10.0, '2024-05-02': 10.0, '2024-05-03': 4.0}, estimated={'2024-05-03'})
+    state = states[series_id(ALL, ALL)]
+    assert state['last_date'] == '2024-05-02'
+    assert state['pending'] == {'2024-05-03': 4.0}
+    summary = summarize(state)
+    assert summary['last_date'] == '2024-05-03'
+    assert summary['settled_date'] == '2024-05-02'
+    assert summary['sum_7'] == pytest.approx(24.0)
+
+    # The next run restates the estimate and adds a new estimated day
+    run(states, {'2024-05-02': 10.0, '2024-05-03': 9.0, '2024-05-04': 1.0}, estimated={'2024-05-03', '2024-05-04'})
+    assert state['pending'] == {'2024-05-03': 9.0, '2024-05-04': 1.0}
+    assert summarize(state)['sum_7'] == pytest.approx(30.0)
+
+    # Once settled the day is folded in exactly once
+    changed = run(states, {'2024-05-03': 10.0, '2024-05-04': 2.0}, estimated={'2024-05-04'})
+    assert series_id(ALL, ALL) in changed
+    assert state['last_date'] == '2024-05-03'
+    assert state['pending'] == {'2024-05-04': 2.0}
+    assert state['count'] == 3
+    assert summarize(state)['sum_7'] == pytest.approx(32.0)
+
+
+def test_rerunning_the_same_window_changes_nothing():
+    states = {}
+    costs = {'2024-05-01': 5.0, '2024-05-02': 6.0}
+    run(states, costs, estimated={'2024-05-02'})
+    assert run(states, costs, estimated={'2024-05-02'}) == []
+
+
+def test_matches_folding_the_same_days_as_settled():
+    pending_states, settled_states = {}, {}
+    costs = {f"2024-05-{d:02d}": float(d) for d in range(1, 15)}
+    run(pending_states, costs, estimated={'2024-05-13', '2024-05-14'})
+    run(settled_states, costs)
+
+    with_estimates = summarize(pending_states[series_id(ALL, ALL)])
+    settled = summarize(settled_states[series_id(ALL, ALL)])
+    for key in ('sum_7', 'avg_30', 'ewma', 'stddev_90', 'days'):
+        assert with_estimates[key] == pytest.approx(settled[key])
@@ -0,0 +1,173 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import session_pool
+from idle_resources import find_idle_resources, idle_recommendation, scan_idle_resources
+from session_pool import SessionPool
+
+NOW = datetime(2024, 5, 13, 12, 0, tzinfo=timezone.utc)
+
+
+class FakeSTS:
+    def __init__(self, lifetime=timedelta(hours=1), denied=()):
+        self.lifetime = lifetime
+        self.denied = set(denied)
+        self.assumed = []
+        self.lock = threading.Lock()
+
+    def get_caller_identity(self):
+        return {'Account': '000000000000'}
+
+    def assume_role(self, RoleArn, RoleSessionName, DurationSeconds):
+        account_id = RoleArn.split(':')[4]
+        with self.lock:
+            self.assumed.append(account_id)
+        if account_id in self.denied:
+            raise RuntimeError('AccessDenied')
+        return {'Credentials': {
+            'AccessKeyId': f'AKIA{len(self.assumed)}',
+            'SecretAccessKey': 'secret',
+            'SessionToken': 'token',
+            'Expiration': session_pool._now() + self.lifetime
+        }}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {'at': NOW}
+    monkeypatch.setattr(session_pool, '_now', lambda: now['at'])
+    return now
+
+
+def test_credentials_and_clients_are_reused(clock):
+    sts = FakeSTS()
+    pool = SessionPool(sts_client=sts)
+
+    first = pool.client('111111111111', 'ec2', 'eu-west-1')
+    clock['at'] = NOW + timedelta(minutes=50)
+    assert pool.client('111111111111', 'ec2', 'eu-west-1') is first
+    assert pool.client('111111111111', 'ec2', 'us-east-1') is not first
+    assert sts.assumed == ['111111111111']
+
+    credentials = pool.session('111111111111').get_credentials()
+    assert credentials.access_key == 'AKIA1'
+
+
+def test_credentials_are_refreshed_before_they_expire(clock):
+    sts = FakeSTS()
+    pool = SessionPool(sts_client=sts)
+    first = pool.client('111111111111', 'ec2', 'eu-west-1')
+
+    # Renewed REFRESH_MARGIN (5 minutes) before the hour is up
+    clock['at'] = NOW + timedelta(minutes=55, seconds=1)
+    renewed = pool.client('111111111111', 'ec2', 'eu-west-1')
+    assert renewed is not first
+    assert sts.assumed == ['111111111111'] * 2
+    assert pool.session('111111111111').get_credentials().access_key == 'AKIA2'
+
+
+def test_short_sessions_renew_at_half_their_life(clock):
+    sts = FakeSTS(lifetime=timedelta(minutes=6))
+    pool = SessionPool(sts_client=sts)
+    pool.session('111111111111')
+
+    clock['at'] = NOW + timedelta(minutes=2, seconds=59)
+    pool.session('111111111111')
+    assert len(sts.assumed) == 1
+    clock['at'] = NOW + timedelta(minutes=3)
+    pool.session('111111111111')
+    assert len(sts.assumed) == 2
+
+
+def test_own_account_uses_lambda_credentials(clock):
+    sts = FakeSTS()
+    pool = SessionPool(sts_client=sts)
+    pool.client('000000000000', 'ec2', 'eu-west-1')
+    assert sts.assumed == []
+
+
+def test_failed_assume_role_backs_off(clock):
+    sts = FakeSTS(denied={'222222222222'})
+    pool = SessionPool(sts_client=sts)
+
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            pool.session('222222222222')
+    assert sts.assumed == ['222222222222']
+
+    clock['at'] = NOW + session_pool.ASSUME_FAILURE_BACKOFF
+    with pytest.raises(RuntimeError):
+        pool.session('222222222222')
+    assert len(sts.assumed) == 2
+
+
+def test_scan_assumes_each_account_once(clock):
+    sts = FakeSTS(denied={'222222222222'})
+    pool = SessionPool(sts_client=sts)
+    accounts = ['111111111111', '222222222222', '333333333333']
+    regions = ['us-east-1', 'eu-west-1', 'ap-south-1', 'us-west-2']
+    seen = []
+
+    def fn(client, account_id, region):
+        seen.append((account_id, region))
+        return client.meta.region_name
+
+    results, errors = pool.scan([(a, r) for a in accounts for r in regions], 'ec2', fn, max_workers=1)
+
+    assert sorted(sts.assumed) == ['111111111111', '222222222222', '333333333333']
+    assert results[('333333333333', 'ap-south-1')] == 'ap-south-1'
+    assert len(results) == 8
+    assert set(errors) == {('222222222222', r) for r in regions}
+    # Targets are interleaved across accounts
+    assert seen[:2] == [('111111111111', 'us-east-1'), ('333333333333', 'us-east-1')]
+
+
+class FakeEC2:
+    def __init__(self, volumes, addresses):
+        self.volumes = volumes
+        self.addresses = addresses
+
+    def get_paginator(self, name):
+        assert name == 'describe_volumes'
+        fake = self
+
+        class Paginator:
+            def paginate(self, Filters):
+                assert Filters == [{'Name': 'status', 'Values': ['available']}]
+                return [{'Volumes': fake.volumes[:1]}, {'Volumes': fake.volumes[1:]}]
+        return Paginator()
+
+    def describe_addresses(self):
+        return {'Addresses': self.addresses}
+
+
+def test_find_idle_resources_prices_volumes_and_addresses():
+    ec2 = FakeEC2([{'Size': 100, 'VolumeType': 'gp3'}, {'Size': 50, 'VolumeType': 'gp2'}],
+                  [{'PublicIp': '1.2.3.4'}, {'PublicIp': '5.6.7.8', 'AssociationId': 'eipassoc-1'}])
+    found = find_idle_resources(ec2, '111111111111', 'eu-west-1')
+    assert found == {'volumes': 2, 'volume_gb': 150, 'addresses': 1, 'monthly_cost': pytest.approx(16.6)}
+
+    recommendation = idle_recommendation(found)
+    assert recommendation['priority'] == 'medium'
+    assert recommendation['potential_savings'] == 'About $16.60/month'
+    assert idle_recommendation({'volumes': 0, 'volume_gb': 0, 'addresses': 0, 'monthly_cost': 0.0}) is None
+
+
+def test_idle_scan_covers_regions_with_spend():
+    class Pool:
+        def scan(self, targets, service, fn):
+            self.targets = targets
+            ec2 = FakeEC2([{'Size': 10, 'VolumeType': 'gp2'}], [])
+            results = {t: fn(ec2, *t) for t in targets if t[1] != 'us-west-2'}
+            return results, {('111', 'us-west-2'): 'AccessDenied'}
+
+    pool = Pool()
+    analyses = [{'account_id': '111', 'regional_costs': {'eu-west-1': 5.0, 'global': 1.0, 'us-west-2': 1.0}},
+                {'account_id': '222', 'regional_costs': {'NoRegion': 2.0}}]
+    idle, errors = scan_idle_resources(pool, analyses)
+
+    assert pool.targets == [('111', 'eu-west-1'), ('111', 'us-west-2')]
+    assert idle == {'111': {'volumes': 1, 'volume_gb': 10, 'addresses': 0, 'monthly_cost': 1.0}}
+    assert len(errors) == 1
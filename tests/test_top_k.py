@@ -0,0 +1,123 @@
+import random
+
+import pytest
+
+from top_k import add, merge_summaries, new_top_k, top, top_k_stream
+
+
+def exact(pairs):
+    totals = {}
+    for key, cost in pairs:
+        totals[key] = totals.get(key, 0.0) + cost
+    return totals
+
+
+def stream(n, seed):
+    rng = random.Random(seed)
+    # A few heavy keys over a long tail
+    return [(f"heavy{i % 5}" if rng.random() < 0.5 else f"tail{rng.randrange(2000)}", rng.uniform(0.5, 1.5))
+            for i in range(n)]
+
+
+def test_small_streams_are_exact():
+    items, other, other_error = top(top_k_stream([('a', 5.0), ('b', 3.0), ('a', 1.0), ('c', 2.0)], 2), 2)
+
+    assert items == [('a', 6.0, 0.0), ('b', 3.0, 0.0)]
+    assert other == 2.0
+    assert other_error == 0.0
+
+
+def test_counts_and_other_bound_the_true_costs():
+    pairs = stream(20000, seed=1)
+    truth = exact(pairs)
+    summary = new_top_k(50)
+    for key, cost in pairs:
+        add(summary, key, cost)
+    items, other, other_error = top(summary, 5)
+
+    assert {key for key, _, _ in items} == {f"heavy{i}" for i in range(5)}
+    for key, cost, error in items:
+        assert cost - error - 1e-6 <= truth[key] <= cost + 1e-6
+    true_other = sum(truth.values()) - sum(truth[key] for key, _, _ in items)
+    assert other - 1e-6 <= true_other <= other + other_error + 1e-6
+    assert sum(cost for _, cost, _ in items) + other == pytest.approx(summary['total'])
+
+
+def test_merged_summaries_bound_the_true_costs():
+    days = [stream(5000, seed=day) for day in range(7)]
+    truth = exact(pair for day in days for pair in day)
+    summaries = []
+    for pairs in days:
+        summary = new_top_k(40)
+        for key, cost in pairs:
+            add(summary, key, cost)
+        summaries.append(summary)
+
+    merged = merge_summaries(summaries)
+    assert merged['total'] == pytest.approx(sum(truth.values()))
+    items, other, other_error = top(merged, 5)
+    for key, cost, error in items:
+        assert cost - error - 1e-6 <= truth[key] <= cost + 1e-6
+    true_other = sum(truth.values()) - sum(truth[key] for key, _, _ in items)
+    assert other - 1e-6 <= true_other <= other + other_error + 1e-6
+
+
+def test_quantities_are_exact_for_keys_without_error():
+    summary = new_top_k(2)
+    for key, cost, usage in [('a', 5.0, 10.0), ('b', 1.0, 4.0), ('a', 1.0, 2.0), ('c', 2.0, 7.0)]:
+        add(summary, key, cost, usage)
+
+    # 'c' evicted 'b' and inherited its count, so only 'a' has an exact quantity
+    assert summary['errors'] == {'a': 0.0, 'c': 1.0}
+    assert summary['quantities'] == {'a': 12.0, 'c': 7.0}
+
+
+def test_merge_counts_floors_for_keys_evicted_on_some_days():
+    day1 = new_top_k(2)
+    for key, cost in [('x', 1.0), ('a', 10.0), ('b', 10.0)]:
+        add(day1, key, cost)
+    day2 = new_top_k(2)
+    add(day2, 'x', 5.0)
+    assert 'x' not in day1['counts']
+
+    # Day 1 was full with floor 10, so x may have had up to 10 there: 15 +- 10 covers the true 6
+    merged = merge_summaries([day1, day2], capacity=3)
+    assert merged['counts'] == {'a': 10.0, 'b': 11.0, 'x': 15.0}
+    assert merged['errors'] == {'a': 0.0, 'b': 1.0, 'x': 10.0}
+
+    # Trimmed to the input capacity, the smallest counter drops into other
+    items, other, other_error = top(merge_summaries([day1, day2]), 3)
+    assert items == [('x', 15.0, 10.0), ('b', 11.0, 1.0)]
+    assert other == 0.0 and other_error == 11.0
+
+
+def test_merge_with_evictions_bounds_every_key():
+    rng = random.Random(7)
+    days = [[(f"r{rng.randrange(30)}", rng.uniform(0.1, 3.0)) for _ in range(300)] for _ in range(5)]
+    truth = exact(pair for day in days for pair in day)
+    summaries = []
+    for pairs in days:
+        summary = new_top_k(8)
+        for key, cost in pairs:
+            add(summary, key, cost)
+        summaries.append(summary)
+
+    merged = merge_summaries(summaries, capacity=30)
+    for key, count in merged['counts'].items():
+        assert count - merged['errors'][key] - 1e-6 <= truth[key] <= count + 1e-6
+
+
+def test_merged_summary_accepts_further_adds():
+    days = []
+    for pairs in ([('a', 5.0), ('b', 2.0), ('c', 1.0)], [('a', 1.0), ('d', 4.0)]):
+        summary = new_top_k(2)
+        for key, cost in pairs:
+            add(summary, key, cost)
+        days.append(summary)
+
+    merged = merge_summaries(days)
+    add(merged, 'e', 1.0)
+    add(merged, 'a', 1.0)
+    assert len(merged['counts']) == 2
+    assert 'a' in merged['counts'] and 'e' in merged['counts']
+    assert merged['total'] == pytest.approx(15.0)